@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# Ночной бэкап баз: WAL переносится в основной файл, затем VACUUM INTO пишет
+# сжатую копию (без свободных страниц и с перестроенными индексами) в
+# BACKUP_DIR. На каждую базу хранится BACKUP_KEEP последних копий.
+# Работа с каталогом (создание, поиск и удаление старых копий) — в потоке,
+# чтобы медленный диск не останавливал event loop.
+import asyncio
+import glob
+import logging
+import os
+import re
+from datetime import datetime
+
+from db import Database
+
+log = logging.getLogger("backup")
+
+# По умолчанию — backups/ рядом с базой
+BACKUP_DIR = os.getenv("BACKUP_DIR", "")
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "7"))
+
+
+def backup_dir(db: Database) -> str:
+    return BACKUP_DIR or os.path.join(os.path.dirname(os.path.abspath(db.path)), "backups")
+
+
+def _prepare(directory: str):
+    os.makedirs(directory, exist_ok=True)
+
+
+def _prune(directory: str, stem: str, keep: int, path: str) -> int:
+    # Имена сортируются по времени; старые копии этой базы — лишние.
+    # Возвращает размер новой копии
+    pattern = re.compile(re.escape(stem) + r"-\d{8}-\d{6}\.db")
+    copies = sorted(p for p in glob.glob(os.path.join(glob.escape(directory), "*.db"))
+                    if pattern.fullmatch(os.path.basename(p)))
+    for old in copies[:-keep] if keep > 0 else []:
+        try:
+            os.remove(old)
+        except OSError:
+            log.warning("cannot remove old backup %s", old)
+    return os.path.getsize(path)
+
+
+async def backup(db: Database, keep: int = BACKUP_KEEP) -> str:
+    directory = backup_dir(db)
+    await asyncio.to_thread(_prepare, directory)
+    stem = os.path.splitext(os.path.basename(db.path))[0]
+    path = os.path.join(directory, f"{stem}-{datetime.now():%Y%m%d-%H%M%S}.db")
+    await db.checkpoint()
+    await db.backup(path)
+    size = await asyncio.to_thread(_prune, directory, stem, keep, path)
+    log.info("backup %s -> %s (%d KB)", db.path, path, size // 1024)
+    return path
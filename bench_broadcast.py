@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+# Рассылка против заглушки Bot API, которая сама соблюдает лимиты Telegram:
+# больше 30 сообщений за скользящую секунду или больше 1 в чат в секунду -> RetryAfter.
+# Посередине «роняем» процесс и поднимаем заново: проверяем, что resume() досылает
+# только недоставленное и не шлёт повторно тем, отправка кому шла в момент
+# падения (они — interrupted), и меряем фактическую скорость отправки.
+#
+#   python bench_broadcast.py [--users 300] [--crash-at 0.4]
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from collections import Counter, deque
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+
+from broadcast import Broadcaster, SendScheduler
+from db import Database
+from fake_api import FakeSession, fake_bot
+
+REG_SQL = "CREATE TABLE IF NOT EXISTS registrations (id INTEGER PRIMARY KEY AUTOINCREMENT, tg_id INTEGER UNIQUE)"
+ADMIN_CHAT = 1
+
+
+class LimitedSession(FakeSession):
+    def __init__(self, latency=0.02, global_rate=30, chat_interval=1.0):
+        super().__init__(latency=latency, record=False)
+        self.global_rate = global_rate
+        self.chat_interval = chat_interval
+        self.window = deque()
+        self.chat_last = {}
+        self.delivered = Counter()
+        self.flood = 0
+
+    async def make_request(self, bot, method, timeout=None):
+        now = time.monotonic()
+        chat_id = getattr(method, "chat_id", None)
+        while self.window and now - self.window[0] > 1.0:
+            self.window.popleft()
+        if len(self.window) >= self.global_rate or now - self.chat_last.get(chat_id, -10) < self.chat_interval:
+            self.flood += 1
+            raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=1)
+        self.window.append(now)
+        self.chat_last[chat_id] = now
+        if chat_id != ADMIN_CHAT and chat_id % 97 == 0:
+            raise TelegramForbiddenError(method=method, message="Forbidden: bot was blocked by the user")
+        result = await super().make_request(bot, method, timeout)
+        if method.__api_method__ == "sendMessage" and chat_id != ADMIN_CHAT:
+            self.delivered[chat_id] += 1
+        return result
+
+
+async def amain(args):
+    session = LimitedSession()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        db = Database(path)
+        await db.execute(REG_SQL)
+        await db.executemany("INSERT INTO registrations (tg_id) VALUES (?)", [(1000 + i,) for i in range(args.users)])
+
+        bot = fake_bot(session)
+        b = Broadcaster(db, bot, SendScheduler(bot))
+        await b.setup()
+        bid = await b.create("Напоминание: старт в 9:00", ADMIN_CHAT)
+        t0 = time.perf_counter()
+        task = b.start(bid)
+        while sum(session.delivered.values()) < args.users * args.crash_at:
+            await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await db.close()
+        before = sum(session.delivered.values())
+
+        # «Рестарт»: новый пул и новый Broadcaster на том же файле
+        db = Database(path)
+        b = Broadcaster(db, bot, SendScheduler(bot))
+        await b.resume()
+        await asyncio.gather(*b._running.values())
+        elapsed = time.perf_counter() - t0
+        counts = await b.counts(bid)
+        interrupted = (await db.fetchone(
+            "SELECT COUNT(*) FROM broadcast_recipients WHERE broadcast_id=? AND error='interrupted'", (bid,)
+        ))[0]
+        await db.close()
+
+    sent = sum(session.delivered.values())
+    dupes = sum(n - 1 for n in session.delivered.values() if n > 1)
+    print(f"recipients={args.users} delivered={len(session.delivered)} failed={counts.get('failed', 0)} "
+          f"pending={counts.get('pending', 0)}")
+    print(f"crash after {before} sends, resumed; in flight at crash (not re-sent)={interrupted}  "
+          f"re-sent duplicates={dupes}")
+    print(f"rate={sent / elapsed:.1f} msg/s (limit {session.global_rate}/s)  "
+          f"RetryAfter from fake API={session.flood}  elapsed={elapsed:.1f} s")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=300)
+    ap.add_argument("--crash-at", type=float, default=0.4)
+    asyncio.run(amain(ap.parse_args(sys.argv[1:])))
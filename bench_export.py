@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# /export на большой таблице: полная сборка, повтор без изменений (файл из кэша),
+# выгрузка только изменённых строк с курсора и пересборка после правок.
+#
+#   python bench_export.py [--rows 100000] [--changes 200] [--fmt csv|xlsx]
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+from db import Database
+from export import Since, build_export, table_version
+
+
+def rows(n):
+    rnd = random.Random(1)
+    for i in range(n):
+        yield (100000 + i, f"User {i}", rnd.choice(["Nissan Patrol", "УАЗ Патриот", "Jeep Wrangler"]),
+               f"01A{i:06d}AA", f"+9989{i:08d}", "no", "-", rnd.choice(["paid", "later"]),
+               rnd.randint(1, 5), "2025-10-01T10:00:00")
+
+
+async def timed(label, coro):
+    t0 = time.perf_counter()
+    exp = await coro
+    size = exp.file.seek(0, os.SEEK_END)
+    exp.file.close()
+    rows = "cache" if exp.rows is None else exp.rows
+    print(f"{label:<22} {(time.perf_counter() - t0) * 1000:9.1f} ms  rows={rows:<7} {size / 1024:9.0f} KB  rev={exp.rev}")
+    return exp
+
+
+async def amain(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        # Без переноса старого bot.db: только сгенерированные строки
+        os.environ["LEGACY_DB_PATH"] = os.path.join(tmp, "none.db")
+        from repository import migrate
+
+        db = Database(os.path.join(tmp, "bench.db"))
+        await migrate(db)
+        t0 = time.perf_counter()
+        await db.executemany(
+            "INSERT INTO registrations (tg_id, name, car, plate, phone, race, race_type, payment, people, "
+            "created_at) VALUES (?,?,?,?,?,?,?,?,?,?)",
+            list(rows(args.rows)),
+        )
+        print(f"loaded {args.rows} rows in {time.perf_counter() - t0:.1f} s")
+
+        full = await timed("full (build)", build_export(db, args.fmt))
+        await timed("full (unchanged)", build_export(db, args.fmt))
+        t0 = time.perf_counter()
+        for _ in range(1000):
+            await table_version(db)
+        print(f"{'version check':<22} {(time.perf_counter() - t0) * 1000:9.3f} µs")
+
+        rnd = random.Random(2)
+        changed = rnd.sample(range(1, args.rows + 1), args.changes)
+        await db.executemany("UPDATE registrations SET payment='paid' WHERE id=?", [(i,) for i in changed])
+        await db.executemany(
+            "INSERT INTO registrations (tg_id, name, car, plate, phone, created_at) VALUES (?,?,?,?,?,?)",
+            [(900000 + i, f"Late {i}", "Jeep", f"99L{i:06d}AA", f"+9988{i:08d}", "2025-10-20T09:00:00")
+             for i in range(args.changes)],
+        )
+        await timed("delta since cursor", build_export(db, args.fmt, Since("rev", full.rev)))
+        await timed("delta since date", build_export(db, args.fmt, Since("date", "2025-10-20")))
+        await timed("full (after changes)", build_export(db, args.fmt))
+        await db.close()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=100000)
+    ap.add_argument("--changes", type=int, default=200)
+    ap.add_argument("--fmt", choices=["csv", "xlsx"], default="csv")
+    asyncio.run(amain(ap.parse_args(sys.argv[1:])))
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# /find на 100k регистраций: хвост телефона, часть госномера, часть имени.
+#
+#   python bench_find.py [--rows 100000] [--repeat 2000]
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+from db import Database
+from search import find_query, find_registrations, phone_key, plate_key
+
+FIRST = ["Akbar", "Dmitriy", "Aziz", "Rustam", "Olga", "Sardor", "Timur", "Nodira", "Bekzod", "Jasur"]
+LAST = ["Kulov", "Ivanov", "Karimov", "Tashkentov", "Yusupov", "Petrova", "Aliev", "Rakhimov"]
+CARS = ["Toyota Land Cruiser", "Nissan Patrol", "Mitsubishi Pajero", "UAZ Patriot", "Jeep Wrangler"]
+
+
+def rows(n):
+    rnd = random.Random(1)
+    for i in range(n):
+        plate = f"{rnd.randint(1, 95):02d}A{i:06d}{rnd.choice('ABCEHKMX')}{rnd.choice('ABCEHKMX')}"
+        phone = f"+9989{i:08d}"
+        name = f"{rnd.choice(FIRST)}{i} {rnd.choice(LAST)}"
+        yield (i, name, rnd.choice(CARS), plate, phone, "no", "-", "later", 2, "2025-10-01",
+               plate_key(plate), phone_key(phone))
+
+
+async def amain(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        # Схема поиска — из миграций; без переноса старого bot.db
+        os.environ["LEGACY_DB_PATH"] = os.path.join(tmp, "none.db")
+        from repository import migrate
+
+        db = Database(os.path.join(tmp, "bench.db"))
+        await migrate(db)
+        t0 = time.perf_counter()
+        await db.executemany(
+            "INSERT INTO registrations (tg_id, name, car, plate, phone, race, race_type, payment, people, "
+            "created_at, plate_rev, phone_rev) VALUES (?,?,?,?,?,?,?,?,?,?,?,?)",
+            list(rows(args.rows)),
+        )
+        print(f"loaded {args.rows} rows (+FTS triggers) in {time.perf_counter() - t0:.1f} s")
+
+        rnd = random.Random(2)
+        cases = {
+            "phone suffix": lambda: f"{rnd.randrange(args.rows):08d}"[-5:],
+            "plate part": lambda: f"A{rnd.randrange(args.rows):06d}",
+            "name part": lambda: f"{rnd.choice(FIRST)}{rnd.randrange(args.rows)}",
+        }
+        # Время SQLite без async-обвязки — отдельным синхронным соединением
+        raw = sqlite3.connect(db.path)
+        for label, make in cases.items():
+            queries = [make() for _ in range(args.repeat)]
+            hits = 0
+            t0 = time.perf_counter()
+            for q in queries:
+                hits += len(await find_registrations(db, q))
+            per_async = (time.perf_counter() - t0) / len(queries)
+            built = [find_query(q) for q in queries]
+            t0 = time.perf_counter()
+            for sql, params in built:
+                raw.execute(sql, params).fetchall()
+            per_raw = (time.perf_counter() - t0) / len(queries)
+            print(f"{label:<13} sqlite {per_raw * 1e6:7.0f} µs   via pool {per_async * 1e6:7.0f} µs   "
+                  f"avg hits={hits / len(queries):.1f}")
+        sql, params = find_query("12345")
+        print("plan:", [r[-1] for r in raw.execute("EXPLAIN QUERY PLAN " + sql, params)])
+        raw.close()
+        await db.close()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=100000)
+    ap.add_argument("--repeat", type=int, default=2000)
+    asyncio.run(amain(ap.parse_args(sys.argv[1:])))
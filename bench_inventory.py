@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+# Конкурентные брони мест: несколько процессов (как воркеры BOT_WORKERS) с общим
+# SQLite, в каждом — сотни пользователей одновременно бронируют и занимают места
+# на маленькой ёмкости. Часть бросает анкету (бронь истекает), часть отменяет.
+# В конце сверяются инварианты: занято не больше ёмкости, счётчики inventory
+# совпадают с holds, у пользователя не больше одного места в группе.
+#
+#   python bench_inventory.py [--procs 4] [--users 2000] [--capacity 50] [--ttl 0.5]
+import argparse
+import asyncio
+import multiprocessing as mp
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter
+
+
+def pct(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] * 1000
+
+
+async def run_proc(idx, args, path):
+    from db import Database
+    from inventory import ITEMS, Inventory
+
+    items = [i._replace(capacity=args.capacity) for i in ITEMS]
+    db = Database(path)
+    inv = Inventory(db, items=items, ttl=args.ttl, sweep_every=args.ttl)
+    await inv.load()
+    inv.start()
+    rnd = random.Random(idx)
+    kinds = list(inv.items)
+    latency = {"hold": [], "take": []}
+    outcome = Counter()
+
+    async def user(uid):
+        urnd = random.Random(uid)
+        await asyncio.sleep(urnd.uniform(0, args.ramp))
+        kind = urnd.choice(kinds)
+        t0 = time.perf_counter()
+        h = await inv.hold(kind, uid)
+        latency["hold"].append(time.perf_counter() - t0)
+        if h is None:
+            outcome["sold_out"] += 1
+            return
+        # Заполняет анкету; иногда дольше, чем держится бронь
+        await asyncio.sleep(urnd.uniform(0, args.ttl * 2))
+        r = urnd.random()
+        if r < 0.15:
+            outcome["abandoned"] += 1
+            return
+        if r < 0.25:
+            await inv.release(uid)
+            outcome["cancelled"] += 1
+            return
+        t0 = time.perf_counter()
+        h = await inv.take(kind, uid)
+        latency["take"].append(time.perf_counter() - t0)
+        outcome["taken" if h is not None else "lost_after_expiry"] += 1
+
+    users = range(idx * args.users, (idx + 1) * args.users)
+    t0 = time.perf_counter()
+    await asyncio.gather(*(user(uid) for uid in users))
+    elapsed = time.perf_counter() - t0
+    n = 100000
+    t1 = time.perf_counter()
+    for i in range(n):
+        inv.available(kinds[i % len(kinds)])
+    read_ns = (time.perf_counter() - t1) / n * 1e9
+    await inv.close()
+    await db.close()
+    return {
+        "elapsed": elapsed, "outcome": outcome, "read_ns": read_ns,
+        "hold": (len(latency["hold"]), pct(latency["hold"], 50), pct(latency["hold"], 99)),
+        "take": (len(latency["take"]), pct(latency["take"], 50), pct(latency["take"], 99)),
+    }
+
+
+def proc_entry(idx, args, path, out):
+    out.put((idx, asyncio.run(run_proc(idx, args, path))))
+
+
+def check(path, capacity):
+    # Сверка после того, как все процессы закрыли базу
+    con = sqlite3.connect(path)
+    errors = []
+    inventory = {k: (c, h, t) for k, c, h, t in con.execute("SELECT kind, capacity, held, taken FROM inventory")}
+    counted = {(k, s): q for k, s, q in con.execute(
+        "SELECT kind, status, SUM(qty) FROM holds WHERE status IN ('held','taken') GROUP BY kind, status")}
+    for kind, (cap, held, taken) in inventory.items():
+        if held + taken > cap or cap != capacity:
+            errors.append(f"{kind}: held={held} taken={taken} capacity={cap}")
+        if held != counted.get((kind, "held"), 0) or taken != counted.get((kind, "taken"), 0):
+            errors.append(f"{kind}: counters {held}/{taken} != holds "
+                          f"{counted.get((kind, 'held'), 0)}/{counted.get((kind, 'taken'), 0)}")
+    doubles = con.execute(
+        "SELECT COUNT(*) FROM (SELECT tg_id, kind FROM holds WHERE status IN ('held','taken') "
+        "GROUP BY tg_id, kind HAVING COUNT(*) > 1)").fetchone()[0]
+    if doubles:
+        errors.append(f"{doubles} duplicate active holds")
+    con.close()
+    return inventory, errors
+
+
+def main(args):
+    tmp = tempfile.mkdtemp()
+    path = os.path.join(tmp, "bench.db")
+    os.environ["LEGACY_DB_PATH"] = os.path.join(tmp, "none.db")
+    from db import Database
+    from repository import migrate
+
+    async def prepare():
+        db = Database(path)
+        await migrate(db)
+        await db.close()
+
+    asyncio.run(prepare())
+    ctx = mp.get_context("spawn")
+    out = ctx.Queue()
+    procs = [ctx.Process(target=proc_entry, args=(i, args, path, out)) for i in range(args.procs)]
+    t0 = time.perf_counter()
+    for p in procs:
+        p.start()
+    results = dict(out.get() for _ in procs)
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - t0
+
+    outcome = Counter()
+    for r in results.values():
+        outcome.update(r["outcome"])
+    inventory, errors = check(path, args.capacity)
+    total_ops = sum(r["hold"][0] + r["take"][0] for r in results.values())
+    print(f"procs={args.procs} users={args.procs * args.users} capacity={args.capacity}/kind  "
+          f"{elapsed:.1f} s  {total_ops / elapsed:.0f} ops/s")
+    print("outcome:", " ".join(f"{k}={v}" for k, v in sorted(outcome.items())))
+    for idx, r in sorted(results.items()):
+        (hn, h50, h99), (tn, t50, t99) = r["hold"], r["take"]
+        print(f"proc {idx}: hold n={hn} p50={h50:.2f} p99={h99:.2f} ms  "
+              f"take n={tn} p50={t50:.2f} p99={t99:.2f} ms  available() {r['read_ns']:.0f} ns")
+    print("final:", "  ".join(f"{k} taken={t} held={h}/{c}" for k, (c, h, t) in sorted(inventory.items())))
+    if errors:
+        print("INVARIANTS BROKEN:")
+        for e in errors:
+            print(" ", e)
+        sys.exit(1)
+    print("invariants ok: no oversell, counters match holds")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--procs", type=int, default=4)
+    ap.add_argument("--users", type=int, default=2000, help="пользователей на процесс")
+    ap.add_argument("--capacity", type=int, default=50, help="мест каждого вида")
+    ap.add_argument("--ttl", type=float, default=0.5, help="время жизни брони, с")
+    ap.add_argument("--ramp", type=float, default=2.0)
+    main(ap.parse_args(sys.argv[1:]))
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+# Фоновые задачи против обработки апдейтов: поток /start с постоянной частотой
+# идёт через настоящий Dispatcher дважды — без задач и пока все задачи
+# планировщика (напоминания об оплате, бэкап, снимки выгрузок, чистка FSM)
+# запущены разом на базе с --regs регистрациями. Сравниваются задержка
+# апдейтов и подвисания event loop (опоздание sleep(0.005)); по задачам —
+# время выполнения и lag из job_runs.
+#
+#   python bench_jobs.py [--regs 20000] [--rate 50] [--seconds 10] [--concurrency 2] [--latency 0.02]
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from fake_api import FakeSession, fake_bot, make_update_obj
+
+
+def pct(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] * 1000
+
+
+async def loop_lag(samples, stop: asyncio.Event, tick: float = 0.005):
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(tick)
+        samples.append(time.perf_counter() - t0 - tick)
+
+
+async def traffic(dp, bot, ids, users, rate, seconds):
+    # /start от новых пользователей с постоянной частотой; задержка каждого апдейта
+    latency = []
+
+    async def one(update):
+        t0 = time.perf_counter()
+        await dp.feed_update(bot, update)
+        latency.append(time.perf_counter() - t0)
+
+    tasks = []
+    start = time.perf_counter()
+    for i in range(int(rate * seconds)):
+        delay = start + i / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one(make_update_obj(next(ids), next(users), "/start"))))
+    await asyncio.gather(*tasks)
+    return latency
+
+
+async def phase(dp, bot, ids, users, args, jobs=None):
+    samples, stop = [], asyncio.Event()
+    sampler = asyncio.create_task(loop_lag(samples, stop))
+    if jobs is not None:
+        for name in jobs.jobs:
+            jobs.run_now(name)
+    latency = await traffic(dp, bot, ids, users, args.rate, args.seconds)
+    stop.set()
+    await sampler
+    return latency, samples
+
+
+def line(name, latency, samples):
+    return (f"{name:<8} updates={len(latency):<5} p50={pct(latency, 50):7.2f} p99={pct(latency, 99):7.2f} "
+            f"max={max(latency, default=0) * 1000:7.2f} ms   loop stall p99={pct(samples, 99):6.2f} "
+            f"max={max(samples, default=0) * 1000:6.2f} ms")
+
+
+async def amain(args):
+    tmp = tempfile.mkdtemp()
+    os.environ["DB_PATH"] = os.path.join(tmp, "bench.db")
+    os.environ["LEGACY_DB_PATH"] = os.path.join(tmp, "none.db")
+    os.environ["JOB_CONCURRENCY"] = str(args.concurrency)
+    import main
+    from search import phone_key, plate_key
+
+    session = FakeSession(latency=args.latency, record=False)
+    dp, bot = await main.setup_bot(fake_bot(session))
+    throttle = dp["throttle"]
+    throttle.user_burst = throttle.bucket.capacity = throttle.bucket.tokens = 10 ** 9
+    await dp["events"].ready()
+
+    # Половина — «оплачу позже» и зарегистрирована давно: им положены напоминания
+    old = (datetime.utcnow() - timedelta(days=3)).isoformat()
+    rows = []
+    for i in range(args.regs):
+        plate, phone = f"01B{i:06d}", f"+99891{i:07d}"
+        rows.append((10 ** 6 + i, "ru" if i % 3 else "uz", f"User {i}", "Prado", plate, phone,
+                     "later" if i % 2 else "paid", old, plate_key(plate), phone_key(phone)))
+    await main.db.executemany(
+        "INSERT INTO registrations (tg_id, lang, name, car, plate, phone, payment, created_at, plate_rev, phone_rev) "
+        "VALUES (?,?,?,?,?,?,?,?,?,?)", rows,
+    )
+    main.freeze_startup()
+    jobs = await main.start_jobs(dp)
+    ids, users = iter(range(1, 10 ** 9)), iter(range(1, 10 ** 9))
+
+    print(f"regs={args.regs} rate={args.rate}/s seconds={args.seconds} concurrency={args.concurrency} "
+          f"api latency={args.latency * 1000:.0f} ms")
+    print(line("idle", *await phase(dp, bot, ids, users, args)))
+    t0 = time.perf_counter()
+    print(line("jobs", *await phase(dp, bot, ids, users, args, jobs)))
+    while jobs.executor.running or any(f for f in jobs.executor._pending_futures if not f.done()):
+        await asyncio.sleep(0.1)
+    print(f"all jobs done in {time.perf_counter() - t0:.1f} s")
+
+    await asyncio.sleep(0.1)  # job_runs пишется через write-behind очередь
+    rows = await main.db.fetchall(
+        "SELECT job_id, status, finished_at - started_at, started_at - scheduled_at, result FROM job_runs ORDER BY id"
+    )
+    for job_id, status, seconds, lag, result in rows:
+        print(f"  {job_id:<18} {status:<6} run={seconds:7.2f} s  lag={lag:6.2f} s  {result or ''}")
+    jobs.shutdown()
+    await dp["events"].close()
+    await main.close_all()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--regs", type=int, default=20000)
+    ap.add_argument("--rate", type=float, default=50.0, help="апдейтов в секунду")
+    ap.add_argument("--seconds", type=float, default=10.0, help="длительность каждой фазы")
+    ap.add_argument("--concurrency", type=int, default=2, help="JOB_CONCURRENCY")
+    ap.add_argument("--latency", type=float, default=0.02, help="задержка Bot API, с")
+    asyncio.run(amain(ap.parse_args(sys.argv[1:])))
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# Микробенчмарк: сколько CPU и аллокаций на одну отправку экономят готовые
+# клавиатуры и CachedSession против сборки ReplyKeyboardMarkup в каждом хендлере.
+# Приветствие и стартовая клавиатура — из локали --lang (i18n.LOCALES).
+#
+#   python bench_keyboards.py [--n 20000] [--lang ru]
+import argparse
+import sys
+import time
+import tracemalloc
+
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.enums.parse_mode import ParseMode
+from aiogram.methods import SendMessage
+from aiogram.types import KeyboardButton, ReplyKeyboardMarkup
+
+import keyboards
+from fake_api import fake_bot
+from i18n import LANGS, LOCALES, Locale
+from locales import RU
+
+
+def start_kb_rebuilt(t: Locale):
+    # Как было: новая клавиатура на каждое сообщение
+    other = next(LOCALES[lang]["lang_name"] for lang in LANGS if lang != t.lang)
+    return ReplyKeyboardMarkup(
+        keyboard=[
+            [KeyboardButton(text=t["btn_register"])],
+            [KeyboardButton(text=t["btn_info"]), KeyboardButton(text=t["btn_location"])],
+            [KeyboardButton(text=other)],
+        ],
+        resize_keyboard=True
+    )
+
+
+def main_menu_rebuilt(t):
+    return ReplyKeyboardMarkup(
+        keyboard=[
+            [KeyboardButton(text=t["btn_register"])],
+            [KeyboardButton(text=t["btn_info"]), KeyboardButton(text=t["btn_contact"])]
+        ],
+        resize_keyboard=True
+    )
+
+
+def cpu(fn, n):
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) / n
+
+
+def alloc_peak(fn, n=200):
+    # Пик временных аллокаций за одну отправку (байты сверх базовой линии)
+    fn()
+    tracemalloc.start()
+    total = 0
+    for _ in range(n):
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        fn()
+        total += tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return total / n
+
+
+def main(n, lang):
+    bot = fake_bot()
+    plain, cached = AiohttpSession(), keyboards.CachedSession()
+    t = LOCALES[lang]
+    # Как в render_event: готовые аргументы приветствия на языке пользователя
+    welcome = dict(text=t["welcome"], parse_mode=ParseMode.HTML, reply_markup=t.kb["start"])
+
+    def old_welcome():
+        method = SendMessage(chat_id=1, text=t["welcome"], parse_mode=ParseMode.HTML,
+                             reply_markup=start_kb_rebuilt(t))
+        plain.build_form_data(bot, method)
+
+    def new_welcome():
+        method = SendMessage(chat_id=1, **welcome)
+        cached.build_form_data(bot, method)
+
+    def old_menu():
+        plain.build_form_data(bot, SendMessage(chat_id=1, text="menu", reply_markup=main_menu_rebuilt(RU)))
+
+    def new_menu():
+        cached.build_form_data(bot, SendMessage(chat_id=1, text="menu", reply_markup=keyboards.main_menu(RU)))
+
+    assert ([[b.text for b in row] for row in start_kb_rebuilt(t).keyboard]
+            == [[b.text for b in row] for row in t.kb["start"].keyboard])
+    for label, old, new in ((f"/start ({lang}: welcome + kb)", old_welcome, new_welcome),
+                            ("main_menu(RU)", old_menu, new_menu)):
+        t_old, t_new = cpu(old, n), cpu(new, n)
+        a_old, a_new = alloc_peak(old), alloc_peak(new)
+        print(f"{label:<34} rebuilt {t_old * 1e6:7.1f} µs {a_old:8.0f} B   "
+              f"cached {t_new * 1e6:7.1f} µs {a_new:8.0f} B   CPU saved {100 * (1 - t_new / t_old):4.1f}%")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=20000)
+    ap.add_argument("--lang", choices=LANGS, default="ru")
+    args = ap.parse_args(sys.argv[1:])
+    main(args.n, args.lang)
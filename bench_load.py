@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+# Нагрузочный прогон: N пользователей одновременно проходят всю анкету RegForm
+# (name → car → plate → race → race_type → phone → payment → people) через
+# настоящий Dispatcher с router и admin_router. Bot API — FakeSession из
+# fake_api.py: исходящие вызовы записываются, в сеть ничего не уходит.
+# Между шагами — «человеческие» паузы; часть пользователей вводит уже занятый
+# госномер. Отчёт: p50/p95/p99 по шагам, пропускная способность, ожидание БД
+# и рост памяти. --save пишет результат в JSON, --baseline сравнивает с ним.
+#
+#   python bench_load.py [--users 2000] [--think 3.0] [--ramp 60] [--collisions 0.05] [--latency 0.02]
+#   python bench_load.py --save baseline.json
+#   python bench_load.py --baseline baseline.json
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+from fake_api import FakeSession, fake_bot, make_update_obj
+
+# Кнопки русской клавиатуры (locales.py)
+REGISTER = "🚀 Зарегистрироваться"
+YES, NO = "✅ Да", "❌ Нет"
+SPRINT, TRIAL = "🏁 Jeep Sprint", "🧗 Jeep Trial"
+PAID, LATER = "💰 Я оплатил(а)", "⏳ Оплачу позже"
+# Повторов шага, если ответ не пришёл (апдейт отброшен антифлудом)
+# или шаг не принят
+RETRIES = 5
+
+
+def flow(uid, plate, rnd):
+    # [(шаг, текст, состояние после шага)]
+    race = rnd.random() < 0.4
+    steps = [
+        ("start", REGISTER, "RegForm:name"),
+        ("name", f"User {uid}", "RegForm:car"),
+        ("car", rnd.choice(["Toyota Land Cruiser", "Nissan Patrol", "УАЗ Патриот", "Jeep Wrangler"]),
+         "RegForm:plate"),
+        ("plate", plate, "RegForm:race"),
+        ("race", YES if race else NO, "RegForm:race_type" if race else "RegForm:phone"),
+    ]
+    if race:
+        steps.append(("race_type", rnd.choice([SPRINT, TRIAL]), "RegForm:phone"))
+    payment = rnd.choice([PAID, LATER])
+    steps += [
+        ("phone", f"+998 90 {uid:07d}", "RegForm:payment"),
+        ("payment", payment, "RegForm:people"),
+        ("people", str(rnd.randint(1, 5)), "ReceiptForm:photo" if payment == PAID else None),
+    ]
+    return steps
+
+
+class CountingSession(FakeSession):
+    # Плюс счётчик ответов по чатам: так отброшенный антифлудом апдейт
+    # (ответа нет) отличается от отказа хендлера (ответ есть, шаг тот же)
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.replies = Counter()
+
+    async def make_request(self, bot, method, timeout=None):
+        self.replies[getattr(method, "chat_id", None)] += 1
+        return await super().make_request(bot, method, timeout)
+
+
+def pct(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] * 1000
+
+
+def hist_stats(hist, *labels):
+    # (число, среднее мс, ~p95 мс по верхней границе корзины) из метрик процесса
+    slot = hist.values.get(labels)
+    if not slot:
+        return 0, 0.0, 0.0
+    counts, total, n = slot
+    acc, p95 = 0, float("inf")
+    for bound, c in zip(hist.buckets + (float("inf"),), counts):
+        acc += c
+        if acc >= n * 0.95:
+            p95 = bound
+            break
+    return n, total / n * 1000, p95 * 1000
+
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / 2 ** 20
+
+
+async def amain(args):
+    tmp = tempfile.mkdtemp()
+    os.environ["DB_PATH"] = os.path.join(tmp, "bench.db")
+    os.environ["LEGACY_DB_PATH"] = os.path.join(tmp, "none.db")
+    # Места на соревнования не кончаются: прогон меряет анкету, а не отказы
+    os.environ["SPRINT_SLOTS"] = os.environ["TRIAL_SLOTS"] = str(args.users)
+    # Метрики — ради времени запросов к БД в отчёте; сервер не поднимается
+    os.environ.setdefault("METRICS_PORT", "9100")
+    import main
+    import metrics
+    from metrics import DB_BATCH, DB_ERRORS, DB_SECONDS
+
+    session = CountingSession(latency=args.latency)
+    dp, bot = await main.setup_bot(fake_bot(session))
+    if args.no_throttle:
+        throttle = dp["throttle"]
+        throttle.user_burst = throttle.bucket.capacity = throttle.bucket.tokens = 10 ** 9
+    gc.collect()
+    rss0 = rss_mb()
+
+    rnd = random.Random(args.seed)
+    users = [100000 + i for i in range(args.users)]
+    plates = {uid: f"01L{uid:06d}AA" for uid in users}
+    for uid in users[10:]:
+        # Коллизия: госномер уже зарегистрированного (или регистрирующегося) соседа
+        if rnd.random() < args.collisions:
+            plates[uid] = plates[users[rnd.randrange(10)]]
+
+    ids = iter(range(1, 10 ** 9))
+    latency = defaultdict(list)
+    outcome = Counter()
+    retries = Counter()
+    sent = 0
+
+    async def user(uid):
+        nonlocal sent
+        urnd = random.Random(uid ^ args.seed)
+        state = dp.fsm.get_context(bot, chat_id=uid, user_id=uid)
+        await asyncio.sleep(urnd.uniform(0, args.ramp))
+        for step, text, expect in flow(uid, plates[uid], urnd):
+            for attempt in range(RETRIES + 1):
+                replies = session.replies[uid]
+                t0 = time.perf_counter()
+                await dp.feed_update(bot, make_update_obj(next(ids), uid, text))
+                latency[step].append(time.perf_counter() - t0)
+                sent += 1
+                current = await state.get_state()
+                if current == expect:
+                    break
+                if session.replies[uid] > replies and step in ("plate", "phone", "people"):
+                    # Госномер или телефон заняты: отказ на своём шаге или,
+                    # если сосед ещё дописывал анкету, на INSERT
+                    outcome[f"duplicate_{step}"] += 1
+                    await state.clear()
+                    return
+                retries[step] += 1
+                await asyncio.sleep(urnd.expovariate(1 / args.think))
+            else:
+                outcome["stalled"] += 1
+                return
+            await asyncio.sleep(urnd.expovariate(1 / args.think))
+        outcome["registered"] += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(user(uid) for uid in users))
+    elapsed = time.perf_counter() - t0
+    await dp["events"].active().receipts.join()
+    gc.collect()
+    rss1 = rss_mb()
+
+    regs = (await main.db.fetchone("SELECT COUNT(*) FROM registrations"))[0]
+    throttle_stats = dp["throttle"].stats()
+    fsm_cached = len(dp.storage._cache)
+    await dp["events"].close()
+    await main.close_all()
+
+    result = {
+        "users": args.users,
+        "seconds": round(elapsed, 3),
+        "updates": sent,
+        "updates_per_s": round(sent / elapsed, 1),
+        "registrations_per_s": round(outcome["registered"] / elapsed, 2),
+        "outcome": dict(outcome),
+        "registrations": regs,
+        "retries": dict(retries),
+        "api_calls": len(session.calls),
+        "steps": {
+            step: {"n": len(v), "p50": round(pct(v, 50), 2), "p95": round(pct(v, 95), 2),
+                   "p99": round(pct(v, 99), 2)}
+            for step, v in latency.items()
+        },
+        "rss_mb": [round(rss0, 1), round(rss1, 1)],
+        "fsm_cached": fsm_cached,
+        "throttle": throttle_stats,
+    }
+    if metrics.ENABLED:
+        result["db"] = {
+            op: dict(zip(("n", "mean_ms", "p95_ms"), (round(x, 2) for x in hist_stats(DB_SECONDS, op))))
+            for (op,) in DB_SECONDS.values
+        }
+        n, mean, _ = hist_stats(DB_BATCH)
+        result["db_batch_mean"] = round(mean / 1000, 1)
+        result["db_errors"] = {op: v for (op,), v in DB_ERRORS.values.items()}
+    return result
+
+
+def report(r, base=None):
+    def delta(path, value):
+        if base is None:
+            return ""
+        ref = base
+        for key in path:
+            ref = ref.get(key) if isinstance(ref, dict) else None
+        if not ref:
+            return ""
+        return f" ({(value - ref) / ref * 100:+.0f}%)"
+
+    print(f"users={r['users']}  {r['seconds']:.1f} s  updates={r['updates']}  "
+          f"{r['updates_per_s']:.0f} upd/s{delta(('updates_per_s',), r['updates_per_s'])}  "
+          f"{r['registrations_per_s']:.1f} reg/s")
+    print("outcome:", " ".join(f"{k}={v}" for k, v in r["outcome"].items()),
+          f" rows={r['registrations']}  retries={sum(r['retries'].values())}  api_calls={r['api_calls']}")
+    print(f"{'step':>10} {'n':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for step, s in r["steps"].items():
+        print(f"{step:>10} {s['n']:>7} {s['p50']:>9.2f} {s['p95']:>9.2f} {s['p99']:>9.2f}"
+              f"{delta(('steps', step, 'p99'), s['p99'])}")
+    if "db" in r:
+        print("db:", "  ".join(f"{op} n={s['n']} mean={s['mean_ms']:.2f}ms p95<={s['p95_ms']:.1f}ms"
+                               for op, s in sorted(r["db"].items())))
+        print(f"db: batch mean={r['db_batch_mean']}  errors={r['db_errors'] or 0}")
+    rss0, rss1 = r["rss_mb"]
+    was = f", baseline +{base['rss_mb'][1] - base['rss_mb'][0]:.1f}" if base else ""
+    print(f"memory: rss {rss0:.1f} -> {rss1:.1f} MB (+{rss1 - rss0:.1f}{was})  fsm cache={r['fsm_cached']}")
+    t = r["throttle"]
+    print(f"throttle: passed={t['passed']} dropped={t['dropped_user'] + t['dropped_global'] + t['dropped_inflight']}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=2000)
+    ap.add_argument("--think", type=float, default=3.0, help="средняя пауза между шагами, с")
+    ap.add_argument("--ramp", type=float, default=60.0, help="пользователи приходят в течение, с")
+    ap.add_argument("--collisions", type=float, default=0.05)
+    ap.add_argument("--latency", type=float, default=0.02, help="задержка Bot API, с")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--no-throttle", action="store_true")
+    ap.add_argument("--save")
+    ap.add_argument("--baseline")
+    args = ap.parse_args(sys.argv[1:])
+    result = asyncio.run(amain(args))
+    base = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            base = json.load(f)
+    report(result, base)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(result, f, ensure_ascii=False, indent=1)
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# Цена метрик: observe()/inc() в наносекундах и полный прогон анкеты RegForm
+# через Dispatcher с метриками и без (METRICS_PORT=0) — в отдельных процессах,
+# потому что инструментирование БД решается при импорте.
+#
+#   python bench_metrics.py [--users 300] [--rounds 3]
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+STEPS = 10
+
+
+def flow(uid):
+    return ["/start", "🚀 Зарегистрироваться / Ro‘yxatdan o‘tish", "Test User", "Toyota Land Cruiser",
+            f"01A{uid:06d}AA", "✅ Да / Ha", "🏁 Jeep Sprint", f"+9989{uid:08d}",
+            "⏳ Оплачу позже / Keyin to‘layman", "3"]
+
+
+def micro(n=1_000_000):
+    from metrics import Counter, Histogram
+
+    h = Histogram("bench_seconds", "bench", ("handler", "state"))
+    c = Counter("bench_total", "bench", ("op",))
+    t0 = time.perf_counter()
+    for i in range(n):
+        h.observe(0.003, "reg_plate", "RegForm:plate")
+    t_obs = (time.perf_counter() - t0) / n
+    t0 = time.perf_counter()
+    for i in range(n):
+        c.inc("fetchone")
+    t_inc = (time.perf_counter() - t0) / n
+    t0 = time.perf_counter()
+    for i in range(n):
+        time.perf_counter()
+    t_clock = (time.perf_counter() - t0) / n
+    print(f"micro  Histogram.observe {t_obs * 1e9:.0f} ns  Counter.inc {t_inc * 1e9:.0f} ns  "
+          f"perf_counter {t_clock * 1e9:.0f} ns")
+
+
+async def child(args):
+    os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(), "bench.db")
+    import main
+    import metrics
+    from fake_api import fake_bot, make_update_obj
+
+    dp, bot = await main.setup_bot(fake_bot())
+    # Анкету проходят быстрее живого человека — антифлуд здесь не меряем
+    throttle = dp["throttle"]
+    throttle.user_burst = throttle.bucket.capacity = throttle.bucket.tokens = 10 ** 9
+    ids = iter(range(1, 10 ** 9))
+
+    async def user(uid):
+        for text in flow(uid):
+            await dp.feed_update(bot, make_update_obj(next(ids), uid, text))
+
+    t0 = time.perf_counter()
+    for r in range(args.rounds):
+        await asyncio.gather(*(user(100000 + r * args.users + i) for i in range(args.users)))
+    elapsed = time.perf_counter() - t0
+    updates = args.rounds * args.users * STEPS
+    regs = (await main.db.fetchone("SELECT COUNT(*) FROM registrations"))[0]
+    result = {"per_update_us": elapsed / updates * 1e6, "registrations": regs}
+    if metrics.ENABLED:
+        t0 = time.perf_counter()
+        text = metrics.REGISTRY.render()
+        result.update(render_ms=(time.perf_counter() - t0) * 1000, render_bytes=len(text),
+                      series=sum(1 for line in text.splitlines() if line and not line.startswith("#")))
+    await main.close_all()
+    print(json.dumps(result))
+
+
+def run_child(args, enabled):
+    env = dict(os.environ, METRICS_PORT="9100" if enabled else "0")
+    out = subprocess.run([sys.executable, __file__, "--child", "--users", str(args.users),
+                          "--rounds", str(args.rounds)], env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def parent(args):
+    micro()
+    runs = {False: [], True: []}
+    for _ in range(args.repeat):
+        for enabled in (False, True):
+            runs[enabled].append(run_child(args, enabled))
+    off = min(r["per_update_us"] for r in runs[False])
+    on = min(r["per_update_us"] for r in runs[True])
+    last = runs[True][-1]
+    print(f"e2e    {args.rounds * args.users} registrations x {STEPS} updates, best of {args.repeat}")
+    print(f"       metrics off {off:7.1f} µs/update   on {on:7.1f} µs/update   overhead {100 * (on / off - 1):+.1f}%")
+    print(f"/metrics  {last['series']} series, {last['render_bytes']} bytes, rendered in {last['render_ms']:.2f} ms")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=300)
+    ap.add_argument("--rounds", type=int, default=3)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--child", action="store_true")
+    args = ap.parse_args(sys.argv[1:])
+    if args.child:
+        asyncio.run(child(args))
+    else:
+        parent(args)
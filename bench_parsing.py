@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+# Разбор ответов анкеты: корпус правильных ответов (прогоняется первым,
+# расхождение — ошибка) и скорость старых цепочек `"да" in t or "ha" in t ...`
+# с re.sub на каждый вызов против parsing.py. Старые версии разбираются на том же
+# корпусе, чтобы было видно, где они ошибались.
+#
+#   python bench_parsing.py [--rounds 20000]
+import argparse
+import re
+import sys
+import time
+
+from parsing import PAYMENT, RACE, RACE_TYPE, parse_people, parse_phone, parse_plate
+
+# (поле, ввод, ожидаемое значение)
+CORPUS = [
+    ("race", "✅ Да / Ha", "yes"),
+    ("race", "❌ Нет / Yo‘q", "no"),
+    ("race", "да", "yes"),
+    ("race", "Ha, albatta", "yes"),
+    ("race", "нет", "no"),
+    ("race", "yo'q", "no"),
+    ("race", "Yoʻq", "no"),
+    ("race", "hammasi bo'lib yo'q", None),
+    ("race", "Shahar bo'ylab", None),
+    ("race", "надо подумать", None),
+    ("race", "ДА!", "yes"),
+    ("race_type", "🏁 Jeep Sprint", "Jeep Sprint"),
+    ("race_type", "🧗 Jeep Trial", "Jeep Trial"),
+    ("race_type", "джип-спринт", "Jeep Sprint"),
+    ("race_type", "хочу на триал", "Jeep Trial"),
+    ("race_type", "не знаю", None),
+    ("payment", "💰 Я оплатил(а) / To‘lov qildim", "paid"),
+    ("payment", "⏳ Оплачу позже / Keyin to‘layman", "later"),
+    ("payment", "❌ Отмена / Bekor qilish", "cancel"),
+    ("payment", "оплачу завтра", "later"),
+    ("payment", "оплатила", "paid"),
+    ("payment", "To'ladim", "paid"),
+    ("payment", "keyinroq", "later"),
+    ("payment", "отменить", "cancel"),
+    ("payment", "что такое оплата?", None),
+    ("plate", "01A777AA", ("01A777AA", "UZ")),
+    ("plate", "01 а 777 аа", ("01A777AA", "UZ")),
+    ("plate", "01 777 AAA", ("01777AAA", "UZ")),
+    ("plate", "KZ 321ABC05", ("321ABC05", "KZ")),
+    ("plate", "321 ABC 05", ("321ABC05", "KZ")),
+    ("plate", "А123ВС77", ("A123BC77", "RU")),
+    ("plate", "a123bc 777", ("A123BC777", "RU")),
+    ("plate", "TJ 1234", ("TJ1234", None)),
+    ("plate", "01-", None),
+    ("phone", "+998 90 123 45 67", ("+998901234567", "UZ")),
+    ("phone", "998901234567", ("+998901234567", "UZ")),
+    ("phone", "90 123-45-67", ("+998901234567", "UZ")),
+    ("phone", "(90) 1234567", ("+998901234567", "UZ")),
+    ("phone", "+7 701 123 45 67", ("+77011234567", "KZ")),
+    ("phone", "8 (701) 123-45-67", ("+77011234567", "KZ")),
+    ("phone", "+7 912 345-67-89", ("+79123456789", "RU")),
+    ("phone", "89123456789", ("+79123456789", "RU")),
+    ("phone", "00992 93 123 4567", ("+992931234567", None)),
+    ("phone", "12345", None),
+    ("phone", "телефон", None),
+    ("people", "3", 3),
+    ("people", "3 человека", 3),
+    ("people", "2-3", 2),
+    ("people", "0", None),
+    ("people", "много", None),
+]
+
+PARSERS = {
+    "race": lambda t: RACE.match(t).value,
+    "race_type": lambda t: RACE_TYPE.match(t).value,
+    "payment": lambda t: PAYMENT.match(t).value,
+    "plate": lambda t: tuple(p) if (p := parse_plate(t)) else None,
+    "phone": lambda t: tuple(p) if (p := parse_phone(t)) else None,
+    "people": parse_people,
+}
+
+
+# ================== Прежние версии из main.py ==================
+def legacy_race(t):
+    t = (t or "").lower()
+    if "да" in t or "ha" in t:
+        return "yes"
+    if "нет" in t or "yo‘q" in t or "yoq" in t or "yok" in t:
+        return "no"
+    return None
+
+
+def legacy_race_type(t):
+    t = (t or "").lower()
+    if "sprint" in t:
+        return "Jeep Sprint"
+    if "trial" in t:
+        return "Jeep Trial"
+    return None
+
+
+def legacy_payment(t):
+    t = (t or "").lower()
+    if "оплачу" in t or "keyin" in t:
+        return "later"
+    if "оплат" in t or "to‘lov" in t or "tolov" in t:
+        return "paid"
+    if "отмена" in t or "bekor" in t:
+        return "cancel"
+    return None
+
+
+def legacy_plate(t):
+    plate = (t or "").strip().upper()
+    return (plate, None) if len(plate) >= 4 else None
+
+
+def legacy_phone(t):
+    phone = re.sub(r"[^\d+]", "", (t or "").strip())
+    if not phone.startswith("+") or not (7 <= len(re.sub(r"\D", "", phone)) <= 15):
+        return None
+    return (phone, None)
+
+
+def legacy_people(t):
+    digits = re.sub(r"\D", "", (t or ""))
+    return int(digits) if digits else None
+
+
+LEGACY = {
+    "race": legacy_race,
+    "race_type": legacy_race_type,
+    "payment": legacy_payment,
+    "plate": legacy_plate,
+    "phone": legacy_phone,
+    "people": legacy_people,
+}
+
+
+def check():
+    failed = 0
+    for field, text, expected in CORPUS:
+        got = PARSERS[field](text)
+        if got != expected:
+            failed += 1
+            print(f"FAIL {field:>9} {text!r}: {got!r} != {expected!r}")
+    legacy_wrong = sum(1 for field, text, expected in CORPUS if LEGACY[field](text) != expected)
+    print(f"corpus: {len(CORPUS)} cases, failed={failed}; прежний разбор ошибается в {legacy_wrong}")
+    return failed == 0
+
+
+def bench(fn, texts, rounds):
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        for text in texts:
+            fn(text)
+    return (time.perf_counter() - t0) / (rounds * len(texts)) * 1e9
+
+
+def main(args):
+    if not check():
+        sys.exit(1)
+    # Нажатие кнопки — самый частый ввод; отдельно от набранного вручную текста
+    groups = {}
+    for field, text, _ in CORPUS:
+        kind = "button" if text in getattr(PARSERS[field], "__self__", {}) else "typed"
+        groups.setdefault((field, kind), []).append(text)
+    for table, field in ((RACE, "race"), (RACE_TYPE, "race_type"), (PAYMENT, "payment")):
+        # Кнопка — только текст клавиатуры; типовые слова («да») — набранный ввод
+        texts = groups.pop((field, "typed"), []) + groups.pop((field, "button"), [])
+        for kind, exact in (("button", True), ("typed", False)):
+            group = [t for t in texts if table.match(t).exact is exact]
+            if group:
+                groups[(field, kind)] = group
+    # cold — набранный ответ встретился впервые (мимо IntentTable.seen)
+    cold = {"race": RACE, "race_type": RACE_TYPE, "payment": PAYMENT}
+    print(f"{'field':>10} {'input':>7} {'legacy ns':>10} {'parsing ns':>11} {'cold ns':>8}")
+    for (field, kind), texts in sorted(groups.items()):
+        old = bench(LEGACY[field], texts, args.rounds)
+        new = bench(PARSERS[field], texts, args.rounds)
+        first = bench(cold[field]._match, texts, args.rounds) if kind == "typed" and field in cold else new
+        print(f"{field:>10} {kind:>7} {old:>10.0f} {new:>11.0f} {first:>8.0f}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rounds", type=int, default=20000)
+    main(ap.parse_args(sys.argv[1:]))
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+# Чеки через настоящий Dispatcher: хендлер должен отвечать сразу, сколько бы
+# ни шли скачивание и хэш. Скачивание подменяется задержкой и синтетическим
+# JPEG; часть пользователей присылает чужой чек — тем же файлом или пережатым
+# скриншотом (другой размер и качество). Проверяем, что дубли пойманы.
+#
+#   python bench_receipts.py [--users 300] [--rate 200] [--download 0.2] [--reused 0.1]
+import argparse
+import asyncio
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+from aiogram.types import Update
+from PIL import Image, ImageDraw
+
+from fake_api import FakeSession, fake_bot, make_photo_update
+
+
+def receipt_image(seed: int, side: int, quality: int) -> bytes:
+    # «Скриншот чека»: блоки, уникальные для seed; пересохранённая копия —
+    # тот же рисунок, уменьшенный до side и сжатый с другим качеством
+    rnd = random.Random(seed)
+    img = Image.new("L", (1280, 1280), 255)
+    draw = ImageDraw.Draw(img)
+    for _ in range(12):
+        x, y = rnd.randrange(1280), rnd.randrange(1280)
+        draw.rectangle([x, y, x + rnd.randrange(160, 640), y + rnd.randrange(80, 320)], fill=rnd.randrange(0, 200))
+    if side != 1280:
+        img = img.resize((side, side))
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def amain(args):
+    tmp = tempfile.mkdtemp()
+    os.environ["DB_PATH"] = os.path.join(tmp, "bench.db")
+    import main
+
+    bot = fake_bot(FakeSession())
+    dp, bot = await main.setup_bot(bot)
+    pipeline = dp["events"].active().receipts
+    rnd = random.Random(1)
+
+    users = [100000 + i for i in range(args.users)]
+    # file_id -> JPEG: что «лежит на серверах Telegram»
+    files = {}
+    plan = {}
+    own = []
+    expected = set()
+    for i, uid in enumerate(users):
+        reg_id = await main.add_registration(main.db, uid, f"User {i}", "Prado", f"01B{i:05d}AA", f"+99891{i:07d}",
+                                             payment="paid")
+        state = dp.fsm.get_context(bot, chat_id=uid, user_id=uid)
+        await state.set_state(main.ReceiptForm.photo)
+        await state.set_data({"reg_id": reg_id})
+        kind = "own"
+        if i >= 10 and rnd.random() < args.reused:
+            kind = rnd.choice(["file", "similar"])
+            expected.add(uid)
+        if kind == "file":
+            donor = rnd.choice(own)
+            plan[uid] = (f"f{donor}", f"u{donor}")
+        else:
+            seed = rnd.choice(own) if kind == "similar" else uid
+            # Картинки готовим заранее, чтобы их генерация не грузила event loop
+            files[f"f{uid}"] = receipt_image(seed, 1280 if kind == "own" else 1000, 90 if kind == "own" else 60)
+            plan[uid] = (f"f{uid}", f"u{uid}")
+            if kind == "own":
+                own.append(uid)
+
+    async def fetch(file_id):
+        await asyncio.sleep(args.download)
+        return files[file_id.rsplit("_", 1)[0]]
+
+    pipeline.fetch = fetch
+    latencies = []
+
+    async def send(n, uid):
+        file_id, unique = plan[uid]
+        update = Update.model_validate(make_photo_update(n, uid, file_id, unique))
+        t0 = time.perf_counter()
+        await dp.feed_update(bot, update)
+        latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    tasks = []
+    for n, uid in enumerate(users, start=1):
+        tasks.append(asyncio.create_task(send(n, uid)))
+        await asyncio.sleep(1 / args.rate)
+    await asyncio.gather(*tasks)
+    accepted = time.perf_counter() - t0
+    await pipeline.join()
+    drained = time.perf_counter() - t0
+
+    rows = await main.db.fetchall("SELECT tg_id, dup_kind FROM receipts")
+    flagged = {tg_id for tg_id, kind in rows if kind}
+    paid_pending = (await main.db.fetchone(
+        "SELECT COUNT(*) FROM registrations WHERE pay_status='paid_pending'"))[0]
+    stats = pipeline.stats()
+    await dp["events"].close()
+    await main.close_all()
+
+    print(f"users={args.users} rate={args.rate:.0f}/s download={args.download * 1000:.0f} ms  workers={pipeline.workers} "
+          f"processes={pipeline.processes}")
+    print(f"handler: p50={pct(latencies, 0.5) * 1000:.1f} ms  p99={pct(latencies, 0.99) * 1000:.1f} ms  "
+          f"max={max(latencies) * 1000:.1f} ms  (all accepted in {accepted:.2f} s)")
+    print(f"pipeline drained in {drained:.2f} s  " + " ".join(f"{k}={v}" for k, v in stats.items()))
+    print(f"duplicates: expected={len(expected)} flagged={len(flagged)} "
+          f"missed={len(expected - flagged)} false={len(flagged - expected)}  paid_pending={paid_pending}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=300)
+    ap.add_argument("--rate", type=float, default=200.0)
+    ap.add_argument("--download", type=float, default=0.2)
+    ap.add_argument("--reused", type=float, default=0.1)
+    asyncio.run(amain(ap.parse_args(sys.argv[1:])))
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+# Старт бота: время импорта (python -X importtime, самые тяжёлые модули) и время
+# от запуска процесса до первого ответа. Каждый прогон — отдельный процесс,
+# который поднимает main.main() в режиме polling против заглушки Bot API с
+# задержкой --rtt на запрос; первый getUpdates отдаёт /start, замер — до
+# sendMessage с ответом. Сравниваются FAST_START=0 и FAST_START=1, первый запуск
+# (пустая база, все миграции) отдельно от рестартов.
+#
+#   python bench_startup.py [--runs 5] [--rtt 0.1] [--top 10]
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Подсистемы, которые на старте грузиться не должны
+LAZY = ("openpyxl", "concurrent.futures.process", "webhook", "workers")
+
+
+# ================== Child ==================
+def child(args):
+    import main
+
+    t_import = time.time()
+    from aiogram.methods import GetMe, GetUpdates, SendMessage
+    from aiogram.types import User
+
+    from fake_api import FakeSession, fake_bot, make_update_obj
+
+    class TelegramStub(FakeSession):
+        def __init__(self, rtt, update):
+            super().__init__(latency=rtt, record=False)
+            self.update = update
+            self.polling = self.replied = None
+            self.done = asyncio.Event()
+
+        async def make_request(self, bot, method, timeout=None):
+            if isinstance(method, GetMe):
+                await asyncio.sleep(self.latency)
+                return User(id=1, is_bot=True, first_name="Bench", username="bench_bot")
+            if isinstance(method, GetUpdates):
+                self.polling = self.polling or time.time()
+                await asyncio.sleep(self.latency)
+                if self.update is not None:
+                    update, self.update = self.update, None
+                    return [update]
+                await asyncio.sleep(3600)
+                return []
+            result = await super().make_request(bot, method, timeout)
+            if isinstance(method, SendMessage) and self.replied is None:
+                self.replied = time.time()
+                self.done.set()
+            return result
+
+    async def run():
+        # update_id новый на каждый прогон: повтор в той же базе отбросит дедуп
+        session = TelegramStub(args.rtt, make_update_obj(time.time_ns() // 1000 % 2 ** 31, 1000, "/start"))
+        task = asyncio.create_task(main.main(fake_bot(session)))
+        await session.done.wait()
+        loaded = [m for m in LAZY if m in sys.modules]
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return {"import": t_import, "polling": session.polling, "reply": session.replied, "loaded": loaded}
+
+    print(json.dumps(asyncio.run(run())))
+
+
+# ================== Parent ==================
+def env_for(tmp, fast):
+    return {
+        **os.environ,
+        "DB_PATH": os.path.join(tmp, "bot.db"),
+        "LEGACY_DB_PATH": os.path.join(tmp, "none.db"),
+        "METRICS_PORT": "0",
+        "BOT_MODE": "polling",
+        "BOT_WORKERS": "1",
+        "FAST_START": "1" if fast else "0",
+    }
+
+
+def import_profile(tmp, top):
+    # Модули верхнего уровня по суммарному времени импорта (с зависимостями)
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                         env=env_for(tmp, True), capture_output=True, text=True, check=True).stderr
+    # Строка: "import time: <self us> | <cumulative us> | <отступ по вложенности><модуль>"
+    rows = {}
+    for line in out.splitlines():
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        depth = len(parts[2]) - len(parts[2].lstrip()) - 1
+        rows.setdefault(depth, []).append((int(parts[1]), parts[2].strip()))
+    main_us = next((us for us, name in rows.get(0, []) if name == "main"), 0)
+    return main_us / 1000, sorted(rows.get(2, []), reverse=True)[:top]
+
+
+def run_once(tmp, fast, rtt):
+    t0 = time.time()
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", "--rtt", str(rtt)],
+                         env=env_for(tmp, fast), capture_output=True, text=True, timeout=60)
+    if out.returncode != 0 or not out.stdout.strip():
+        sys.exit(f"child failed:\n{out.stderr[-2000:]}")
+    r = json.loads(out.stdout.strip().splitlines()[-1])
+    return {k: (r[k] - t0) * 1000 for k in ("import", "polling", "reply")}, r["loaded"]
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        main_ms, top = import_profile(tmp, args.top)
+        print(f"import main: {main_ms:.0f} ms (python -X importtime)")
+        for us, name in top:
+            print(f"  {name:<30} {us / 1000:8.1f} ms")
+
+    print(f"\ntime to first response, rtt={args.rtt * 1000:.0f} ms, {args.runs} restarts per mode")
+    print(f"{'mode':<12} {'run':<9} {'import':>9} {'polling':>9} {'reply':>9}   loaded at reply")
+    for fast in (False, True):
+        mode = "fast" if fast else "sequential"
+        with tempfile.TemporaryDirectory() as tmp:
+            first, loaded = run_once(tmp, fast, args.rtt)
+            print(f"{mode:<12} {'first':<9} {first['import']:9.0f} {first['polling']:9.0f} {first['reply']:9.0f}   "
+                  f"{', '.join(loaded) or '-'}")
+            runs = [run_once(tmp, fast, args.rtt)[0] for _ in range(args.runs)]
+        med = {k: statistics.median(r[k] for r in runs) for k in ("import", "polling", "reply")}
+        print(f"{mode:<12} {'restart':<9} {med['import']:9.0f} {med['polling']:9.0f} {med['reply']:9.0f}   (median, ms)")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--rtt", type=float, default=0.1, help="задержка Bot API на запрос, с")
+    ap.add_argument("--top", type=int, default=10)
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args(sys.argv[1:])
+    child(args) if args.child else main(args)
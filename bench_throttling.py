@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# Синтетический флуд через настоящий Dispatcher: часть пользователей спамит /start
+# и число на шаге RegForm.people, остальные пишут в человеческом темпе.
+# Проверяем, что спам отбрасывается, живые пользователи не страдают, а
+# отброшенные апдейты не доходят до БД (в processed_updates только пропущенные).
+#
+#   python bench_throttling.py [--spammers 20] [--users 200] [--seconds 3]
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from fake_api import FakeSession, fake_bot, make_update_obj
+
+
+async def amain(args):
+    tmp = tempfile.mkdtemp()
+    os.environ["DB_PATH"] = os.path.join(tmp, "bench.db")
+    import main
+
+    session = FakeSession(latency=args.latency)
+    bot = fake_bot(session)
+    dp, bot = await main.setup_bot(bot, dedup=True)
+    throttle = dp["throttle"]
+
+    spammers = [500000 + i for i in range(args.spammers)]
+    users = [100000 + i for i in range(args.users)]
+    # Половина спамеров долбит шаг people с уже заполненной анкетой
+    for i, uid in enumerate(spammers[::2]):
+        state = dp.fsm.get_context(bot, chat_id=uid, user_id=uid)
+        await state.set_state(main.RegForm.people)
+        await state.set_data({"name": f"Spam {uid}", "car": "UAZ", "plate": f"01S{i:05d}AA",
+                              "phone": f"+99890{i:07d}", "race": "no", "race_type": "-", "payment": "later"})
+
+    spammers_set = set(spammers)
+    ids = iter(range(1, 10 ** 9))
+    tasks = []
+    sent = Counter()
+
+    async def send(uid, text):
+        sent[uid in spammers_set] += 1
+        tasks.append(asyncio.create_task(dp.feed_update(bot, make_update_obj(next(ids), uid, text))))
+
+    t0 = time.perf_counter()
+    end = t0 + args.seconds
+    tick = 1 / args.spam_rate
+    next_human = {uid: t0 + (uid % 20) / 10 for uid in users}
+    while time.perf_counter() < end:
+        now = time.perf_counter()
+        for i, uid in enumerate(spammers):
+            await send(uid, "2" if i % 2 == 0 else "/start")
+        for uid in users:
+            if now >= next_human[uid]:
+                await send(uid, "/start")
+                next_human[uid] = now + args.think
+        await asyncio.sleep(tick)
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - t0
+
+    replies = Counter()
+    for _, method in session.calls:
+        # getMe (ссылка на билет) — не ответ пользователю
+        if hasattr(method, "chat_id"):
+            replies[method.chat_id in spammers_set] += 1
+    touched = (await main.db.fetchone("SELECT COUNT(*) FROM processed_updates"))[0]
+    regs = (await main.db.fetchone("SELECT COUNT(*) FROM registrations"))[0]
+    stats = throttle.stats()
+    await main.close_all()
+
+    print(f"flood {elapsed:.1f} s: spam updates={sent[True]} ({args.spam_rate:.0f}/s per spammer), "
+          f"human updates={sent[False]}")
+    print(f"replies: to spammers={replies[True]}  to humans={replies[False]} "
+          f"(humans lost {sent[False] - replies[False]})")
+    print("throttle:", " ".join(f"{k}={v}" for k, v in stats.items()))
+    print(f"db: processed_updates rows={touched} (== passed: {touched == stats['passed']})  "
+          f"registrations={regs}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--spammers", type=int, default=20)
+    ap.add_argument("--users", type=int, default=200)
+    ap.add_argument("--seconds", type=float, default=3.0)
+    ap.add_argument("--spam-rate", type=float, default=50.0)
+    ap.add_argument("--think", type=float, default=2.0)
+    ap.add_argument("--latency", type=float, default=0.02)
+    asyncio.run(amain(ap.parse_args(sys.argv[1:])))
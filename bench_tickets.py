@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+# Проверка билетов на воротах. Сначала — сама проверка на --regs
+# регистрациях: подпись (TicketSigner.verify), полная проверка с карточкой из
+# индекса (TicketBook.check), офлайн-индекс без секрета (OfflineIndex.check)
+# и для сравнения — чтение строки из базы на каждый скан; каждая десятая
+# подделка. Затем — поток сканов /start <код> от админа в режиме /checkin
+# через настоящий Dispatcher: задержка ответа, сканов в секунду и сколько
+# отметок уходит в базу одной транзакцией write-behind очереди.
+#
+#   python bench_tickets.py [--regs 5000] [--rounds 50000] [--scans 2000] [--concurrency 50] [--latency 0.02]
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+from fake_api import FakeSession, fake_bot, make_update_obj
+
+ADMIN = "UkAkbar"
+
+
+def pct(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] * 1000
+
+
+def per_op(name, seconds, n, ok):
+    print(f"  {name:<22} {seconds / n * 1e6:8.2f} µs/op  {n / seconds:>10,.0f} ops/s  valid={ok}")
+
+
+async def amain(args):
+    tmp = tempfile.mkdtemp()
+    os.environ["DB_PATH"] = os.path.join(tmp, "bench.db")
+    os.environ["LEGACY_DB_PATH"] = os.path.join(tmp, "none.db")
+    os.environ["TICKET_SECRET"] = "bench-secret"
+    # Метрики процесса — ради размера батчей записи; сервер не поднимается
+    os.environ.setdefault("METRICS_PORT", "9100")
+    import main
+    from metrics import DB_BATCH
+    from search import phone_key, plate_key
+    from tickets import OfflineIndex, render_qr
+
+    session = FakeSession(latency=args.latency, record=False)
+    dp, bot = await main.setup_bot(fake_bot(session))
+    throttle = dp["throttle"]
+    throttle.user_burst = throttle.bucket.capacity = throttle.bucket.tokens = 10 ** 9
+    await dp["events"].ready()
+    ev = dp["events"].active()
+    db, book = ev.db, ev.tickets
+
+    rows = []
+    for i in range(args.regs):
+        plate, phone = f"01T{i:06d}", f"+99893{i:07d}"
+        rows.append((10 ** 6 + i, f"User {i}", "Patrol", plate, phone, 1 + i % 5,
+                     "paid_confirmed" if i % 2 else None, plate_key(plate), phone_key(phone)))
+    await db.executemany(
+        "INSERT INTO registrations (tg_id, name, car, plate, phone, people, pay_status, plate_rev, phone_rev) "
+        "VALUES (?,?,?,?,?,?,?,?,?)", rows,
+    )
+    await book.load()
+    regs = [(rid, plate, status) for rid, plate, status in
+            await db.fetchall("SELECT id, plate, pay_status FROM registrations ORDER BY id")]
+    rnd = random.Random(1)
+    codes = []
+    for rid, plate, status in regs:
+        code = book.issue(rid, plate, status)
+        # Каждый десятый — подделка: испорчен последний символ подписи
+        codes.append(code[:-1] + ("A" if code[-1] != "A" else "B") if rid % 10 == 0 else code)
+    rnd.shuffle(codes)
+    sample = [codes[i % len(codes)] for i in range(args.rounds)]
+
+    print(f"regs={args.regs} rounds={args.rounds}")
+    t0 = time.perf_counter()
+    offline = OfflineIndex(await asyncio.get_running_loop().run_in_executor(None, book.export))
+    size = len(book.export())
+    print(f"  offline index: {size / 1024:.1f} KB, {size / max(1, len(book)):.0f} B/ticket, "
+          f"export+load {(time.perf_counter() - t0) * 1000:.1f} ms")
+    t0 = time.perf_counter()
+    png = render_qr(f"https://t.me/fake_bot?start={codes[0]}")
+    t1 = time.perf_counter()
+    for code in codes[:20]:
+        render_qr(f"https://t.me/fake_bot?start={code}")
+    print(f"  QR: {len(png)} B PNG, first {(t1 - t0) * 1000:.1f} ms (with import), "
+          f"then {(time.perf_counter() - t1) / 20 * 1000:.2f} ms")
+
+    t0 = time.perf_counter()
+    ok = sum(book.signer.verify(c) is not None for c in sample)
+    per_op("signer.verify", time.perf_counter() - t0, len(sample), ok)
+    t0 = time.perf_counter()
+    ok = 0
+    for c in sample:
+        ok += await book.check(c) is not None
+    per_op("book.check", time.perf_counter() - t0, len(sample), ok)
+    t0 = time.perf_counter()
+    ok = sum(offline.check(c) is not None for c in sample)
+    per_op("offline.check", time.perf_counter() - t0, len(sample), ok)
+    # Для сравнения: карточка из базы на каждый скан (без проверки подписи)
+    from tickets import decode
+
+    n = min(len(sample), 5000)
+    t0 = time.perf_counter()
+    ok = 0
+    for c in sample[:n]:
+        ok += await db.fetchone("SELECT id, name, car, plate, people, pay_status FROM registrations WHERE id=?",
+                                (decode(c).reg_id,)) is not None
+    per_op("db lookup per scan", time.perf_counter() - t0, n, ok)
+
+    # ---------- /checkin через Dispatcher ----------
+    admin_id = 777
+    ids = iter(range(1, 10 ** 9))
+    await dp.feed_update(bot, make_update_obj(next(ids), admin_id, "/checkin", ADMIN))
+    scans = [codes[i % len(codes)] for i in range(args.scans)]
+    latency = []
+    sem = asyncio.Semaphore(args.concurrency)
+    slot = DB_BATCH.values.get(())
+    writes0, batches0 = (slot[1], slot[2]) if slot else (0, 0)
+    before = len(book.checkins)
+
+    async def scan(code):
+        async with sem:
+            t = time.perf_counter()
+            await dp.feed_update(bot, make_update_obj(next(ids), admin_id, f"/start {code}", ADMIN))
+            latency.append(time.perf_counter() - t)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(scan(c) for c in scans))
+    elapsed = time.perf_counter() - t0
+    await asyncio.sleep(0.05)
+    stored = (await db.fetchone("SELECT COUNT(*) FROM checkins"))[0]
+    slot = DB_BATCH.values.get(())
+    writes, batches = (slot[1] - writes0, slot[2] - batches0) if slot else (0, 0)
+    print(f"checkin: scans={len(scans)} concurrency={args.concurrency} api latency={args.latency * 1000:.0f} ms")
+    print(f"  {len(scans) / elapsed:,.0f} scans/s  p50={pct(latency, 50):.2f} p99={pct(latency, 99):.2f} "
+          f"max={max(latency) * 1000:.2f} ms")
+    print(f"  check-ins: new={len(book.checkins) - before} in db={stored}  "
+          f"db writes={writes:.0f} in {batches} batches ({writes / max(1, batches):.1f} per transaction)")
+    await dp["events"].close()
+    await main.close_all()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--regs", type=int, default=5000)
+    ap.add_argument("--rounds", type=int, default=50000, help="проверок в микробенчмарке")
+    ap.add_argument("--scans", type=int, default=2000, help="сканов /start <код> через Dispatcher")
+    ap.add_argument("--concurrency", type=int, default=50, help="одновременных сканов")
+    ap.add_argument("--latency", type=float, default=0.02, help="задержка Bot API, с")
+    asyncio.run(amain(ap.parse_args(sys.argv[1:])))
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+# Локальная замена Telegram для webhook-режима: POST'ит синтетические Update JSON
+# и меряет задержку ответа (до 200) и пропускную способность обработки.
+#
+#   python bench_webhook.py                      # поднимает бота в процессе, Bot API — заглушка
+#   python bench_webhook.py --url http://127.0.0.1:8080/tg/webhook --secret S   # внешний инстанс
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import aiohttp
+
+from fake_api import fake_bot, make_update
+
+TEXTS = ["/start", "ℹ️ Инфо / Ma’lumot", "📍 Локация / Manzil"]
+
+
+def pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] * 1000
+
+
+async def fire(url, secret, n, concurrency, users):
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+    latencies, statuses = [], {}
+    sem = asyncio.Semaphore(concurrency)
+
+    async with aiohttp.ClientSession(headers=headers) as http:
+        async def one(i):
+            body = make_update(i + 1, 100000 + i % users, TEXTS[i % len(TEXTS)])
+            async with sem:
+                t0 = time.perf_counter()
+                async with http.post(url, json=body) as resp:
+                    await resp.read()
+                latencies.append(time.perf_counter() - t0)
+                statuses[resp.status] = statuses.get(resp.status, 0) + 1
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(n)))
+        elapsed = time.perf_counter() - t0
+    return latencies, statuses, elapsed
+
+
+async def local_server(args):
+    tmp = tempfile.mkdtemp()
+    os.environ["DB_PATH"] = os.path.join(tmp, "bench.db")
+    import main
+    from aiohttp import web
+    from webhook import build_app
+
+    dp, bot = await main.setup_bot(fake_bot(), dedup=True)
+    app = build_app(dp, bot, "/tg/webhook", args.secret, args.workers, args.queue)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", args.port)
+    await site.start()
+    return runner, app["handler"], bot
+
+
+async def amain(args):
+    runner = handler = bot = None
+    url = args.url
+    if not url:
+        runner, handler, bot = await local_server(args)
+        url = f"http://127.0.0.1:{args.port}/tg/webhook"
+
+    latencies, statuses, elapsed = await fire(url, args.secret, args.n, args.concurrency, args.users)
+    print(f"POST   n={args.n} concurrency={args.concurrency}  {args.n / elapsed:8.0f} req/s  statuses={statuses}")
+    print(f"ack    p50={pct(latencies, 50):.2f} ms  p95={pct(latencies, 95):.2f} ms  "
+          f"p99={pct(latencies, 99):.2f} ms  mean={statistics.mean(latencies) * 1000:.2f} ms")
+
+    if handler is not None:
+        t0 = time.perf_counter()
+        await handler.sink.join()
+        drained = time.perf_counter() - t0
+        total = elapsed + drained
+        stats = handler.sink.stats()
+        print(f"handle processed={stats['processed']} failed={stats['failed']}  "
+              f"{stats['processed'] / total:8.0f} updates/s end-to-end  "
+              f"replies={len(bot.session.calls)}")
+        await runner.cleanup()
+        import main
+        await main.close_all()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", default="")
+    ap.add_argument("--secret", default="bench-secret")
+    ap.add_argument("-n", type=int, default=5000)
+    ap.add_argument("--concurrency", type=int, default=64)
+    ap.add_argument("--users", type=int, default=1000)
+    ap.add_argument("--workers", type=int, default=8)
+    ap.add_argument("--queue", type=int, default=10000)
+    ap.add_argument("--port", type=int, default=8089)
+    asyncio.run(amain(ap.parse_args(sys.argv[1:])))
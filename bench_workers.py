@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+# Масштабирование по воркер-процессам: одинаковый поток апдейтов (начало анкеты
+# RegForm у множества пользователей) через WorkerPool с 1, 2, 4 ... процессами.
+# Bot API — заглушка, БД — общий SQLite-файл в WAL. На машине с k ядрами рост
+# ожидается почти линейным до k воркеров.
+#
+#   python bench_workers.py [--users 2000] [--workers 1 2 4]
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+STEPS = ["/start", "🚀 Зарегистрироваться / Ro‘yxatdan o‘tish", "Test User", "Toyota Prado"]
+
+
+async def run(workers, users):
+    from fake_api import fake_bot, make_update
+    from workers import WorkerPool
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DB_PATH"] = os.path.join(tmp, "bench.db")
+        pool = WorkerPool(workers, queue_size=100000, bot_factory=fake_bot)
+        pool.start()
+        # Прогрев: по апдейту на каждого воркера, старт процессов в замер не входит
+        warm = 0
+        uid = 0
+        while warm < workers:
+            uid += 1
+            update = make_update(10 ** 9 + uid, 10 ** 9 + uid, "/start")
+            if pool.submit(update):
+                warm += 1
+        while pool.stats()["processed"] < workers:
+            await asyncio.sleep(0.01)
+
+        updates = []
+        uid = 1
+        for step, text in enumerate(STEPS):
+            for u in range(users):
+                updates.append(make_update(uid, 1000 + u, text))
+                uid += 1
+        # Редоставка: каждый 20-й апдейт приходит повторно и должен отсечься дедупом
+        updates += updates[::20]
+
+        base = pool.stats()["processed"]
+        t0 = time.perf_counter()
+        for update in updates:
+            while not pool.submit(update):
+                await asyncio.sleep(0.001)
+        while pool.stats()["processed"] - base < len(updates):
+            await asyncio.sleep(0.005)
+        elapsed = time.perf_counter() - t0
+        failed = pool.stats()["failed"]
+        await pool.close()
+    return len(updates), elapsed, failed
+
+
+async def amain(args):
+    base = None
+    print(f"cpu={os.cpu_count()} users={args.users}")
+    for n in args.workers:
+        total, elapsed, failed = await run(n, args.users)
+        rate = total / elapsed
+        base = base or rate
+        print(f"workers={n:<3} {total} updates in {elapsed:6.2f} s  {rate:8.0f} upd/s  "
+              f"x{rate / base:.2f}  failed={failed}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=2000)
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    asyncio.run(amain(ap.parse_args(sys.argv[1:])))
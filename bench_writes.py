@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+# Бенчмарк: commit на каждую регистрацию vs write-behind батчи.
+# Запуск: python bench_writes.py [N ...]   (по умолчанию 1000 и 10000)
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import aiosqlite
+
+from db import Database
+
+CREATE_SQL = """
+CREATE TABLE IF NOT EXISTS registrations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tg_id INTEGER UNIQUE,
+    name TEXT,
+    car TEXT,
+    plate TEXT UNIQUE,
+    phone TEXT UNIQUE,
+    race TEXT,
+    race_type TEXT,
+    payment TEXT,
+    people INTEGER,
+    created_at TEXT
+);
+"""
+
+INSERT_SQL = (
+    "INSERT INTO registrations (tg_id, name, car, plate, phone, race, race_type, payment, people, created_at) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+def fake_rows(n):
+    # Каждая 50-я заявка повторяет госномер соседа — проверяем IntegrityError по месту
+    for i in range(n):
+        plate = f"01A{i - 1 if i % 50 == 49 else i:06d}AA"
+        yield (i, f"User {i}", "Toyota Prado", plate, f"+998{i:09d}",
+               "no", "-", "later", 3, "2025-10-01T00:00:00")
+
+
+async def run(n, mode):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "bench.db"))
+        await db.open()
+        await db.execute(CREATE_SQL)
+        write = db.execute if mode == "per-row" else db.enqueue
+
+        async def one(row):
+            try:
+                await write(INSERT_SQL, row)
+                return True
+            except aiosqlite.IntegrityError:
+                return False
+
+        t0 = time.perf_counter()
+        results = await asyncio.gather(*(one(r) for r in fake_rows(n)))
+        elapsed = time.perf_counter() - t0
+        rows = (await db.fetchone("SELECT COUNT(*) FROM registrations"))[0]
+        await db.close()
+    ok = sum(results)
+    assert ok == rows, (ok, rows)
+    print(f"{mode:>8} n={n:<6} {elapsed * 1000:9.1f} ms  {n / elapsed:9.0f} rows/s  "
+          f"inserted={ok} duplicates={n - ok}")
+    return elapsed
+
+
+async def amain(sizes):
+    for n in sizes:
+        single = await run(n, "per-row")
+        batched = await run(n, "batched")
+        print(f"{'':>8} n={n:<6} speedup x{single / batched:.1f}")
+
+
+if __name__ == "__main__":
+    sizes = [int(x) for x in sys.argv[1:]] or [1000, 10000]
+    asyncio.run(amain(sizes))
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import time
+from datetime import datetime
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramAPIError,
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+)
+from aiogram.methods import EditMessageText, SendMessage
+
+from db import Database
+from schema import BROADCAST_SQL
+
+log = logging.getLogger("broadcast")
+
+# Схема создаётся миграцией 7 (repository.py), DDL — в schema.py
+
+# Лимиты Bot API: ~30 сообщений/с на бота и ~1 сообщение/с в один чат.
+# Берём чуть ниже 30, чтобы джиттер сети не выталкивал за скользящее окно.
+GLOBAL_RATE = 28.0
+CHAT_INTERVAL = 1.0
+SENDERS = 8
+MAX_ATTEMPTS = 4
+PROGRESS_EVERY = 3.0
+
+
+# ================== Rate limiting ==================
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        # RetryAfter: Telegram просит замолчать — стоим все, а не только один отправитель
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class SendScheduler:
+    # Общий планировщик исходящих: глобальный token bucket + интервал на чат.
+    # RetryAfter тормозит весь поток на указанное время.
+
+    def __init__(self, bot: Bot, rate: float = GLOBAL_RATE, chat_interval: float = CHAT_INTERVAL):
+        self.bot = bot
+        self.bucket = TokenBucket(rate, capacity=1)
+        self.chat_interval = chat_interval
+        self._chat_next = {}
+        self.sent = 0
+        self.retries = 0
+
+    async def _wait_chat(self, chat_id):
+        now = time.monotonic()
+        ready = self._chat_next.get(chat_id, 0.0)
+        self._chat_next[chat_id] = max(now, ready) + self.chat_interval
+        if ready > now:
+            await asyncio.sleep(ready - now)
+        if len(self._chat_next) > 10000:
+            self._chat_next = {k: v for k, v in self._chat_next.items() if v > now}
+
+    async def call(self, method, chat_id):
+        await self._wait_chat(chat_id)
+        await self.bucket.acquire()
+        try:
+            result = await self.bot(method)
+        except TelegramRetryAfter as e:
+            self.retries += 1
+            self.bucket.pause(e.retry_after)
+            raise
+        self.sent += 1
+        return result
+
+
+# ================== Broadcasts ==================
+class Broadcaster:
+    def __init__(self, db: Database, bot: Bot, scheduler: SendScheduler = None, senders: int = SENDERS):
+        self.db = db
+        self.bot = bot
+        self.scheduler = scheduler or SendScheduler(bot)
+        self.senders = senders
+        self._running = {}
+
+    async def setup(self):
+        await self.db.executescript(BROADCAST_SQL)
+
+    async def create(self, text: str, admin_chat_id: int) -> int:
+        # Снимок получателей фиксируется сразу: новые регистрации в эту рассылку не попадут
+        async with self.db.transaction() as conn:
+            cur = await conn.execute(
+                "INSERT INTO broadcasts (admin_chat_id, text, created_at) VALUES (?, ?, ?)",
+                (admin_chat_id, text, datetime.utcnow().isoformat()),
+            )
+            bid = cur.lastrowid
+            cur = await conn.execute(
+                "INSERT OR IGNORE INTO broadcast_recipients (broadcast_id, chat_id) "
+                "SELECT ?, tg_id FROM registrations WHERE tg_id IS NOT NULL",
+                (bid,),
+            )
+            total = cur.rowcount
+            await conn.execute("UPDATE broadcasts SET total=? WHERE id=?", (total, bid))
+        return bid
+
+    def start(self, bid: int):
+        if bid not in self._running:
+            task = asyncio.create_task(self.run(bid))
+            self._running[bid] = task
+            task.add_done_callback(lambda t: self._running.pop(bid, None))
+        return self._running[bid]
+
+    async def resume(self):
+        # После падения продолжаем незавершённые рассылки с pending-получателей
+        rows = await self.db.fetchall("SELECT id FROM broadcasts WHERE status='running'")
+        for (bid,) in rows:
+            self.start(bid)
+        return len(rows)
+
+    async def counts(self, bid: int):
+        rows = await self.db.fetchall(
+            "SELECT status, COUNT(*) FROM broadcast_recipients WHERE broadcast_id=? GROUP BY status", (bid,)
+        )
+        return dict(rows)
+
+    async def _mark(self, bid, chat_id, status, error=None):
+        await self.db.enqueue(
+            "UPDATE broadcast_recipients SET status=?, error=? WHERE broadcast_id=? AND chat_id=?",
+            (status, error, bid, chat_id),
+        )
+
+    async def _send_one(self, bid, text, chat_id):
+        # Текст админа шлём как есть, без HTML-разметки. Отметка «sending»
+        # фиксируется до отправки: после падения такой чат не получит дубль
+        method = SendMessage(chat_id=chat_id, text=text, parse_mode=None)
+        await self._mark(bid, chat_id, "sending")
+        attempt = 0
+        while True:
+            try:
+                await self.scheduler.call(method, chat_id)
+                return await self._mark(bid, chat_id, "sent")
+            except TelegramRetryAfter:
+                # Пауза уже выставлена в общем bucket — попытку не тратим
+                continue
+            except (TelegramForbiddenError, TelegramBadRequest) as e:
+                # Бот заблокирован / чат не найден — повторять бессмысленно
+                return await self._mark(bid, chat_id, "failed", e.message[:200])
+            except (TelegramNetworkError, TelegramAPIError) as e:
+                attempt += 1
+                if attempt >= MAX_ATTEMPTS:
+                    return await self._mark(bid, chat_id, "failed", str(e)[:200])
+                await asyncio.sleep(2 ** attempt)
+
+    async def _report(self, bid, admin_chat_id, message_id, total, final=False):
+        c = await self.counts(bid)
+        done = c.get("sent", 0) + c.get("failed", 0)
+        text = (f"📣 Рассылка #{bid}: {done}/{total}\n"
+                f"✅ доставлено: {c.get('sent', 0)}  ❌ ошибок: {c.get('failed', 0)}")
+        if final:
+            text += "\n\nГотово."
+        try:
+            if message_id:
+                await self.scheduler.call(
+                    EditMessageText(text=text, chat_id=admin_chat_id, message_id=message_id), admin_chat_id
+                )
+                return message_id
+            m = await self.scheduler.call(SendMessage(chat_id=admin_chat_id, text=text), admin_chat_id)
+            await self.db.enqueue("UPDATE broadcasts SET progress_message_id=? WHERE id=?", (m.message_id, bid))
+            return m.message_id
+        except TelegramAPIError:
+            return message_id
+
+    async def run(self, bid: int):
+        row = await self.db.fetchone(
+            "SELECT text, admin_chat_id, progress_message_id, total FROM broadcasts WHERE id=?", (bid,)
+        )
+        if row is None:
+            return
+        text, admin_chat_id, message_id, total = row
+        # Отправка, прерванная падением: дошло ли сообщение — неизвестно,
+        # повторять не будем (лучше не доставить, чем прислать дважды)
+        await self.db.enqueue(
+            "UPDATE broadcast_recipients SET status='failed', error='interrupted' "
+            "WHERE broadcast_id=? AND status='sending'",
+            (bid,),
+        )
+        pending = await self.db.fetchall(
+            "SELECT chat_id FROM broadcast_recipients WHERE broadcast_id=? AND status='pending'", (bid,)
+        )
+        queue = asyncio.Queue()
+        for (chat_id,) in pending:
+            queue.put_nowait(chat_id)
+
+        async def sender():
+            while not queue.empty():
+                chat_id = queue.get_nowait()
+                try:
+                    await self._send_one(bid, text, chat_id)
+                except Exception:
+                    log.exception("Broadcast %s: send to %s failed", bid, chat_id)
+
+        async def progress():
+            nonlocal message_id
+            while True:
+                message_id = await self._report(bid, admin_chat_id, message_id, total)
+                await asyncio.sleep(PROGRESS_EVERY)
+
+        reporter = asyncio.create_task(progress()) if admin_chat_id else None
+        try:
+            await asyncio.gather(*(sender() for _ in range(self.senders)))
+        finally:
+            if reporter:
+                reporter.cancel()
+        await self.db.enqueue(
+            "UPDATE broadcasts SET status='done', finished_at=? WHERE id=?", (datetime.utcnow().isoformat(), bid)
+        )
+        if admin_chat_id:
+            await self._report(bid, admin_chat_id, message_id, total, final=True)
@@ -15,3 +15,12 @@ PRICE_COTTAGE_2 = int(os.getenv("PRICE_COTTAGE_2", "1500000"))
 PRICE_COTTAGE_3 = int(os.getenv("PRICE_COTTAGE_3", "2000000"))
 PRICE_YURT = int(os.getenv("PRICE_YURT", "800000"))
 ORGANIZER_NICK = os.getenv("ORGANIZER_NICK", "@UkAkbar")
+
+# Количество мест: начальные значения при первом запуске, дальше — /slots
+COTTAGES_2 = int(os.getenv("COTTAGES_2", "0"))
+COTTAGES_3 = int(os.getenv("COTTAGES_3", "0"))
+YURTS = int(os.getenv("YURTS", "10"))
+SPRINT_SLOTS = int(os.getenv("SPRINT_SLOTS", "40"))
+TRIAL_SLOTS = int(os.getenv("TRIAL_SLOTS", "120"))
+# Сколько секунд держится место, пока пользователь заполняет анкету
+HOLD_TTL = int(os.getenv("HOLD_TTL", "900"))
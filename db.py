@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from functools import wraps
+
+import aiosqlite
+
+import metrics
+from metrics import DB_BATCH, DB_ERRORS, DB_SECONDS
+
+# ================== Pragmas ==================
+# WAL: читатели не блокируют писателя и наоборот.
+# synchronous=NORMAL в WAL безопасен от порчи БД и не делает fsync на каждый commit.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=134217728",
+    "PRAGMA wal_autocheckpoint=1000",
+)
+
+READERS = 3
+
+# Write-behind очередь: копим записи до BATCH_MAX штук или BATCH_DELAY секунд
+# и фиксируем их одной транзакцией (один commit вместо сотни).
+BATCH_MAX = 256
+BATCH_DELAY = 0.005
+
+
+def timed(op: str):
+    # Время вызова (вместе с ожиданием соединения/очереди) в bot_db_seconds{op}
+    def decorator(fn):
+        if not metrics.ENABLED:
+            return fn
+        @wraps(fn)
+        async def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            except Exception:
+                DB_ERRORS.inc(op)
+                raise
+            finally:
+                DB_SECONDS.observe(time.perf_counter() - t0, op)
+        return wrapper
+    return decorator
+
+
+# ================== Database ==================
+class Database:
+    # Один долгоживущий писатель (все записи сериализованы через lock)
+    # и небольшой пул читателей. Каждое соединение aiosqlite = один поток,
+    # поэтому потоки создаются один раз при open(), а не на каждый запрос.
+
+    def __init__(self, path: str, readers: int = READERS,
+                 batch_max: int = BATCH_MAX, batch_delay: float = BATCH_DELAY):
+        self.path = path
+        self.readers_count = max(1, readers)
+        self.batch_max = max(1, batch_max)
+        self.batch_delay = batch_delay
+        self._writer = None
+        self._write_lock = asyncio.Lock()
+        self._open_lock = asyncio.Lock()
+        self._readers = None
+        self._conns = []
+        self._queue = None
+        self._full = asyncio.Event()
+        self._flusher = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._writer is not None
+
+    async def _connect(self):
+        conn = await aiosqlite.connect(self.path, isolation_level=None)
+        for pragma in PRAGMAS:
+            # journal_mode отвечает строкой: курсор закрываем, иначе незавершённый
+            # запрос на соединении не даёт выполнить VACUUM INTO (бэкап)
+            async with conn.execute(pragma):
+                pass
+        self._conns.append(conn)
+        return conn
+
+    async def open(self):
+        async with self._open_lock:
+            if self._writer is not None:
+                return self
+            # Писатель первым: он переключает файл в WAL
+            self._writer = await self._connect()
+            self._readers = asyncio.Queue()
+            for _ in range(self.readers_count):
+                self._readers.put_nowait(await self._connect())
+            self._queue = asyncio.Queue()
+            self._flusher = asyncio.create_task(self._flush_loop())
+        return self
+
+    async def close(self):
+        async with self._open_lock:
+            if self._writer is None:
+                return
+            # Дописываем всё, что успели поставить в очередь, и останавливаем флашер
+            self._queue.put_nowait(None)
+            self._full.set()
+            await self._flusher
+            async with self._write_lock:
+                try:
+                    await self._writer.execute("PRAGMA optimize")
+                except aiosqlite.Error:
+                    pass
+                for conn in self._conns:
+                    await conn.close()
+            self._conns = []
+            self._writer = None
+            self._readers = None
+            self._queue = None
+            self._flusher = None
+
+    # ---------- connections ----------
+    @asynccontextmanager
+    async def _reader(self):
+        if self._writer is None:
+            await self.open()
+        conn = await self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put_nowait(conn)
+
+    @asynccontextmanager
+    async def _transaction(self):
+        if self._writer is None:
+            await self.open()
+        async with self._write_lock:
+            await self._writer.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._writer
+            except BaseException:
+                await self._writer.execute("ROLLBACK")
+                raise
+            await self._writer.execute("COMMIT")
+
+    @asynccontextmanager
+    async def _timed_block(self, cm, op):
+        t0 = time.perf_counter()
+        try:
+            async with cm as conn:
+                yield conn
+        except Exception:
+            DB_ERRORS.inc(op)
+            raise
+        finally:
+            DB_SECONDS.observe(time.perf_counter() - t0, op)
+
+    def reader(self):
+        # Соединение-читатель из пула на время блока
+        if not metrics.ENABLED:
+            return self._reader()
+        return self._timed_block(self._reader(), "reader")
+
+    def transaction(self):
+        # Явная транзакция на писателе: commit при успехе, rollback при ошибке
+        if not metrics.ENABLED:
+            return self._transaction()
+        return self._timed_block(self._transaction(), "transaction")
+
+    # ---------- coroutine API ----------
+    @timed("execute")
+    async def execute(self, sql, params=()):
+        # Одиночная запись в своей транзакции. Возвращает lastrowid.
+        async with self._transaction() as conn:
+            cur = await conn.execute(sql, params)
+            rowid = cur.lastrowid
+            await cur.close()
+        return rowid
+
+    @timed("executemany")
+    async def executemany(self, sql, seq):
+        async with self._transaction() as conn:
+            await conn.executemany(sql, seq)
+
+    @timed("executescript")
+    async def executescript(self, script):
+        if self._writer is None:
+            await self.open()
+        async with self._write_lock:
+            await self._writer.executescript(script)
+
+    @timed("enqueue")
+    async def enqueue(self, sql, params=()):
+        # Запись через write-behind очередь. Каждый вызывающий получает свой
+        # результат: lastrowid или собственное исключение (например IntegrityError
+        # на дубликат), даже если запись ушла в общей транзакции с соседями.
+        if self._writer is None:
+            await self.open()
+        fut = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((sql, params, fut))
+        if self._queue.qsize() >= self.batch_max:
+            self._full.set()
+        return await fut
+
+    async def _flush_loop(self):
+        queue = self._queue
+        stop = False
+        while not stop:
+            batch = [await queue.get()]
+            if batch[0] is not None and queue.qsize() < self.batch_max:
+                self._full.clear()
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.batch_delay)
+                except asyncio.TimeoutError:
+                    pass
+            while len(batch) < self.batch_max and not queue.empty():
+                batch.append(queue.get_nowait())
+            if None in batch:
+                # None — сигнал остановки из close(); дочищаем хвост очереди
+                stop = True
+                batch = [item for item in batch if item is not None]
+                while not queue.empty():
+                    batch.append(queue.get_nowait())
+            if batch:
+                await self._flush(batch)
+
+    @timed("flush")
+    async def _flush(self, batch):
+        if metrics.ENABLED:
+            DB_BATCH.observe(len(batch))
+        results = []
+        async with self._write_lock:
+            conn = self._writer
+            try:
+                await conn.execute("BEGIN IMMEDIATE")
+                for sql, params, fut in batch:
+                    # Ошибка одного оператора (IntegrityError и т.п.) откатывает
+                    # только этот оператор, транзакция соседей продолжается.
+                    try:
+                        cur = await conn.execute(sql, params)
+                        results.append((fut, cur.lastrowid, None))
+                        await cur.close()
+                    except aiosqlite.Error as e:
+                        results.append((fut, None, e))
+                await conn.execute("COMMIT")
+            except BaseException as e:
+                if conn.in_transaction:
+                    await conn.execute("ROLLBACK")
+                for _, _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                if not isinstance(e, Exception):
+                    raise
+                return
+        for fut, rowid, exc in results:
+            if fut.done():
+                continue
+            if exc is not None:
+                fut.set_exception(exc)
+            else:
+                fut.set_result(rowid)
+
+    @timed("backup")
+    async def backup(self, path: str):
+        # Сжатая копия базы (VACUUM INTO) на читателе: это одна читающая
+        # транзакция, писатель в WAL её не ждёт
+        async with self._reader() as conn:
+            await conn.execute("VACUUM INTO ?", (path,))
+
+    @timed("checkpoint")
+    async def checkpoint(self):
+        # Перенести WAL в основной файл и обрезать его до нуля
+        if self._writer is None:
+            await self.open()
+        async with self._write_lock:
+            async with self._writer.execute("PRAGMA wal_checkpoint(TRUNCATE)") as cur:
+                return await cur.fetchone()
+
+    @timed("fetchone")
+    async def fetchone(self, sql, params=()):
+        async with self._reader() as conn:
+            async with conn.execute(sql, params) as cur:
+                return await cur.fetchone()
+
+    @timed("fetchall")
+    async def fetchall(self, sql, params=()):
+        async with self._reader() as conn:
+            async with conn.execute(sql, params) as cur:
+                return await cur.fetchall()
+
+
+# ================== Registry ==================
+_pools = {}
+
+
+def get_db(path: str) -> Database:
+    # Один Database на файл: main.py и storage.py делят пул, если путь совпадает
+    db = _pools.get(path)
+    if db is None:
+        db = _pools[path] = Database(path)
+    return db
+
+
+async def close_all():
+    for db in list(_pools.values()):
+        await db.close()
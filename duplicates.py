@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+# Быстрая проверка дублей анкеты. UNIQUE на tg_id, plate и phone срабатывает
+# только на INSERT в конце анкеты: человек проходит все шаги и лишь на
+# последнем узнаёт, что номер уже занят. Индекс держит в памяти
+# зарегистрированные tg_id и нормализованные госномера/телефоны — те же ключи,
+# что plate_rev/phone_rev у поиска, — и хендлеры отказывают сразу на своём шаге.
+#
+# Индекс — подсказка, решает по-прежнему UNIQUE в базе. Он загружается при
+# открытии базы мероприятия, пополняется своими вставками и раз в
+# REFRESH_EVERY дочитывает строки с id больше последнего виденного: так видны
+# регистрации других воркеров. Строки регистраций не удаляются и номера в них
+# не меняются, поэтому дочитывания по id достаточно.
+import time
+
+from db import Database
+from search import phone_key, plate_key
+
+REFRESH_EVERY = 5.0
+
+
+class DuplicateIndex:
+    def __init__(self, db: Database, refresh_every: float = REFRESH_EVERY):
+        self.db = db
+        self.refresh_every = refresh_every
+        self.users = set()
+        self.plates = set()
+        self.phones = set()
+        self.last_id = 0
+        self._checked = 0.0
+        self.rejected = 0
+
+    def __len__(self):
+        return len(self.users)
+
+    async def load(self):
+        self.users, self.plates, self.phones, self.last_id = set(), set(), set(), 0
+        await self.refresh()
+
+    async def refresh(self):
+        # Новые строки — range scan по первичному ключу; обычно пусто
+        self._checked = time.monotonic()
+        rows = await self.db.fetchall(
+            "SELECT id, tg_id, plate_rev, phone_rev FROM registrations WHERE id > ? ORDER BY id", (self.last_id,)
+        )
+        for rid, tg_id, plate_rev, phone_rev in rows:
+            self._add(tg_id, plate_rev, phone_rev)
+            self.last_id = rid
+
+    async def _fresh(self):
+        if time.monotonic() - self._checked > self.refresh_every:
+            await self.refresh()
+
+    def _add(self, tg_id, plate_rev, phone_rev):
+        if tg_id is not None:
+            self.users.add(tg_id)
+        if plate_rev:
+            self.plates.add(plate_rev)
+        if phone_rev:
+            self.phones.add(phone_rev)
+
+    def add(self, tg_id: int, plate: str, phone: str):
+        # После своей успешной вставки — не дожидаясь refresh
+        self._add(tg_id, plate_key(plate), phone_key(phone))
+
+    # ---------- checks ----------
+    async def has_user(self, tg_id: int) -> bool:
+        await self._fresh()
+        return self._hit(tg_id in self.users)
+
+    async def has_plate(self, plate: str) -> bool:
+        await self._fresh()
+        key = plate_key(plate)
+        return self._hit(bool(key) and key in self.plates)
+
+    async def has_phone(self, phone: str) -> bool:
+        await self._fresh()
+        key = phone_key(phone)
+        return self._hit(bool(key) and key in self.phones)
+
+    def _hit(self, found: bool) -> bool:
+        self.rejected += found
+        return found
+
+    def stats(self) -> dict:
+        return {"users": len(self.users), "plates": len(self.plates), "phones": len(self.phones),
+                "rejected": self.rejected}
@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+# Реестр мероприятий. У каждого мероприятия свои название, даты, взнос, тексты
+# и свой файл SQLite со всей схемой регистраций (registrations, поиск, счётчики,
+# чеки, выгрузки, места). Новое мероприятие начинается с пустого файла, поэтому
+# прошлые сезоны не замедляют ни запросы, ни выгрузки текущего.
+# Реестр (таблица events) живёт в основной базе DB_PATH; её собственные
+# регистрации — это мероприятие по умолчанию, созданное при первом запуске.
+# Мероприятие для апдейта берётся из памяти: активное для всех, у админа —
+# выбранное командой /event. Активное перечитывается из базы раз в REFRESH_EVERY,
+# чтобы переключение было видно всем воркерам.
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.types import TelegramObject
+
+from broadcast import Broadcaster, SendScheduler
+from db import Database, get_db
+from duplicates import DuplicateIndex
+from i18n import LANGS
+from inventory import Inventory
+from receipts import ReceiptPipeline
+from tickets import TICKET_SECRET, TicketBook
+
+log = logging.getLogger("events")
+
+# Схема создаётся миграцией 12 (repository.py), DDL — в schema.py
+
+# Мероприятие, чьи регистрации уже лежат в DB_PATH
+DEFAULT_SLUG = os.getenv("EVENT_SLUG", "aydarkul-2025")
+DEFAULT_TITLE = os.getenv("EVENT_TITLE", "Off-Road Festival Aydarkul 2025")
+DEFAULT_FEE = int(os.getenv("EVENT_FEE", "200000"))
+# Файлы новых мероприятий; по умолчанию — events/ рядом с DB_PATH
+EVENTS_DIR = os.getenv("EVENTS_DIR", "")
+REFRESH_EVERY = 30.0
+# Тексты, которые можно переопределить для мероприятия (/eventset):
+# welcome — для всех языков, welcome_uz — только для одного
+TEXT_KEYS = ("welcome", "info", "location")
+
+_slug_re = re.compile(r"[a-z0-9][a-z0-9_-]{1,39}")
+
+
+class Event(NamedTuple):
+    slug: str
+    title: str
+    db_path: str
+    fee: int
+    texts: dict  # только переопределённые тексты; остальные — из locales.py
+    starts_on: Optional[str]
+    ends_on: Optional[str]
+    active: bool
+
+
+EVENT_SELECT = "SELECT slug, title, db_path, fee, texts, starts_on, ends_on, active FROM events"
+
+
+def _event(row) -> Event:
+    slug, title, db_path, fee, texts, starts_on, ends_on, active = row
+    return Event(slug, title, db_path, fee, json.loads(texts or "{}"), starts_on, ends_on, bool(active))
+
+
+def valid_slug(slug: str) -> bool:
+    return bool(_slug_re.fullmatch(slug or ""))
+
+
+def text_key(key: str) -> bool:
+    name, _, lang = key.rpartition("_")
+    return key in TEXT_KEYS or (name in TEXT_KEYS and lang in LANGS)
+
+
+# ================== Per-event services ==================
+class EventContext:
+    # База мероприятия и всё, что к ней привязано. Создаётся при первом
+    # обращении к мероприятию и живёт до остановки бота.
+    __slots__ = ("event", "db", "inventory", "dupes", "tickets", "receipts", "broadcaster", "payloads")
+
+    def __init__(self, event: Event, db: Database, inventory: Inventory, dupes: DuplicateIndex,
+                 tickets: Optional[TicketBook], receipts: ReceiptPipeline, broadcaster: Broadcaster, payloads: dict):
+        self.event = event
+        self.db = db
+        self.inventory = inventory
+        self.dupes = dupes
+        self.tickets = tickets
+        self.receipts = receipts
+        self.broadcaster = broadcaster
+        self.payloads = payloads
+
+    async def close(self):
+        await self.receipts.close()
+        await self.inventory.close()
+
+
+# ================== Registry ==================
+class EventRegistry:
+    def __init__(self, db: Database, bot: Bot, render: Callable[[Event], dict] = None,
+                 refresh_every: float = REFRESH_EVERY, events_dir: str = EVENTS_DIR):
+        self.db = db
+        self.bot = bot
+        # render(event) -> {язык: готовые аргументы сообщений мероприятия}
+        self.render = render or (lambda event: {})
+        self.refresh_every = refresh_every
+        self.events_dir = events_dir or os.path.join(os.path.dirname(os.path.abspath(db.path)), "events")
+        # Лимиты Bot API общие на бота: рассылки всех мероприятий идут через один планировщик
+        self.scheduler = SendScheduler(bot)
+        self._events = {}
+        self._contexts = {}
+        self._opening = {}
+        self._loading = None
+        self._views = {}
+        self._active = None
+        self._checked = 0.0
+
+    # ---------- loading ----------
+    async def load(self):
+        await self.db.enqueue(
+            "INSERT INTO events (slug, title, db_path, fee, active, created_at) "
+            "SELECT ?, ?, ?, ?, 1, ? WHERE NOT EXISTS (SELECT 1 FROM events)",
+            (DEFAULT_SLUG, DEFAULT_TITLE, self.db.path, DEFAULT_FEE, datetime.utcnow().isoformat()),
+        )
+        await self.reload()
+        await self.context(self._active)
+
+    def load_later(self):
+        # Быстрый старт: приём апдейтов не ждёт открытия базы мероприятия,
+        # первые апдейты дождутся загрузки в resolve()
+        if self._loading is None:
+            self._loading = asyncio.ensure_future(self.load())
+
+    async def ready(self):
+        if self._loading is not None:
+            await asyncio.shield(self._loading)
+            self._loading = None
+
+    async def reload(self):
+        events = {e.slug: e for e in map(_event, await self.db.fetchall(EVENT_SELECT))}
+        self._events = events
+        active = next((e.slug for e in events.values() if e.active), None)
+        self._active = active or self._active or next(iter(events), None)
+        for slug, ctx in self._contexts.items():
+            ctx.event = events.get(slug, ctx.event)
+            ctx.payloads = self.render(ctx.event)
+        self._checked = time.monotonic()
+
+    async def _refresh(self):
+        # Раз в refresh_every — одно чтение по частичному индексу
+        self._checked = time.monotonic()
+        row = await self.db.fetchone("SELECT slug FROM events WHERE active = 1")
+        if row is not None and row[0] != self._active:
+            await self.reload()
+
+    # ---------- resolution ----------
+    def events(self):
+        return list(self._events.values())
+
+    def get(self, slug: str) -> Optional[Event]:
+        return self._events.get(slug)
+
+    def contexts(self):
+        # Уже открытые мероприятия (для бэкапа); закрытые сезоны не трогаем
+        return list(self._contexts.values())
+
+    def active(self) -> EventContext:
+        return self._contexts[self._active]
+
+    def view(self, user_id: int) -> str:
+        return self._views.get(user_id, self._active)
+
+    def viewing(self, user_id: int) -> bool:
+        return user_id in self._views
+
+    def set_view(self, user_id: int, slug: Optional[str]):
+        # Админ работает с другим мероприятием (экспорт, поиск, статистика);
+        # None — обратно к активному
+        if slug is None:
+            self._views.pop(user_id, None)
+        else:
+            self._views[user_id] = slug
+
+    async def resolve(self, user_id: Optional[int] = None) -> EventContext:
+        # Без user_id — активное мероприятие; с ним — выбранное админом через /event
+        if self._loading is not None:
+            await self.ready()
+        if time.monotonic() - self._checked > self.refresh_every:
+            await self._refresh()
+        slug = self._views.get(user_id, self._active) if self._views else self._active
+        ctx = self._contexts.get(slug)
+        return ctx if ctx is not None else await self.context(slug)
+
+    async def context(self, slug: str) -> EventContext:
+        ctx = self._contexts.get(slug)
+        if ctx is not None:
+            return ctx
+        # Первое обращение открывает базу и поднимает сервисы ровно один раз,
+        # даже если одновременно пришло несколько апдейтов
+        task = self._opening.get(slug)
+        if task is None:
+            task = self._opening[slug] = asyncio.ensure_future(self._open(self._events[slug]))
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._opening.pop(slug, None)
+
+    async def _open(self, event: Event) -> EventContext:
+        from repository import migrate
+
+        db = get_db(event.db_path)
+        await db.open()
+        # Основная база уже мигрирована в main(); файлы мероприятий старый bot.db не переносят
+        await migrate(db, legacy=os.path.abspath(event.db_path) == os.path.abspath(self.db.path))
+        inventory = Inventory(db)
+        await inventory.load()
+        inventory.start()
+        dupes = DuplicateIndex(db)
+        await dupes.load()
+        # Без TICKET_SECRET билеты не выдаются и не проверяются
+        tickets = None
+        if TICKET_SECRET:
+            tickets = TicketBook(db, event.slug)
+            await tickets.load()
+        else:
+            log.warning("TICKET_SECRET is not set: tickets of %s are disabled", event.slug)
+        receipts = ReceiptPipeline(db, self.bot)
+        receipts.start()
+        broadcaster = Broadcaster(db, self.bot, scheduler=self.scheduler)
+        ctx = EventContext(event, db, inventory, dupes, tickets, receipts, broadcaster, self.render(event))
+        self._contexts[event.slug] = ctx
+        log.info("event %s opened (%s)", event.slug, event.db_path)
+        return ctx
+
+    async def close(self):
+        if self._loading is not None:
+            # Недогруженный контекст тоже нужно закрыть — дожидаемся загрузки
+            await asyncio.gather(self._loading, return_exceptions=True)
+            self._loading = None
+        for ctx in self._contexts.values():
+            await ctx.close()
+        self._contexts = {}
+
+    # ---------- admin ----------
+    async def create(self, slug: str, title: str, starts_on: str = None, fee: int = DEFAULT_FEE) -> Event:
+        # Свой файл на мероприятие; схему создаст migrate при первом открытии
+        os.makedirs(self.events_dir, exist_ok=True)
+        path = os.path.join(self.events_dir, f"{slug}.db")
+        await self.db.enqueue(
+            "INSERT INTO events (slug, title, db_path, fee, starts_on, created_at) VALUES (?,?,?,?,?,?)",
+            (slug, title, path, fee, starts_on, datetime.utcnow().isoformat()),
+        )
+        await self.reload()
+        return self._events[slug]
+
+    async def activate(self, slug: str):
+        # Два оператора в одной транзакции: частичный UNIQUE на active=1
+        # не допускает двух активных даже на мгновение
+        async with self.db.transaction() as conn:
+            await conn.execute("UPDATE events SET active = 0 WHERE active = 1")
+            await conn.execute("UPDATE events SET active = 1 WHERE slug = ?", (slug,))
+        await self.reload()
+        await self.context(slug)
+
+    async def update(self, slug: str, **fields):
+        # title / fee / starts_on / ends_on или тексты (см. text_key)
+        event = self._events[slug]
+        texts = dict(event.texts)
+        columns = {}
+        for key, value in fields.items():
+            if text_key(key):
+                texts[key] = value
+            elif key in ("title", "fee", "starts_on", "ends_on"):
+                columns[key] = value
+            else:
+                raise KeyError(key)
+        columns["texts"] = json.dumps(texts, ensure_ascii=False)
+        assignments = ", ".join(f"{k}=?" for k in columns)
+        await self.db.enqueue(f"UPDATE events SET {assignments} WHERE slug=?", (*columns.values(), slug))
+        await self.reload()
+
+
+def _inject(data: Dict[str, Any], ctx: EventContext):
+    data["ev"] = ctx
+    data["db"] = ctx.db
+    data["inventory"] = ctx.inventory
+    data["dupes"] = ctx.dupes
+    data["tickets"] = ctx.tickets
+    data["receipts"] = ctx.receipts
+    data["broadcaster"] = ctx.broadcaster
+
+
+class EventMiddleware(BaseMiddleware):
+    # Outer-middleware на dp.update: кладёт в данные хендлера контекст
+    # активного мероприятия и его сервисы. Хендлеры получают их по именам
+    # параметров (db, inventory, dupes, tickets, receipts, broadcaster, ev).
+
+    def __init__(self, registry: EventRegistry):
+        self.registry = registry
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        _inject(data, await self.registry.resolve())
+        return await handler(event, data)
+
+
+class EventViewMiddleware(BaseMiddleware):
+    # Inner-middleware на сообщения и кнопки admin_router: мероприятие,
+    # выбранное через /event, подменяет активное только в админских хендлерах.
+    # Собственная анкета админа, /start и /ticket идут в активное. Реестр
+    # берётся из dp["events"], поэтому один экземпляр годится для любого dp.
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        registry: EventRegistry = data["events"]
+        if user is not None and registry.viewing(user.id):
+            _inject(data, await registry.resolve(user.id))
+        return await handler(event, data)
@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import csv
+import io
+import os
+import re
+import tempfile
+import time
+from datetime import datetime
+from tempfile import SpooledTemporaryFile
+from typing import BinaryIO, NamedTuple, Optional
+
+from aiogram.types.input_file import InputFile
+from aiosqlite import Connection
+
+from db import Database
+from metrics import EXPORT_BYTES, EXPORT_CACHE, EXPORT_SECONDS
+
+HEADER = [
+    "ID","Имя","Автомобиль","Госномер","Телефон","Кол-во",
+    "Участие(Да/Нет)","Дисциплина","Статус оплаты","Дата регистрации (UTC)"
+]
+
+# Схема создаётся миграцией 10 (repository.py), DDL — в schema.py
+
+VERSION_SQL = "SELECT epoch, value FROM reg_version WHERE id = 1"
+
+EXPORT_SQL = (
+    "SELECT id,name,car,plate,phone,people,race,race_type,payment,created_at "
+    "FROM registrations{where} ORDER BY id"
+)
+
+# Максимальная длина значения по каждой колонке — одним агрегатом в SQLite,
+# чтобы задать ширины до записи строк (write-only лист пишет <cols> первым).
+# Участие всегда «Да»/«Нет», поэтому считаем его константой.
+WIDTHS_SQL = (
+    "SELECT MAX(LENGTH(id)), MAX(LENGTH(name)), MAX(LENGTH(car)), MAX(LENGTH(plate)), "
+    "MAX(LENGTH(phone)), MAX(LENGTH(people)), 3, MAX(LENGTH(COALESCE(race_type,'-'))), "
+    "MAX(LENGTH(COALESCE(payment,'-'))), MAX(LENGTH(created_at)) FROM registrations{where}"
+)
+
+CHUNK_ROWS = 1000
+SPOOL_MAX = 1024 * 1024
+MAX_WIDTH = 42
+# Кэш полных выгрузок: по файлу на формат, в имени — версия таблицы
+CACHE_DIR = os.getenv("EXPORT_CACHE_DIR", "")
+
+
+# ================== Cursors ==================
+class Since(NamedTuple):
+    # kind: "rev" — изменения после версии, "id" — новые после id,
+    # "date" — созданные начиная с даты/времени (ISO, UTC)
+    kind: str
+    value: object
+
+
+WHERE = {
+    "rev": " WHERE rev > ?",
+    "id": " WHERE id > ?",
+    "date": " WHERE created_at >= ?",
+}
+
+_date_re = re.compile(r"\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2})?)?")
+
+
+def parse_since(args: str) -> Optional[Since]:
+    # «» — полная выгрузка, «new» — всё, что изменилось с прошлой выгрузки админа
+    # (версию курсора подставляет вызывающий), «120» / «since 120» — после id 120,
+    # «2025-10-25» — созданные с этой даты. Непонятный аргумент — ValueError.
+    a = (args or "").strip().lower()
+    if a.startswith("since"):
+        a = a[5:].strip()
+    if not a:
+        return None
+    if a == "new":
+        return Since("rev", 0)
+    if a.isdigit():
+        return Since("id", int(a))
+    if _date_re.fullmatch(a):
+        return Since("date", a.upper().replace(" ", "T"))
+    raise ValueError(a)
+
+
+async def table_version(db: Database):
+    # (epoch, версия)
+    return await db.fetchone(VERSION_SQL)
+
+
+async def get_cursor(db: Database, admin_id: int) -> int:
+    row = await db.fetchone("SELECT rev FROM export_cursors WHERE admin_id=?", (admin_id,))
+    return row[0] if row else 0
+
+
+async def set_cursor(db: Database, admin_id: int, rev: int):
+    await db.enqueue(
+        "INSERT INTO export_cursors (admin_id, rev, exported_at) VALUES (?, ?, ?) "
+        "ON CONFLICT(admin_id) DO UPDATE SET rev=excluded.rev, exported_at=excluded.exported_at",
+        (admin_id, rev, datetime.utcnow().isoformat()),
+    )
+
+
+# ================== Row source ==================
+def export_row(r):
+    rid, name, car, plate, phone, people, race, race_type, payment, created_at = r
+    return [
+        rid, name, car, plate, phone, people,
+        ("Да" if str(race).lower().startswith("y") else "Нет"),
+        (race_type or "-"),
+        (payment or "-"),
+        created_at
+    ]
+
+
+def _where(since: Optional[Since]):
+    return ("", ()) if since is None else (WHERE[since.kind], (since.value,))
+
+
+async def iter_rows(conn: Connection, since: Since = None, chunk: int = CHUNK_ROWS):
+    # Общий источник строк для CSV и XLSX: читаем курсором порциями,
+    # таблица целиком в памяти не собирается
+    where, params = _where(since)
+    async with conn.execute(EXPORT_SQL.format(where=where), params) as cur:
+        while True:
+            rows = await cur.fetchmany(chunk)
+            if not rows:
+                break
+            yield [export_row(r) for r in rows]
+
+
+async def column_widths(conn: Connection, since: Since = None):
+    where, params = _where(since)
+    async with conn.execute(WIDTHS_SQL.format(where=where), params) as cur:
+        row = await cur.fetchone()
+    return [min(max(len(h), n or 0) + 2, MAX_WIDTH) for h, n in zip(HEADER, row)]
+
+
+# ================== Sinks ==================
+class CsvSink:
+    def __init__(self, file: BinaryIO = None):
+        self.file = file or SpooledTemporaryFile(max_size=SPOOL_MAX)
+        self.rows = 0
+
+    def begin(self, widths):
+        self.write([HEADER])
+        self.rows = 0
+
+    def write(self, rows):
+        # Кодируем порцию целиком и сразу сбрасываем в файл
+        self.rows += len(rows)
+        buf = io.StringIO()
+        csv.writer(buf).writerows(rows)
+        self.file.write(buf.getvalue().encode("utf-8"))
+
+    def finish(self):
+        self.file.seek(0)
+        return self.file
+
+
+class XlsxSink:
+    # openpyxl грузится ~150 мс и нужен только /exportxlsx: импорт при первой
+    # выгрузке, в begin() — он и так выполняется в executor
+    def __init__(self, file: BinaryIO = None):
+        self.file = file or SpooledTemporaryFile(max_size=SPOOL_MAX)
+        self.rows = 0
+        self.wb = self.ws = None
+
+    def begin(self, widths):
+        from openpyxl import Workbook
+        from openpyxl.utils import get_column_letter
+
+        self.wb = Workbook(write_only=True)
+        self.ws = self.wb.create_sheet("Registrations")
+        for i, width in enumerate(widths, start=1):
+            self.ws.column_dimensions[get_column_letter(i)].width = width
+        self.ws.append(HEADER)
+
+    def write(self, rows):
+        self.rows += len(rows)
+        for r in rows:
+            self.ws.append(r)
+
+    def finish(self):
+        self.wb.save(self.file)
+        self.file.seek(0)
+        return self.file
+
+
+SINKS = {"csv": CsvSink, "xlsx": XlsxSink}
+
+
+# ================== Pipeline ==================
+class Export(NamedTuple):
+    file: BinaryIO
+    rows: Optional[int]  # None — отдано из кэша, строки не считались
+    rev: int
+    cached: bool
+
+
+async def _build(db: Database, fmt: str, since: Optional[Since], file: BinaryIO = None):
+    # Сериализация (csv/openpyxl) — CPU; уводим её в executor порциями,
+    # пока event loop продолжает обслуживать апдейты. Версия, ширины и строки
+    # читаются в одной транзакции читателя (один снимок WAL): файл ровно
+    # соответствует версии, под которой его кэшируют и от которой считают дельты.
+    # Возвращает (файл, строк, (epoch, версия)).
+    loop = asyncio.get_running_loop()
+    sink = SINKS[fmt](file)
+    t0 = time.perf_counter()
+    try:
+        async with db.reader() as conn:
+            await conn.execute("BEGIN")
+            try:
+                async with conn.execute(VERSION_SQL) as cur:
+                    version = await cur.fetchone()
+                widths = await column_widths(conn, since) if fmt == "xlsx" else None
+                await loop.run_in_executor(None, sink.begin, widths)
+                async for rows in iter_rows(conn, since):
+                    await loop.run_in_executor(None, sink.write, rows)
+            finally:
+                await conn.execute("COMMIT")
+        file = await loop.run_in_executor(None, sink.finish)
+        EXPORT_SECONDS.observe(time.perf_counter() - t0, fmt)
+        EXPORT_BYTES.observe(file.seek(0, io.SEEK_END), fmt)
+        file.seek(0)
+        return file, sink.rows, version
+    except BaseException:
+        sink.file.close()
+        raise
+
+
+def cache_dir(db: Database) -> str:
+    return CACHE_DIR or os.path.join(os.path.dirname(os.path.abspath(db.path)), "exports")
+
+
+def _snapshot_path(db: Database, fmt: str, epoch: str, rev: int) -> str:
+    return os.path.join(cache_dir(db), f"registrations-{epoch}-{rev}.{fmt}")
+
+
+def _drop_stale(directory: str, fmt: str, epoch: str, keep: str):
+    # Только снимки этой базы: каталог кэша общий для файлов всех мероприятий
+    prefix = f"registrations-{epoch}-"
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name.startswith(prefix) and name.endswith("." + fmt) and path != keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+async def snapshot(db: Database, fmt: str) -> Export:
+    # Полная выгрузка. Если версия таблицы не менялась с прошлой сборки,
+    # отдаём готовый файл: один SELECT по reg_version вместо скана таблицы.
+    # Иначе собираем, и имя файла берём из версии, прочитанной внутри сборки.
+    epoch, rev = await table_version(db)
+    path = _snapshot_path(db, fmt, epoch, rev)
+    try:
+        file = open(path, "rb")
+    except FileNotFoundError:
+        pass
+    else:
+        EXPORT_CACHE.inc(fmt, "hit")
+        return Export(file, None, rev, True)
+    EXPORT_CACHE.inc(fmt, "miss")
+    directory = cache_dir(db)
+    os.makedirs(directory, exist_ok=True)
+    # Пишем во временный файл рядом и атомарно переименовываем: параллельная
+    # выгрузка (другой админ, другой воркер) не увидит недописанный файл
+    tmp = tempfile.NamedTemporaryFile(dir=directory, prefix=".build-", suffix="." + fmt, delete=False)
+    try:
+        file, rows, (epoch, rev) = await _build(db, fmt, None, tmp)
+        file.close()
+        path = _snapshot_path(db, fmt, epoch, rev)
+        os.replace(tmp.name, path)
+    except BaseException:
+        tmp.close()
+        if os.path.exists(tmp.name):
+            os.remove(tmp.name)
+        raise
+    _drop_stale(directory, fmt, epoch, path)
+    return Export(open(path, "rb"), rows, rev, False)
+
+
+async def build_export(db: Database, fmt: str, since: Since = None) -> Export:
+    if since is None:
+        return await snapshot(db, fmt)
+    file, rows, (_, rev) = await _build(db, fmt, since)
+    return Export(file, rows, rev, False)
+
+
+class SpooledInputFile(InputFile):
+    # Отдаёт spooled-файл в aiogram кусками, без копирования в bytes
+    def __init__(self, file, filename: str, chunk_size: int = 64 * 1024):
+        super().__init__(filename=filename, chunk_size=chunk_size)
+        self.file = file
+
+    async def read(self, bot):
+        self.file.seek(0)
+        while chunk := self.file.read(self.chunk_size):
+            yield chunk
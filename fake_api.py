@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# Заглушка Bot API для бенчмарков и нагрузочных прогонов: ничего не шлёт
+# в сеть, а записывает исходящие вызовы и отвечает правдоподобными объектами.
+import asyncio
+import time
+from itertools import count
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.types import Chat, Message, Update, User
+
+FAKE_TOKEN = "123456:FAKE-TOKEN-for-local-runs"
+
+
+class FakeSession(BaseSession):
+    def __init__(self, latency: float = 0.0, record: bool = True):
+        super().__init__()
+        self.latency = latency
+        self.record = record
+        self.calls = []
+        self._ids = count(1)
+
+    async def make_request(self, bot, method, timeout=None):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.record:
+            self.calls.append((method.__api_method__, method))
+        if method.__returning__ is Message:
+            chat_id = getattr(method, "chat_id", 0)
+            return Message(
+                message_id=next(self._ids),
+                date=int(time.time()),
+                chat=Chat(id=chat_id if isinstance(chat_id, int) else 0, type="private"),
+                text=getattr(method, "text", None),
+            )
+        if method.__returning__ is User:
+            return User(id=int(FAKE_TOKEN.split(":")[0]), is_bot=True, first_name="Fake", username="fake_bot")
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+def fake_bot(session: BaseSession = None, **kwargs) -> Bot:
+    return Bot(FAKE_TOKEN, session=session or FakeSession(), **kwargs)
+
+
+def make_update(update_id: int, user_id: int, text: str, username: str = None) -> dict:
+    # Синтетический апдейт в формате Bot API (как приходит в webhook)
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}",
+                     **({"username": username} if username else {})},
+            "text": text,
+        },
+    }
+
+
+def make_update_obj(update_id: int, user_id: int, text: str, username: str = None) -> Update:
+    return Update.model_validate(make_update(update_id, user_id, text, username))
+
+
+
+def make_photo_update(update_id: int, user_id: int, file_id: str, file_unique_id: str) -> dict:
+    # Фото в трёх размерах, как их присылает Telegram (от меньшего к большему)
+    update = make_update(update_id, user_id, "")
+    message = update["message"]
+    del message["text"]
+    message["photo"] = [
+        {"file_id": f"{file_id}_{side}", "file_unique_id": f"{file_unique_id}_{side}",
+         "width": side, "height": side}
+        for side in (90, 320, 1280)
+    ]
+    return update
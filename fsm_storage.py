@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from db import Database
+from metrics import FSM_ENTERED, FSM_EXPIRED
+from schema import FSM_SQL
+
+# Схема создаётся миграцией 5 (repository.py), DDL — в schema.py
+
+UPSERT_SQL = """
+INSERT INTO fsm_sessions (key, state, data, updated_at) VALUES (?, ?, ?, ?)
+ON CONFLICT(key) DO UPDATE SET state=excluded.state, data=excluded.data, updated_at=excluded.updated_at
+"""
+
+CACHE_SIZE = 10000
+TTL = 3 * 24 * 3600
+
+
+class SQLiteStorage(BaseStorage):
+    # FSM-хранилище в том же SQLite-файле, что и регистрации.
+    # Горячие сессии лежат в LRU (запись сквозная: сначала БД, потом кэш),
+    # брошенные анкеты старше ttl считаются пустыми и удаляются expire().
+
+    def __init__(self, db: Database, cache_size: int = CACHE_SIZE, ttl: float = TTL):
+        self.db = db
+        self.cache_size = cache_size
+        self.ttl = ttl
+        # key -> [state, data, updated_at]; пустые записи тоже кэшируем,
+        # чтобы сообщения вне анкеты не ходили в БД за состоянием
+        self._cache = OrderedDict()
+        # user_id -> сколько кэшированных ключей с состоянием: кто сейчас в анкете
+        self._forms = {}
+
+    async def setup(self):
+        await self.db.executescript(FSM_SQL)
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:{key.destiny}"
+
+    def _track(self, k, record, delta):
+        if record is None or record[0] is None:
+            return
+        user_id = int(k.split(":")[2])
+        n = self._forms.get(user_id, 0) + delta
+        if n > 0:
+            self._forms[user_id] = n
+        else:
+            self._forms.pop(user_id, None)
+
+    def _remember(self, k, record):
+        self._track(k, self._cache.get(k), -1)
+        self._track(k, record, 1)
+        self._cache[k] = record
+        self._cache.move_to_end(k)
+        if len(self._cache) > self.cache_size:
+            self._track(*self._cache.popitem(last=False), -1)
+
+    def in_form(self, user_id: int) -> bool:
+        # Только по кэшу, без БД: антифлуд спрашивает до загрузки FSM.
+        # После рестарта пользователь попадает сюда с первым прошедшим апдейтом
+        return user_id in self._forms
+
+    async def _load(self, k):
+        record = self._cache.get(k)
+        now = time.time()
+        if record is not None:
+            if now - record[2] <= self.ttl:
+                self._cache.move_to_end(k)
+                return record
+            record = [None, {}, now]
+        else:
+            row = await self.db.fetchone("SELECT state, data, updated_at FROM fsm_sessions WHERE key=?", (k,))
+            if row is None or now - row[2] > self.ttl:
+                record = [None, {}, now]
+            else:
+                record = [row[0], json.loads(row[1]) if row[1] else {}, row[2]]
+        self._remember(k, record)
+        return record
+
+    async def _save(self, k, state, data):
+        # Сначала база, потом кэш: если запись не прошла, кэш не опережает БД
+        # и следующий апдейт не увидит шаг или данные, которых в базе нет.
+        # Кэшированная запись не мутируется — её заменяет новая
+        now = time.time()
+        if state is None and not data:
+            await self.db.enqueue("DELETE FROM fsm_sessions WHERE key=?", (k,))
+        else:
+            await self.db.enqueue(UPSERT_SQL, (k, state, json.dumps(data, ensure_ascii=False), now))
+        self._remember(k, [state, data, now])
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        k = self._key(key)
+        record = await self._load(k)
+        state = state.state if isinstance(state, State) else state
+        await self._save(k, state, record[1])
+        if state is not None and state != record[0]:
+            # Воронка: сколько раз дошли до каждого шага
+            FSM_ENTERED.inc(state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._load(self._key(key)))[0]
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        k = self._key(key)
+        record = await self._load(k)
+        await self._save(k, record[0], data.copy())
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._load(self._key(key)))[1].copy()
+
+    async def expire(self) -> int:
+        # Удаляет брошенные сессии старше ttl из БД и кэша
+        cutoff = time.time() - self.ttl
+        for k in [k for k, record in self._cache.items() if record[2] < cutoff]:
+            self._track(k, self._cache.pop(k), -1)
+        async with self.db.transaction() as conn:
+            # На каком шаге бросили анкету — для воронки
+            async with conn.execute(
+                "SELECT COALESCE(state, '-'), COUNT(*) FROM fsm_sessions WHERE updated_at < ? GROUP BY 1",
+                (cutoff,),
+            ) as cur:
+                abandoned = await cur.fetchall()
+            cur = await conn.execute("DELETE FROM fsm_sessions WHERE updated_at < ?", (cutoff,))
+            removed = cur.rowcount
+            await cur.close()
+        for state, n in abandoned:
+            FSM_EXPIRED.inc(state, amount=n)
+        return removed
+
+    async def close(self) -> None:
+        self._cache.clear()
+        self._forms.clear()
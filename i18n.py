@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+# Локализация анкеты: язык пользователя и тексты на этом языке.
+# Тексты из locales.py компилируются один раз при импорте: константы из config
+# (организатор, карты, цены, маршрут) и кнопки своей же локали подставлены,
+# «\n» из однострочных записей развёрнуты. На апдейт остаётся поиск в словаре,
+# а format() — только у шаблонов с данными пользователя ({name}, {left}...).
+#
+# Язык пользователя хранится в user_langs основной базы и читается через
+# LRU-кэш: из БД — только первое сообщение пользователя после рестарта.
+# Пока язык не выбран, он берётся из language_code клиента Telegram.
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import KeyboardButton, ReplyKeyboardMarkup, TelegramObject
+
+from config import (
+    CARD_NUMBER, LOCATION_COORDS, LOCATION_NAME, ORGANIZER_NICK, PRICE_COTTAGE_2, PRICE_COTTAGE_3, PRICE_YURT,
+)
+from db import Database
+from keyboards import LANG_KB, freeze
+from locales import RU, UZ
+
+# Схема создаётся миграцией 13 (repository.py), DDL — в schema.py
+
+LANGS = ("ru", "uz")
+DEFAULT_LANG = "ru"
+CACHE_SIZE = 100000
+
+# Реквизиты из анкеты; CARD_NUMBER в окружении их заменяет
+CARDS = "UZCARD: 5614 6806 0888 2326 — Akbarjon Kulov\nVISA: 4023 0602 2688 2305 — Akbarjon Kulov"
+ROUTE_FROM = "41.331143,69.272065"  # Ташкент
+
+
+def money(amount: int) -> str:
+    return f"{amount:,}".replace(",", " ")
+
+
+CONSTANTS = dict(
+    nick=ORGANIZER_NICK,
+    cards=CARD_NUMBER if CARD_NUMBER.strip("0 ") else CARDS,
+    card=CARD_NUMBER,
+    loc=LOCATION_NAME,
+    coords=LOCATION_COORDS,
+    route=f"https://yandex.ru/navi?rtext={ROUTE_FROM}~{LOCATION_COORDS}&rtt=auto",
+    p2=money(PRICE_COTTAGE_2),
+    p3=money(PRICE_COTTAGE_3),
+    py=money(PRICE_YURT),
+)
+
+
+class _Keep(dict):
+    # Неизвестные поля остаются в шаблоне как есть — их заполнят позже
+    def __missing__(self, key):
+        return "{" + key + "}"
+
+
+def compile_text(text: str, values: dict) -> str:
+    return text.replace("\\n", "\n").strip("\n").format_map(_Keep(values))
+
+
+# ================== Locales ==================
+class Locale:
+    # Скомпилированные тексты и клавиатуры одного языка. t["key"] — готовая
+    # строка, t("key", **kw) — шаблон с данными пользователя
+    __slots__ = ("lang", "texts", "kb")
+
+    def __init__(self, lang: str, source: dict):
+        self.lang = lang
+        strings = {k: v for k, v in source.items() if isinstance(v, str)}
+        values = {**CONSTANTS, **{k: v for k, v in strings.items() if k.startswith("btn_")}}
+        self.texts = {k: compile_text(v, values) for k, v in strings.items()}
+        self.kb = self._keyboards()
+
+    def __getitem__(self, key: str) -> str:
+        return self.texts[key]
+
+    def __call__(self, key: str, **kw) -> str:
+        return self.texts[key].format(**kw)
+
+    def item(self, kind: str, default: str) -> str:
+        return self.texts.get(f"item_{kind}", default)
+
+    def _keyboards(self) -> dict:
+        t = self.texts
+        other = next(LOCALES_SRC[lang]["lang_name"] for lang in LANGS if lang != self.lang)
+
+        def kb(rows, **kw):
+            return freeze(ReplyKeyboardMarkup(
+                keyboard=[[KeyboardButton(text=text) for text in row] for row in rows], resize_keyboard=True, **kw,
+            ))
+
+        return dict(
+            start=kb([[t["btn_start_register"]], [t["btn_start_info"], t["btn_location"]], [other]]),
+            yes_no=kb([[t["btn_yes"]], [t["btn_no"]]], one_time_keyboard=True),
+            race_type=kb([["🏁 Jeep Sprint"], ["🧗 Jeep Trial"]], one_time_keyboard=True),
+            payment=kb([[t["btn_paid"]], [t["btn_later"]], [t["btn_cancel"]]], one_time_keyboard=True),
+            lang=LANG_KB,
+        )
+
+
+LOCALES_SRC = {"ru": RU, "uz": UZ}
+LOCALES = {lang: Locale(lang, LOCALES_SRC[lang]) for lang in LANGS}
+# Кнопка -> язык: выбор языка и переключатель на стартовой клавиатуре
+LANG_BUTTONS = {LOCALES_SRC[lang]["lang_name"]: lang for lang in LANGS}
+# Двуязычные кнопки прежней клавиатуры: остаются у тех, кто открыл бота до обновления
+_LEGACY_BUTTONS = {
+    "btn_start_register": "🚀 Зарегистрироваться / Ro‘yxatdan o‘tish",
+    "btn_start_info": "ℹ️ Инфо / Ma’lumot",
+    "btn_location": "📍 Локация / Manzil",
+}
+
+
+def buttons(key: str) -> frozenset:
+    # Текст кнопки на всех языках — для F.text.in_(...)
+    texts = {LOCALES[lang][key] for lang in LANGS}
+    if key in _LEGACY_BUTTONS:
+        texts.add(_LEGACY_BUTTONS[key])
+    return frozenset(texts)
+
+
+def guess_lang(language_code: Optional[str]) -> str:
+    return "uz" if (language_code or "").lower().startswith("uz") else DEFAULT_LANG
+
+
+# ================== Store ==================
+class LangStore:
+    def __init__(self, db: Database, cache_size: int = CACHE_SIZE):
+        self.db = db
+        self.cache_size = cache_size
+        # tg_id -> выбранный язык или "" (не выбирал); «нет» тоже кэшируется
+        self._cache = OrderedDict()
+        self.misses = 0
+
+    async def chosen(self, tg_id: int) -> Optional[str]:
+        lang = self._cache.get(tg_id)
+        if lang is None:
+            self.misses += 1
+            row = await self.db.fetchone("SELECT lang FROM user_langs WHERE tg_id=?", (tg_id,))
+            lang = row[0] if row and row[0] in LOCALES else ""
+            self._remember(tg_id, lang)
+        else:
+            self._cache.move_to_end(tg_id)
+        return lang or None
+
+    async def get(self, tg_id: int, language_code: str = None) -> str:
+        return await self.chosen(tg_id) or guess_lang(language_code)
+
+    async def set(self, tg_id: int, lang: str):
+        await self.db.enqueue(
+            "INSERT INTO user_langs (tg_id, lang, updated_at) VALUES (?,?,?) "
+            "ON CONFLICT(tg_id) DO UPDATE SET lang=excluded.lang, updated_at=excluded.updated_at",
+            (tg_id, lang, datetime.utcnow().isoformat()),
+        )
+        self._remember(tg_id, lang)
+
+    def _remember(self, tg_id: int, lang: str):
+        self._cache[tg_id] = lang
+        self._cache.move_to_end(tg_id)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+
+class LocaleMiddleware(BaseMiddleware):
+    # Outer-middleware на dp.update: кладёт в данные хендлера локаль
+    # пользователя (t) и само хранилище (langs)
+
+    def __init__(self, store: LangStore):
+        self.store = store
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        lang = await self.store.get(user.id, user.language_code) if user else DEFAULT_LANG
+        data["t"] = LOCALES[lang]
+        data["langs"] = self.store
+        return await handler(event, data)
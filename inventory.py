@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+# Места с ограниченным количеством: коттеджи, юрты и слоты Jeep Sprint / Jeep Trial.
+# Пока пользователь заполняет анкету, место держится бронью с истечением (held),
+# после регистрации бронь становится занятым местом (taken).
+#
+# Источник истины — счётчики inventory, их ведут триггеры на holds в той же
+# транзакции, что и сама бронь. CHECK (held + taken <= capacity) не даёт
+# триггеру выйти за ёмкость: такой оператор падает с IntegrityError и
+# откатывается целиком. Поэтому каждая операция — один оператор, который
+# идёт через write-behind очередь db.enqueue и не может продать лишнее место
+# ни при пакетной записи, ни при нескольких воркерах на одном файле.
+#
+# Остатки держатся в памяти: чтение — поиск в словаре. Они перечитываются после
+# каждой своей операции и периодической уборкой (так видны и чужие воркеры);
+# это подсказка для текстов и быстрого отказа, решает всё равно база.
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+import aiosqlite
+
+from config import (
+    COTTAGES_2, COTTAGES_3, HOLD_TTL, PRICE_COTTAGE_2, PRICE_COTTAGE_3, PRICE_YURT, SPRINT_SLOTS,
+    TRIAL_SLOTS, YURTS,
+)
+from db import Database
+
+log = logging.getLogger("inventory")
+
+# Схема создаётся миграцией 11 (repository.py), DDL — в schema.py
+
+# Бронь или место: новая строка, а если у пользователя в группе уже есть
+# бронь — она переезжает на этот вид (Sprint -> Trial) и продлевается.
+# Занятое место (taken) этим не перезаписывается.
+RESERVE_SQL = (
+    "INSERT INTO holds (kind, grp, tg_id, qty, status, expires_at, created_at, updated_at) "
+    "VALUES (?,?,?,?,?,?,?,?) "
+    "ON CONFLICT(grp, tg_id) WHERE status IN ('held', 'taken') DO UPDATE SET "
+    "kind=excluded.kind, qty=excluded.qty, status=excluded.status, expires_at=excluded.expires_at, "
+    "updated_at=excluded.updated_at WHERE holds.status = 'held'"
+)
+
+# Активная бронь пользователя в группе и остаток вида — одним чтением
+ACTIVE_SQL = (
+    "SELECT h.id, h.kind, h.qty, h.status, i.kind, i.capacity, i.held, i.taken FROM inventory i "
+    "LEFT JOIN holds h ON h.grp=? AND h.tg_id=? AND h.status IN ('held', 'taken') WHERE i.kind=?"
+)
+
+# Как часто снимать просроченные брони и перечитывать остатки
+SWEEP_EVERY = 15.0
+
+
+class Item(NamedTuple):
+    kind: str
+    group: str  # в группе у пользователя не больше одного места
+    title: str
+    price: int
+    capacity: int  # начальное значение; дальше меняется через set_capacity
+
+
+ITEMS = (
+    Item("cottage2", "lodging", "Коттедж на 2", PRICE_COTTAGE_2, COTTAGES_2),
+    Item("cottage3", "lodging", "Коттедж на 3", PRICE_COTTAGE_3, COTTAGES_3),
+    Item("yurt", "lodging", "Юрта (3+ человек)", PRICE_YURT, YURTS),
+    Item("sprint", "race", "Jeep Sprint", 0, SPRINT_SLOTS),
+    Item("trial", "race", "Jeep Trial", 0, TRIAL_SLOTS),
+)
+
+# race_type анкеты -> вид места
+RACE_KINDS = {"Jeep Sprint": "sprint", "Jeep Trial": "trial"}
+
+
+class Hold(NamedTuple):
+    id: int
+    kind: str
+    qty: int
+    status: str  # held / taken
+
+
+# ================== Engine ==================
+class Inventory:
+    def __init__(self, db: Database, items=ITEMS, ttl: float = HOLD_TTL, sweep_every: float = SWEEP_EVERY):
+        self.db = db
+        self.items = {i.kind: i for i in items}
+        self.ttl = ttl
+        self.sweep_every = sweep_every
+        self._free = {i.kind: 0 for i in items}
+        self._capacity = {i.kind: i.capacity for i in items}
+        self._task = None
+        self.denied = 0
+        self.expired = 0
+
+    def available(self, kind: str) -> int:
+        return self._free.get(kind, 0)
+
+    def capacity(self, kind: str) -> int:
+        return self._capacity.get(kind, 0)
+
+    def stats(self) -> dict:
+        return dict(self._free)
+
+    # ---------- lifecycle ----------
+    async def load(self):
+        # Новые виды получают начальную ёмкость; у существующих она не трогается
+        await self.db.executemany(
+            "INSERT OR IGNORE INTO inventory (kind, capacity) VALUES (?, ?)",
+            [(i.kind, i.capacity) for i in self.items.values()],
+        )
+        await self.expire()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._sweeper())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _sweeper(self):
+        while True:
+            await asyncio.sleep(self.sweep_every)
+            try:
+                await self.expire()
+            except Exception:
+                log.exception("inventory sweep failed")
+
+    async def refresh(self):
+        for row in await self.db.fetchall("SELECT kind, capacity, held, taken FROM inventory"):
+            self._apply(row)
+
+    def _apply(self, row):
+        kind, capacity, held, taken = row
+        self._capacity[kind] = capacity
+        self._free[kind] = capacity - held - taken
+
+    async def active(self, kind: str, tg_id: int) -> Optional[Hold]:
+        # Бронь/место пользователя в группе вида; заодно обновляет остаток вида
+        row = await self.db.fetchone(ACTIVE_SQL, (self.items[kind].group, tg_id, kind))
+        if row is None:
+            return None
+        self._apply(row[4:])
+        return Hold._make(row[:4]) if row[0] is not None else None
+
+    # ---------- reservations ----------
+    async def hold(self, kind: str, tg_id: int, qty: int = 1) -> Optional[Hold]:
+        # Бронь на ttl секунд; повторный вызов продлевает её.
+        # None — мест нет; Hold другого вида — в группе уже есть занятое место.
+        return await self._reserve(kind, tg_id, qty, "held")
+
+    async def take(self, kind: str, tg_id: int, qty: int = 1) -> Optional[Hold]:
+        # Занять место: подтверждает бронь пользователя, а если её нет
+        # (или её уже сняла уборка) — выделяет место напрямую
+        return await self._reserve(kind, tg_id, qty, "taken")
+
+    async def _reserve(self, kind: str, tg_id: int, qty: int, status: str) -> Optional[Hold]:
+        if self._free.get(kind, 0) < qty:
+            # По памяти мест нет. Отвечаем без записи, если у пользователя
+            # нет своей брони этого вида (заодно перечитываем остаток)
+            current = await self.active(kind, tg_id)
+            if current is not None and current.status == "taken":
+                return current
+            if (current is None or current.kind != kind) and self._free.get(kind, 0) < qty:
+                self.denied += 1
+                return None
+        now = time.time()
+        stamp = datetime.utcnow().isoformat()
+        expires = now + self.ttl if status == "held" else None
+        params = (kind, self.items[kind].group, tg_id, qty, status, expires, stamp, stamp)
+        try:
+            await self.db.enqueue(RESERVE_SQL, params)
+        except aiosqlite.IntegrityError:
+            # CHECK: места кончились. Возможно, их держат просроченные брони,
+            # которые уборка ещё не сняла, — снимаем и пробуем ещё раз
+            try:
+                if not await self.expire(kind):
+                    raise
+                await self.db.enqueue(RESERVE_SQL, params)
+            except aiosqlite.IntegrityError:
+                self.denied += 1
+                await self.active(kind, tg_id)
+                return None
+        # Своя строка — или уже занятое место в группе, которое upsert не трогает
+        return await self.active(kind, tg_id)
+
+    async def release(self, tg_id: int, kind: str = None, taken: bool = False):
+        # Снять брони пользователя (все или одного вида); taken=True — и занятые места
+        statuses = "status IN ('held', 'taken')" if taken else "status='held'"
+        sql = f"UPDATE holds SET status='released', expires_at=NULL, updated_at=? WHERE tg_id=? AND {statuses}"
+        params = (datetime.utcnow().isoformat(), tg_id)
+        if kind is not None:
+            sql += " AND kind=?"
+            params += (kind,)
+        await self.db.enqueue(sql, params)
+        await self.refresh()
+
+    # ---------- expiry ----------
+    async def expire(self, kind: str = None) -> int:
+        # Снять просроченные брони и перечитать остатки. Проверка — читателем,
+        # запись — только если есть что снимать.
+        now = time.time()
+        where = "status='held' AND expires_at < ?"
+        params = (now,)
+        if kind is not None:
+            where += " AND kind=?"
+            params += (kind,)
+        n = (await self.db.fetchone(f"SELECT COUNT(*) FROM holds WHERE {where}", params))[0]
+        if n:
+            await self.db.enqueue(
+                f"UPDATE holds SET status='expired', expires_at=NULL, updated_at=? WHERE {where}",
+                (datetime.utcnow().isoformat(), *params),
+            )
+            self.expired += n
+        await self.refresh()
+        return n
+
+    # ---------- admin ----------
+    async def set_capacity(self, kind: str, capacity: int) -> bool:
+        # Меньше уже выданного (held + taken) поставить нельзя — не пустит CHECK
+        try:
+            await self.db.enqueue("UPDATE inventory SET capacity=? WHERE kind=?", (capacity, kind))
+        except aiosqlite.IntegrityError:
+            return False
+        finally:
+            await self.refresh()
+        return True
+
+    async def summary(self):
+        # [(Item, capacity, held, taken)] для /slots
+        rows = await self.db.fetchall("SELECT kind, capacity, held, taken FROM inventory")
+        by_kind = {r[0]: r[1:] for r in rows}
+        return [(item, *by_kind.get(kind, (0, 0, 0))) for kind, item in self.items.items()]
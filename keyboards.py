@@ -1,12 +1,17 @@
-﻿from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
+﻿from aiohttp import FormData
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
+from pydantic import ConfigDict
 
-def lang_kb():
+from locales import RU, UZ
+
+def _lang_kb():
     return ReplyKeyboardMarkup(
         keyboard=[[KeyboardButton(text="🇷🇺 Русский"), KeyboardButton(text="🇺🇿 O‘zbekcha")]],
         resize_keyboard=True, one_time_keyboard=True
     )
 
-def main_menu(t):
+def _main_menu(t):
     return ReplyKeyboardMarkup(
         keyboard=[
             [KeyboardButton(text=t["btn_register"])],
@@ -15,17 +20,17 @@ def main_menu(t):
         resize_keyboard=True
     )
 
-def people_kb(t):
+def _people_kb(t):
     row = [KeyboardButton(text=x) for x in t["people_buttons"]]
     return ReplyKeyboardMarkup(keyboard=[row], resize_keyboard=True, one_time_keyboard=True)
 
-def skip_kb(t):
+def _skip_kb(t):
     return ReplyKeyboardMarkup(
         keyboard=[[KeyboardButton(text=t["skip"])]],
         resize_keyboard=True, one_time_keyboard=True
     )
 
-def lodging_kb(t):
+def _lodging_kb(t):
     return ReplyKeyboardMarkup(
         keyboard=[
             [KeyboardButton(text=t["lodging_cottage"]), KeyboardButton(text=t["lodging_yurt"])],
@@ -34,7 +39,7 @@ def lodging_kb(t):
         resize_keyboard=True, one_time_keyboard=True
     )
 
-def confirm_kb(t):
+def _confirm_kb(t):
     # Кнопки на экране подтверждения
     return ReplyKeyboardMarkup(
         keyboard=[
@@ -44,3 +49,108 @@ def confirm_kb(t):
         ],
         resize_keyboard=True, one_time_keyboard=True
     )
+
+# ================== Registry ==================
+# Клавиатуры строятся один раз при импорте, по локали, и дальше отдаются
+# одним и тем же неизменяемым объектом. CachedSession сериализует такой
+# объект в JSON тоже один раз, а не на каждую отправку.
+class FrozenKeyboardButton(KeyboardButton):
+    model_config = ConfigDict(frozen=True)
+
+
+class FrozenReplyKeyboardMarkup(ReplyKeyboardMarkup):
+    model_config = ConfigDict(frozen=True)
+
+
+_frozen = {}  # id(markup) -> markup; держим ссылку, чтобы id не переиспользовался
+
+
+def freeze(markup: ReplyKeyboardMarkup) -> FrozenReplyKeyboardMarkup:
+    data = markup.model_dump(exclude_none=True)
+    data["keyboard"] = [[FrozenKeyboardButton(**b) for b in row] for row in data["keyboard"]]
+    frozen = FrozenReplyKeyboardMarkup(**data)
+    _frozen[id(frozen)] = frozen
+    return frozen
+
+
+def is_frozen(value) -> bool:
+    return id(value) in _frozen and _frozen[id(value)] is value
+
+
+LOCALES = {"ru": RU, "uz": UZ}
+_BUILDERS = {
+    "main_menu": _main_menu,
+    "people": _people_kb,
+    "skip": _skip_kb,
+    "lodging": _lodging_kb,
+    "confirm": _confirm_kb,
+}
+KEYBOARDS = {
+    lang: {name: freeze(build(t)) for name, build in _BUILDERS.items()}
+    for lang, t in LOCALES.items()
+}
+LANG_KB = freeze(_lang_kb())
+_lang_of = {id(t): lang for lang, t in LOCALES.items()}
+
+
+def get_kb(lang: str, name: str) -> FrozenReplyKeyboardMarkup:
+    return KEYBOARDS[lang][name]
+
+
+def _cached(name, t):
+    lang = _lang_of.get(id(t))
+    return KEYBOARDS[lang][name] if lang else _BUILDERS[name](t)
+
+
+def lang_kb():
+    return LANG_KB
+
+
+def main_menu(t):
+    return _cached("main_menu", t)
+
+
+def people_kb(t):
+    return _cached("people", t)
+
+
+def skip_kb(t):
+    return _cached("skip", t)
+
+
+def lodging_kb(t):
+    return _cached("lodging", t)
+
+
+def confirm_kb(t):
+    return _cached("confirm", t)
+
+
+class CachedSession(AiohttpSession):
+    # Замороженные клавиатуры подставляются в форму готовой JSON-строкой;
+    # остальные поля метода сериализуются как обычно
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._json = {}
+
+    def _frozen_json(self, value, bot):
+        cached = self._json.get(id(value))
+        if cached is None:
+            cached = self._json[id(value)] = self.prepare_value(value, bot=bot, files={})
+        return cached
+
+    def build_form_data(self, bot, method):
+        markup = getattr(method, "reply_markup", None)
+        if markup is None or not is_frozen(markup):
+            return super().build_form_data(bot, method)
+        form = FormData(quote_fields=False)
+        files = {}
+        for key, value in method.model_dump(warnings=False, exclude={"reply_markup"}).items():
+            value = self.prepare_value(value, bot=bot, files=files)
+            if not value:
+                continue
+            form.add_field(key, value)
+        form.add_field("reply_markup", self._frozen_json(markup, bot))
+        for key, value in files.items():
+            form.add_field(key, value.read(bot), filename=value.filename or key)
+        return form
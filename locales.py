@@ -17,7 +17,112 @@
 "invalid_phone":"Неверный номер. Пример: +998 90 123 45 67",
 "people_buttons":["1","2","3","4","5"],
 "status_check":"📋 Проверить статус заявки: {status}",
-"send_receipt_btn":"Отправить чек","edit_data_btn":"Изменить данные"
+"send_receipt_btn":"Отправить чек","edit_data_btn":"Изменить данные",
+# ---------- Анкета RegForm (main.py) ----------
+"lang_name":"🇷🇺 Русский",
+"btn_start_register":"🚀 Зарегистрироваться","btn_start_info":"ℹ️ Инфо",
+"ask_name":"😎 Укажите ваше имя и фамилию.","ask_car":"🚙 Напишите марку и модель вашего автомобиля.",
+"ask_plate":"🔢 Укажите госномер автомобиля (например 01A777AA, KZ 321ABC05).",
+"ask_people":"👥 Сколько человек будет в автомобиле (включая водителя)? Только число.",
+"ask_phone":"📞 Укажите номер телефона (+код страны...)","bad_phone":"Кажется, номер некорректный. Отправьте ещё раз (+код страны...)",
+"lodging_header":"🏡 <b>Проживание (по желанию):</b>",
+"receipt_prompt":"🧾 Отправьте фото или скриншот чека об оплате.","receipt_received":"✅ Чек получен и ожидает проверки администратором.",
+"receipt_approved":"✅ Оплата подтверждена! До встречи на фестивале.",
+"receipt_rejected":"❌ Чек не принят. Отправьте верный чек командой /receipt.",
+"btn_location":"📍 Локация","btn_yes":"✅ Да","btn_no":"❌ Нет",
+"btn_paid":"💰 Я оплатил(а)","btn_later":"⏳ Оплачу позже","btn_cancel":"❌ Отмена",
+"bad_name":"Введите корректное имя.","bad_car":"Укажите марку и модель корректно.",
+"bad_plate":"Введите корректный госномер (минимум 4 символа).","bad_people":"Введите только число.",
+"press_yes_no":"Нажмите кнопку «Да» или «Нет».",
+"race_type_prompt":"Выберите:\n🏁 Jeep Sprint — 25.10 (подготовленные авто) — {sprint}\n🧗 Jeep Trial — 26.10 (для всех желающих 4x4) — {trial}",
+"race_type_again":"Выберите: «🏁 Jeep Sprint» или «🧗 Jeep Trial».",
+"slots_left":"мест: {n}","slots_none":"мест нет",
+"race_sold_out":"❌ Места на {race_type} закончились. Можно выбрать другую дисциплину или участвовать без соревнований.",
+"race_lost":"⚠️ Пока заполнялась анкета, места на {race_type} закончились — вы зарегистрированы без участия в соревнованиях.",
+"cancelled":"Отменено.",
+"duplicate":"❗️ Регистрация с таким номером телефона или госномером уже существует.\nЕсли нужно изменить данные — напишите {nick}.",
+"already_registered":"✅ Вы уже зарегистрированы. Если нужно изменить данные — напишите {nick}.",
+"plate_taken":"❗️ Этот госномер уже зарегистрирован. Введите другой номер или напишите {nick}.",
+"phone_taken":"❗️ Этот телефон уже зарегистрирован. Введите другой номер или напишите {nick}.",
+"pay_reminder":"⏰ Напоминаем: взнос за участие ({fee} сум) ещё не оплачен.\n\n{cards}\n\nПосле оплаты отправьте чек командой /receipt. Вопросы — {nick}.",
+"ticket":"🎫 <b>Билет на въезд</b>\n🚙 {plate}  •  💰 {status}\n\nПокажите этот QR на воротах — всегда последний присланный. Если QR не читается, назовите код:\n<code>{code}</code>\n\nПрислать билет ещё раз — /ticket",
+"ticket_paid":"оплачено",
+"ticket_unpaid":"не оплачено",
+"ticket_off":"🎫 Билеты на въезд пока не выдаются.",
+"registered":"✅ <b>Регистрация успешна!</b>\n\n👤 {name}\n🚙 {car}  •  {plate}\n📞 {phone}\n🏁 Участие: {race}\n💰 Оплата: {payment}\n👥 Людей: {people}",
+"race_none":"Нет","pay_paid":"оплачено","pay_later":"оплачу позже",
+"lodging_free":"✅ {title} — свободно {left} — {price} сум",
+"lodging_sold":"❌ {title} — все уже забронированы — {price} сум",
+"lodging_footer":"Бронь — кнопкой ниже. Вопросы — {nick}",
+"lodging_gone":"❌ Мест больше нет.",
+"lodging_taken":"У вас уже забронировано: {booked}. Изменить — через {nick}.",
+"lodging_booked":"✅ Забронировано: {title} — {price} сум. Оплата и детали — {nick}.",
+"register_first":"Сначала пройдите регистрацию.",
+"item_cottage2":"Коттедж на 2","item_cottage3":"Коттедж на 3","item_yurt":"Юрта (3+ человек)",
+"participate":"""
+🏁 <b>Участвуете ли вы в соревнованиях?</b>
+
+• 25 октября — <b>Jeep Sprint</b> — только для подготовленных автомобилей
+• 26 октября — <b>Jeep Trial</b> — для всех желающих, на любых полноприводных (4x4) автомобилях
+
+Выберите «Да» или «Нет».
+""",
+"payment":"""
+💳 Входной взнос — {fee} сум за автомобиль
+(на организационные расходы)
+
+Для оплаты:
+{cards}
+""",
+# ---------- Тексты мероприятия; /eventset может переопределить ----------
+"welcome":"""
+🌍 <b>{title}</b>
+📍 <b>Озеро Айдаркуль</b>
+📅 <b>25–26 октября 2025</b>
+
+Добро пожаловать на участие в <b>оффроуд-фестивале года!</b> 🚙🔥
+
+🌄 <b>Вас ждёт настоящий праздник для всех любителей внедорожников!</b>
+Клубы и участники съедутся почти со всей страны —
+впереди два дня приключений на природе!
+
+🎯 <b>Программа фестиваля:</b>
+🏁 Джип-триал — открытые соревнования, участвовать может каждый
+🚘 Джип-спринт — только для подготовленных автомобилей
+🚗 Официальная презентация: Toyota Land Cruiser 300 Hybrid
+🚙 На фестивале: новые автомобили разных компаний
+🎵 Музыка, 🍢 еда, ☕ напитки, 🏕 зона отдыха
+🎁 Подарки и тест-драйвы!
+
+Это место, где встречаются энтузиасты,
+делятся опытом, заводят новых друзей
+и просто отлично проводят выходные у Айдаркуля! 💪🌅
+
+💳 <b>Входной взнос:</b>
+{fee} сум за автомобиль
+(на организационные расходы)
+
+Регистрация — <b>«{btn_start_register}»</b>
+Подробнее — <b>«{btn_start_info}»</b>
+""",
+"info":"""
+🔥 <b>{title}</b>
+📅 25–26 октября 2025
+📍 Озеро Айдаркуль, Узбекистан
+
+🏁 Jeep Sprint — 25 октября (для подготовленных автомобилей)
+🧗 Jeep Trial — 26 октября (для всех желающих 4x4)
+🎵 Музыка, еда, напитки, подарки, отдых, тест-драйвы!
+
+Оргкоманда: CarPro_UZ
+Связь: {nick}
+""",
+"location":"""
+📍 <b>Локация фестиваля</b>
+Узбекистан, Навоийская область, у озера Айдаркуль.
+
+👇 <a href="{route}">Открыть маршрут в Яндекс.Навигаторе</a>
+""",
 }
 
 UZ = {
@@ -39,5 +144,110 @@ UZ = {
 "invalid_phone":"Noto‘g‘ri raqam. Misol: +998 90 123 45 67",
 "people_buttons":["1","2","3","4","5"],
 "status_check":"📋 Holatni tekshirish: {status}",
-"send_receipt_btn":"Chek yuborish","edit_data_btn":"Ma’lumotlarni tahrirlash"
+"send_receipt_btn":"Chek yuborish","edit_data_btn":"Ma’lumotlarni tahrirlash",
+# ---------- Анкета RegForm (main.py) ----------
+"lang_name":"🇺🇿 O‘zbekcha",
+"btn_start_register":"🚀 Ro‘yxatdan o‘tish","btn_start_info":"ℹ️ Ma’lumot",
+"ask_name":"😎 Ism va familiyangizni yozing.","ask_car":"🚙 Avtomobil brendi va modelini yozing.",
+"ask_plate":"🔢 Avtomobil davlat raqamini yozing (misol: 01A777AA, KZ 321ABC05).",
+"ask_people":"👥 Mashinada (haydovchini qo‘shib) nechta odam? Faqat raqam yozing.",
+"ask_phone":"📞 Telefon raqamingizni yozing (+mamlakat kodi bilan...).","bad_phone":"Raqam noto‘g‘ri. +mamlakat kodi bilan yuboring.",
+"lodging_header":"🏡 <b>Turar joy (ixtiyoriy):</b>",
+"receipt_prompt":"🧾 To‘lov cheki rasmini yoki skrinshotini yuboring.","receipt_received":"✅ Chek qabul qilindi, admin tekshiruvini kutmoqda.",
+"receipt_approved":"✅ To‘lov tasdiqlandi! Festivalda ko‘rishguncha.",
+"receipt_rejected":"❌ Chek qabul qilinmadi. To‘g‘ri chekni /receipt orqali yuboring.",
+"btn_location":"📍 Manzil","btn_yes":"✅ Ha","btn_no":"❌ Yo‘q",
+"btn_paid":"💰 To‘lov qildim","btn_later":"⏳ Keyin to‘layman","btn_cancel":"❌ Bekor qilish",
+"bad_name":"To‘g‘ri ism kiriting.","bad_car":"Brend va modelni to‘g‘ri yozing.",
+"bad_plate":"To‘g‘ri davlat raqamini kiriting (kamida 4 belgi).","bad_people":"Faqat raqam yozing.",
+"press_yes_no":"«Ha» yoki «Yo‘q» tugmasini bosing.",
+"race_type_prompt":"Tanlang:\n🏁 Jeep Sprint — 25.10 (faqat tayyorlangan avtomobillar uchun) — {sprint}\n🧗 Jeep Trial — 26.10 (istalgan 4x4 uchun) — {trial}",
+"race_type_again":"Tanlang: «🏁 Jeep Sprint» yoki «🧗 Jeep Trial».",
+"slots_left":"joy: {n}","slots_none":"joy yo‘q",
+"race_sold_out":"❌ {race_type} uchun joy qolmadi. Boshqa musobaqani tanlang yoki musobaqasiz qatnashing.",
+"race_lost":"⚠️ {race_type} uchun joy qolmadi — musobaqasiz ro‘yxatdan o‘tdingiz.",
+"cancelled":"Bekor qilindi.",
+"duplicate":"❗️ Bunday telefon yoki davlat raqami bilan ro‘yxat allaqachon mavjud.\nAgar ma’lumotni o‘zgartirmoqchi bo‘lsangiz — {nick} bilan bog‘laning.",
+"already_registered":"✅ Siz allaqachon ro‘yxatdan o‘tgansiz. Ma’lumotni o‘zgartirish uchun — {nick} bilan bog‘laning.",
+"plate_taken":"❗️ Bu davlat raqami allaqachon ro‘yxatdan o‘tgan. Boshqa raqam kiriting yoki {nick} ga yozing.",
+"phone_taken":"❗️ Bu telefon allaqachon ro‘yxatdan o‘tgan. Boshqa raqam kiriting yoki {nick} ga yozing.",
+"pay_reminder":"⏰ Eslatma: ishtirok to‘lovi ({fee} so‘m) hali to‘lanmagan.\n\n{cards}\n\nTo‘lovdan so‘ng chekni /receipt orqali yuboring. Savollar — {nick}.",
+"ticket":"🎫 <b>Kirish chiptasi</b>\n🚙 {plate}  •  💰 {status}\n\nUshbu QR kodni darvozada ko‘rsating — doim oxirgi yuborilganini. QR o‘qilmasa, kodni ayting:\n<code>{code}</code>\n\nChiptani qayta olish — /ticket",
+"ticket_paid":"to‘langan",
+"ticket_unpaid":"to‘lanmagan",
+"ticket_off":"🎫 Kirish chiptalari hozircha berilmaydi.",
+"registered":"✅ <b>Ro‘yxatdan o‘tdingiz!</b>\n\n👤 {name}\n🚙 {car}  •  {plate}\n📞 {phone}\n🏁 Musobaqa: {race}\n💰 To‘lov: {payment}\n👥 Odamlar: {people}",
+"race_none":"Yo‘q","pay_paid":"to‘langan","pay_later":"keyin to‘layman",
+"lodging_free":"✅ {title} — {left} ta bo‘sh — {price} so‘m",
+"lodging_sold":"❌ {title} — hammasi band — {price} so‘m",
+"lodging_footer":"Bron qilish — pastdagi tugma orqali. Savollar — {nick}",
+"lodging_gone":"❌ Joy qolmadi.",
+"lodging_taken":"Sizda allaqachon bron bor: {booked}. O‘zgartirish — {nick} orqali.",
+"lodging_booked":"✅ Bron qilindi: {title} — {price} so‘m. To‘lov va tafsilotlar — {nick}.",
+"register_first":"Avval ro‘yxatdan o‘ting.",
+"item_cottage2":"2 o‘rinli kottej","item_cottage3":"3 o‘rinli kottej","item_yurt":"Yurta (3+ kishi)",
+"participate":"""
+🏁 <b>Musobaqalarda ishtirok etasizmi?</b>
+
+• 25 oktabr — <b>Jeep Sprint</b> — faqat tayyorlangan avtomobillar uchun
+• 26 oktabr — <b>Jeep Trial</b> — istalgan 4x4 avtomobillar uchun, hamma qatnasha oladi
+
+«Ha» yoki «Yo‘q» ni tanlang.
+""",
+"payment":"""
+💳 Kirish to‘lovi — mashina boshiga {fee} so‘m
+(tashkiliy xarajatlar uchun)
+
+To‘lov uchun:
+{cards}
+""",
+# ---------- Тексты мероприятия; /eventset может переопределить ----------
+"welcome":"""
+🌍 <b>{title}</b>
+📍 <b>Aydarkul ko‘li</b>
+📅 <b>25–26 oktabr 2025</b>
+
+Xush kelibsiz, bu yilgi eng katta <b>off-road festivaliga!</b> 🚙🔥
+
+🌄 <b>Bu barcha off-road ixlosmandlari uchun haqiqiy bayram!</b>
+Deyarli butun mamlakatdan klub va ishtirokchilar yig‘iladi —
+birgalikda tabiat bag‘rida ikki kunlik sarguzasht kutmoqda!
+
+🎯 <b>Festival dasturi:</b>
+🏁 Jip-trial — ochiq musobaqa, har kim qatnasha oladi
+🚘 Jip-sprint — faqat tayyorlangan avtomobillar uchun
+🚗 Rasmiy taqdimot: Toyota Land Cruiser 300 Hybrid
+🚙 Festivalda: turli kompaniyalarning yangi avtomobillari
+🎵 Musiqa, 🍢 taomlar, ☕ ichimliklar, 🏕 dam olish zonasi
+🎁 Sovg‘alar va test-drayvlar kutmoqda!
+
+Bu yerda ishqibozlar uchrashadi, tajriba almashadi,
+yangi do‘stlar orttiradi va Aydarkul bo‘yida
+ajoyib dam olish kunlarini o‘tkazadi! 💪🌅
+
+💳 <b>Kirish to‘lovi:</b>
+mashina boshiga {fee} so‘m
+(tashkiliy xarajatlar uchun)
+
+Ro‘yxatdan o‘tish uchun — <b>«{btn_start_register}»</b>
+Batafsil ma’lumot — <b>«{btn_start_info}»</b>
+""",
+"info":"""
+🔥 <b>{title}</b>
+📅 25–26 oktabr 2025
+📍 Aydarkul ko‘li, O‘zbekiston
+
+🏁 Jeep Sprint — 25 oktabr (tayyorlangan avtomobillar uchun)
+🧗 Jeep Trial — 26 oktabr (istalgan 4x4 uchun)
+🎵 Musiqa, taomlar, ichimliklar, sovg‘alar, dam olish, test-drayvlar!
+
+Tashkilotchilar: CarPro_UZ
+Aloqa: {nick}
+""",
+"location":"""
+📍 <b>Festival joyi</b>
+O‘zbekiston, Navoiy viloyati, Aydarkul ko‘li atrofida.
+
+👇 <a href="{route}">Yandex.Navigatorda yo‘nalishni ochish</a>
+""",
 }
@@ -1,107 +1,88 @@
 # -*- coding: utf-8 -*-
 import asyncio
+import gc
+import logging
 import os
 import re
-import aiosqlite
+import secrets
 from datetime import datetime
-from io import BytesIO
-from openpyxl import Workbook
+from html import escape
+from typing import Optional
 
 from aiogram import Bot, Dispatcher, F, Router, types
 from aiogram.enums.parse_mode import ParseMode
-from aiogram.filters import CommandStart, Command
+from aiogram.exceptions import TelegramAPIError
+from aiogram.filters import CommandStart, Command, CommandObject
+from aiogram.filters.callback_data import CallbackData
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.fsm.storage.memory import MemoryStorage
-from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
+from aiogram.types import (
+    BufferedInputFile, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto,
+)
+
+from broadcast import Broadcaster
+from db import Database, get_db, close_all
+from duplicates import DuplicateIndex
+from events import TEXT_KEYS, EventContext, EventMiddleware, EventRegistry, EventViewMiddleware, valid_slug
+from export import build_export, get_cursor, parse_since, set_cursor, SpooledInputFile
+from fsm_storage import SQLiteStorage
+from backup import backup
+from config import TIMEZONE
+from i18n import DEFAULT_LANG, LANG_BUTTONS, LANGS, LOCALES, LangStore, Locale, LocaleMiddleware, buttons, money
+from inventory import RACE_KINDS, Inventory
+from keyboards import CachedSession
+import metrics
+from metrics import ApiMetrics, HandlerMetrics
+from parsing import PAYMENT, RACE, RACE_TYPE, parse_people, parse_phone, parse_plate
+from middlewares import DedupMiddleware, ThrottleMiddleware
+from receipts import ReceiptPipeline, decide, get_receipt, pending_near, pending_position, pick_photo
+from reminders import send_reminders
+from repository import (
+    DB_PATH, add_registration, confirm_payment, get_reg_by_user, get_registration, migrate, reject_payment,
+    set_lodging, set_race, set_receipt,
+)
+from search import find_registrations
+from stats import get_stats, recompute_stats
+from tickets import PREFIX as TICKET_PREFIX, TICKET_SECRET, Check, TicketBook, extract, render_qr, ticket_status
+
+log = logging.getLogger("main")
 
 # ================== Config ==================
 TOKEN = os.getenv("TELEGRAM_TOKEN")
-DB_PATH = os.getenv("DB_PATH", "registrations.db")
+db = get_db(DB_PATH)
+# Брошенные анкеты (сек.) и как часто их чистить
+FSM_TTL = int(os.getenv("FSM_TTL", str(3 * 24 * 3600)))
+FSM_EXPIRE_EVERY = 3600
+# Напоминания об оплате «оплачу позже» — раз в день в этот час (TIMEZONE)
+REMIND_HOUR = int(os.getenv("REMIND_HOUR", "11"))
+
+# Режим приёма апдейтов: polling (по умолчанию) или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")  # публичный https://host, без пути
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/tg/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "8"))
+WEBHOOK_QUEUE = int(os.getenv("WEBHOOK_QUEUE", "1000"))
+# >1 — отдельные процессы-воркеры с общим SQLite (см. workers.py)
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "1"))
+# Дедуп апдейтов нужен, только где Telegram или фронт могут доставить апдейт
+# повторно: ретраи webhook и перезапуск воркера. Один процесс с polling
+# получает каждый апдейт один раз (offset), и запись на каждый апдейт ему не нужна
+DEDUP = BOT_WORKERS > 1 or BOT_MODE == "webhook"
+# Быстрый старт: getMe параллельно с открытием базы, приём апдейтов — до загрузки
+# мероприятия, досылка очередей и прогрев кэшей — уже после (см. warm_up)
+FAST_START = os.getenv("FAST_START", "1") != "0"
 
 # Админы по username
 ADMINS = ["UkAkbar", "fdimon"]
 
 # ================== Helpers ==================
-def is_admin(message: types.Message) -> bool:
-    username = (message.from_user.username or "").lower()
+def is_admin(event: types.Message | types.CallbackQuery) -> bool:
+    username = (event.from_user.username or "").lower()
     return username in [a.lower() for a in ADMINS]
 
-def normalize_phone(s: str) -> str:
-    s = (s or "").strip()
-    # оставить только + и цифры
-    s = re.sub(r"[^\d+]", "", s)
-    return s
-
-# ================== Texts ==================
-WELCOME_TEXT = """
-🌍 <b>Off-Road Festival Aydarkul 2025</b>
-📍 <b>Озеро Айдаркуль / Aydarkul ko‘li</b>
-📅 <b>25–26 октября 2025 / 25–26 oktabr 2025</b>
-
-Добро пожаловать на участие в <b>оффроуд-фестивале года!</b>
-Xush kelibsiz, bu yilgi eng katta <b>off-road festivaliga!</b> 🚙🔥
-
-🌄 <b>Вас ждёт настоящий праздник для всех любителей внедорожников!</b>
-Bu barcha off-road ixlosmandlari uchun haqiqiy bayram!
-Deyarli butun mamlakatdan klub va ishtirokchilar yig‘iladi —
-birgalikda tabiat bag‘rida ikki kunlik sarguzasht kutmoqda!
-
-🎯 <b>Программа фестиваля / Festival dasturi:</b>
-🏁 Джип-триал / Jip-trial — ochiq musobaqa, har kim qatnasha oladi
-🚘 Джип-спринт / Jip-sprint — faqat tayyorlangan avtomobillar uchun
-🚗 Официальная презентация: Toyota Land Cruiser 300 Hybrid
-🚙 Festivalda: turli kompaniyalarning yangi avtomobillari
-🎵 Musiqa, 🍢 taomlar, ☕ ichimliklar, 🏕 dam olish zonasi
-🎁 Sovg‘alar va test-drayvlar kutmoqda!
-
-Это место, где встречаются энтузиасты,
-делятся опытом, заводят новых друзей
-и просто отлично проводят выходные у Айдаркуля! 💪🌅
-
-💳 <b>Входной взнос / Kirish to‘lovi:</b>
-200 000 so‘m mashina boshiga / <b>за автомобиль</b>
-(tashkiliy xarajatlar uchun / <b>на организационные расходы</b>)
-
-Ro‘yxatdan o‘tish uchun — <b>«🚀 Зарегистрироваться / Ro‘yxatdan o‘tish»</b>
-Batafsil ma’lumot — <b>«ℹ️ Инфо / Ma’lumot»</b>
-"""
-
-INFO_TEXT = """
-🔥 <b>Off-Road Festival Aydarkul 2025</b>
-📅 25–26 октября 2025
-📍 Озеро Айдаркуль, Узбекистан
-
-🏁 Jeep Sprint — 25 октября (для подготовленных автомобилей)
-🧗 Jeep Trial — 26 октября (для всех желающих 4x4)
-🎵 Музыка, еда, напитки, подарки, отдых, тест-драйвы!
-
-Оргкоманда: CarPro_UZ
-Связь: @UkAkbar
-"""
-
-LOCATION_TEXT = """
-📍 <b>Локация фестиваля / Festival joyi</b>
-O‘zbekiston, Navoiy viloyati, Aydarkul ko‘li atrofida.
-
-👇 <a href="https://yandex.ru/navi?rtext=41.331143,69.272065~40.800573,66.970008&rtt=auto">Открыть маршрут в Яндекс.Навигаторе</a>
-"""
-
-PARTICIPATE_TEXT = """
-🏁 <b>Участвуете ли вы в соревнованиях? / Musobaqalarda ishtirok etasizmi?</b>
-
-RU:
-• 25 октября — <b>Jeep Sprint</b> — только для подготовленных автомобилей
-• 26 октября — <b>Jeep Trial</b> — для всех желающих, на любых полноприводных (4x4) автомобилях
-
-UZ:
-• 25 oktabr — <b>Jeep Sprint</b> — faqat tayyorlangan avtomobillar uchun
-• 26 oktabr — <b>Jeep Trial</b> — istalgan 4x4 avtomobillar uchun, hamma qatnasha oladi
-
-RU: Выберите «Да» или «Нет».
-UZ: «Ha» yoki «Yo‘q» ni tanlang.
-"""
-
 # ================== FSM ==================
 class RegForm(StatesGroup):
     name = State()
@@ -113,322 +94,928 @@ class RegForm(StatesGroup):
     payment = State()
     people = State()
 
-# ================== Keyboards ==================
-def start_kb() -> ReplyKeyboardMarkup:
-    return ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text="🚀 Зарегистрироваться / Ro‘yxatdan o‘tish")],
-            [KeyboardButton(text="ℹ️ Инфо / Ma’lumot")],
-            [KeyboardButton(text="📍 Локация / Manzil")],
-        ],
-        resize_keyboard=True
-    )
-
-def yes_no_kb() -> ReplyKeyboardMarkup:
-    return ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text="✅ Да / Ha")],
-            [KeyboardButton(text="❌ Нет / Yo‘q")],
-        ],
-        resize_keyboard=True, one_time_keyboard=True
-    )
-
-def race_type_kb() -> ReplyKeyboardMarkup:
-    return ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text="🏁 Jeep Sprint")],
-            [KeyboardButton(text="🧗 Jeep Trial")],
-        ],
-        resize_keyboard=True, one_time_keyboard=True
-    )
-
-def payment_kb() -> ReplyKeyboardMarkup:
-    return ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text="💰 Я оплатил(а) / To‘lov qildim")],
-            [KeyboardButton(text="⏳ Оплачу позже / Keyin to‘layman")],
-            [KeyboardButton(text="❌ Отмена / Bekor qilish")],
-        ],
-        resize_keyboard=True, one_time_keyboard=True
-    )
+class ReceiptForm(StatesGroup):
+    photo = State()
+
+class CheckinForm(StatesGroup):
+    scan = State()
+
+class ReceiptCb(CallbackData, prefix="rcpt"):
+    action: str  # ok / no / prev / next
+    rid: int
+
+class LodgingCb(CallbackData, prefix="lodg"):
+    kind: str
+
+# ================== Payloads ==================
+def render_event(event) -> dict:
+    # Тексты мероприятия на каждом языке — готовые аргументы m.answer(...).
+    # Собираются один раз на мероприятие (и после /eventset), не на апдейт
+    fee = money(event.fee)
+    payloads = {}
+    for lang, t in LOCALES.items():
+        def text(name):
+            custom = event.texts.get(f"{name}_{lang}") or event.texts.get(name)
+            return (custom or t[name]).replace("{fee}", fee).replace("{title}", event.title)
+
+        payloads[lang] = dict(
+            welcome=dict(text=text("welcome"), parse_mode=ParseMode.HTML, reply_markup=t.kb["start"]),
+            info=dict(text=text("info"), parse_mode=ParseMode.HTML),
+            location=dict(text=text("location"), parse_mode=ParseMode.HTML, disable_web_page_preview=False),
+            payment=dict(text=text("payment"), reply_markup=t.kb["payment"]),
+            participate=dict(text=t["participate"], parse_mode=ParseMode.HTML, reply_markup=t.kb["yes_no"]),
+        )
+    return payloads
 
 # ================== Database ==================
-CREATE_SQL = """
-CREATE TABLE IF NOT EXISTS registrations (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    tg_id INTEGER UNIQUE,
-    name TEXT,
-    car TEXT,
-    plate TEXT UNIQUE,
-    phone TEXT UNIQUE,
-    race TEXT,
-    race_type TEXT,
-    payment TEXT,
-    people INTEGER,
-    created_at TEXT
-);
-"""
-
 async def init_db():
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(CREATE_SQL)
-        await db.commit()
-
-async def insert_registration(tg_id, name, car, plate, phone, race, race_type, payment, people):
-    async with aiosqlite.connect(DB_PATH) as db:
-        try:
-            await db.execute("""
-                INSERT INTO registrations (tg_id, name, car, plate, phone, race, race_type, payment, people, created_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (tg_id, name, car, plate, phone, race, race_type, payment, people, datetime.utcnow().isoformat()))
-            await db.commit()
-            return True
-        except aiosqlite.IntegrityError:
-            return False
+    # Схема и миграции — в repository.py; на уже обновлённой базе это один
+    # PRAGMA user_version без DDL
+    await db.open()
+    await migrate(db)
 
 # ================== Routers ==================
 router = Router()
 admin_router = Router()
+# /event <slug> админа действует только на его команды и кнопки в admin_router
+admin_router.message.middleware(EventViewMiddleware())
+admin_router.callback_query.middleware(EventViewMiddleware())
 
 # ================== Handlers ==================
+@router.message(CommandStart(deep_link=True, magic=F.args.startswith(TICKET_PREFIX)))
+async def start_ticket(m: types.Message, command: CommandObject, state: FSMContext, ev: EventContext,
+                       events: EventRegistry, tickets: Optional[TicketBook], t: Locale, langs: LangStore):
+    # Ссылка из QR билета: камера админа на воротах открывает бота с кодом.
+    # Участник, открывший свой же QR, получает обычный /start
+    if not is_admin(m) or tickets is None:
+        return await cmd_start(m, ev, t, langs)
+    await scan_ticket(m, command.args, state, ev, events)
+
 @router.message(CommandStart())
-async def cmd_start(m: types.Message):
-    await m.answer(WELCOME_TEXT, parse_mode=ParseMode.HTML, reply_markup=start_kb())
+async def cmd_start(m: types.Message, ev: EventContext, t: Locale, langs: LangStore):
+    if await langs.chosen(m.from_user.id) is None:
+        return await m.answer(t["choose_lang"], reply_markup=t.kb["lang"])
+    await m.answer(**ev.payloads[t.lang]["welcome"])
+
+@router.message(Command("lang"))
+async def cmd_lang(m: types.Message, t: Locale):
+    await m.answer(t["choose_lang"], reply_markup=t.kb["lang"])
+
+@router.message(F.text.in_(LANG_BUTTONS))
+async def set_lang(m: types.Message, ev: EventContext, langs: LangStore):
+    lang = LANG_BUTTONS[m.text]
+    await langs.set(m.from_user.id, lang)
+    await m.answer(**ev.payloads[lang]["welcome"])
 
-@router.message(F.text == "ℹ️ Инфо / Ma’lumot")
-async def info(m: types.Message):
-    await m.answer(INFO_TEXT, parse_mode=ParseMode.HTML)
+@router.message(F.text.in_(buttons("btn_start_info")))
+async def info(m: types.Message, ev: EventContext, t: Locale):
+    await m.answer(**ev.payloads[t.lang]["info"])
 
-@router.message(F.text == "📍 Локация / Manzil")
-async def location(m: types.Message):
-    await m.answer(LOCATION_TEXT, parse_mode=ParseMode.HTML, disable_web_page_preview=False)
+@router.message(F.text.in_(buttons("btn_location")))
+async def location(m: types.Message, ev: EventContext, t: Locale):
+    await m.answer(**ev.payloads[t.lang]["location"])
 
 # ---------- Registration flow ----------
-@router.message(F.text == "🚀 Зарегистрироваться / Ro‘yxatdan o‘tish")
-async def reg_start(m: types.Message, state: FSMContext):
+@router.message(F.text.in_(buttons("btn_start_register")))
+async def reg_start(m: types.Message, state: FSMContext, dupes: DuplicateIndex, t: Locale):
+    if await dupes.has_user(m.from_user.id):
+        return await m.answer(t["already_registered"], reply_markup=t.kb["start"])
     await state.set_state(RegForm.name)
-    await m.answer("😎 RU: Укажите ваше имя и фамилию.\nUZ: Ism va familiyangizni yozing.")
+    await m.answer(t["ask_name"])
 
 @router.message(RegForm.name)
-async def reg_name(m: types.Message, state: FSMContext):
+async def reg_name(m: types.Message, state: FSMContext, t: Locale):
     name = (m.text or "").strip()
     if len(name) < 2:
-        return await m.answer("RU: Введите корректное имя.\nUZ: To‘g‘ri ism kiriting.")
+        return await m.answer(t["bad_name"])
     await state.update_data(name=name)
     await state.set_state(RegForm.car)
-    await m.answer("🚙 RU: Напишите марку и модель вашего автомобиля.\nUZ: Avtomobil brendi va modelini yozing.")
+    await m.answer(t["ask_car"])
 
 @router.message(RegForm.car)
-async def reg_car(m: types.Message, state: FSMContext):
+async def reg_car(m: types.Message, state: FSMContext, t: Locale):
     car = (m.text or "").strip()
     if len(car) < 2:
-        return await m.answer("RU: Укажите марку и модель корректно.\nUZ: Brend va modelni to‘g‘ri yozing.")
+        return await m.answer(t["bad_car"])
     await state.update_data(car=car)
     await state.set_state(RegForm.plate)
-    await m.answer("🔢 RU: Укажите госномер автомобиля (например 01A777AA, KZ 321ABC05).\nUZ: Avtomobil davlat raqamini yozing (misol: 01A777AA, KZ 321ABC05).")
+    await m.answer(t["ask_plate"])
 
 @router.message(RegForm.plate)
-async def reg_plate(m: types.Message, state: FSMContext):
-    plate = (m.text or "").strip().upper()
-    if len(plate) < 4:
-        return await m.answer("RU: Введите корректный госномер (минимум 4 символа).\nUZ: To‘g‘ri davlat raqamini kiriting (kamida 4 belgi).")
-    await state.update_data(plate=plate)
+async def reg_plate(m: types.Message, state: FSMContext, ev: EventContext, t: Locale):
+    plate = parse_plate(m.text)
+    if plate is None:
+        return await m.answer(t["bad_plate"])
+    if await ev.dupes.has_plate(plate.text):
+        return await m.answer(t["plate_taken"])
+    await state.update_data(plate=plate.text)
     await state.set_state(RegForm.race)
-    await m.answer(PARTICIPATE_TEXT, parse_mode=ParseMode.HTML, reply_markup=yes_no_kb())
+    await m.answer(**ev.payloads[t.lang]["participate"])
+
+def slots_left(t: Locale, inventory: Inventory, kind: str) -> str:
+    left = inventory.available(kind)
+    return t("slots_left", n=left) if left > 0 else t["slots_none"]
 
 @router.message(RegForm.race)
-async def reg_race(m: types.Message, state: FSMContext):
-    t = (m.text or "").lower()
-    if "да" in t or "ha" in t:
+async def reg_race(m: types.Message, state: FSMContext, inventory: Inventory, t: Locale):
+    race = RACE.match(m.text).value
+    if race == "yes":
         await state.update_data(race="yes")
         await state.set_state(RegForm.race_type)
         return await m.answer(
-            "Tanlang / Выберите:\n"
-            "🏁 Jeep Sprint — 25.10 (faqat tayyorlangan avtomobillar uchun / подготовленные авто)\n"
-            "🧗 Jeep Trial — 26.10 (istalgan 4x4 uchun / для всех желающих 4x4)",
-            reply_markup=race_type_kb()
+            t("race_type_prompt", sprint=slots_left(t, inventory, "sprint"), trial=slots_left(t, inventory, "trial")),
+            reply_markup=t.kb["race_type"]
         )
-    elif "нет" in t or "yo‘q" in t or "yoq" in t or "yok" in t:
+    elif race == "no":
+        if (await state.get_data()).get("race") == "yes":
+            # Вернулся к вопросу после «мест нет» или передумал — бронь не держим
+            await inventory.release(m.from_user.id)
         await state.update_data(race="no", race_type="-")
         await state.set_state(RegForm.phone)
-        return await m.answer("📞 RU: Укажите номер телефона (+код страны...)\nUZ: Telefon raqamingizni yozing (+mamlakat kodi bilan...).")
+        return await m.answer(t["ask_phone"])
     else:
-        return await m.answer("RU: Нажмите кнопку «Да» или «Нет».\nUZ: «Ha» yoki «Yo‘q» tugmasini bosing.", reply_markup=yes_no_kb())
+        return await m.answer(t["press_yes_no"], reply_markup=t.kb["yes_no"])
 
 @router.message(RegForm.race_type)
-async def reg_race_type(m: types.Message, state: FSMContext):
-    t = (m.text or "").lower()
-    if "sprint" in t:
-        await state.update_data(race_type="Jeep Sprint")
-    elif "trial" in t:
-        await state.update_data(race_type="Jeep Trial")
-    else:
-        return await m.answer("Tanlang / Выберите: «🏁 Jeep Sprint» yoki «🧗 Jeep Trial».", reply_markup=race_type_kb())
+async def reg_race_type(m: types.Message, state: FSMContext, inventory: Inventory, t: Locale):
+    race_type = RACE_TYPE.match(m.text).value
+    if race_type is None:
+        return await m.answer(t["race_type_again"], reply_markup=t.kb["race_type"])
+    # Место держится, пока пользователь дозаполняет анкету (HOLD_TTL)
+    if await inventory.hold(RACE_KINDS[race_type], m.from_user.id) is None:
+        await state.set_state(RegForm.race)
+        return await m.answer(t("race_sold_out", race_type=race_type), reply_markup=t.kb["yes_no"])
+    await state.update_data(race_type=race_type)
     await state.set_state(RegForm.phone)
-    await m.answer("📞 RU: Укажите номер телефона (+код страны...)\nUZ: Telefon raqamingizni yozing (+mamlakat kodi bilan...).")
+    await m.answer(t["ask_phone"])
 
 @router.message(RegForm.phone)
-async def reg_phone(m: types.Message, state: FSMContext):
-    phone = normalize_phone(m.text)
-    if not phone.startswith("+") or not (7 <= len(re.sub(r"\D", "", phone)) <= 15):
-        return await m.answer("RU: Кажется, номер некорректный. Отправьте ещё раз (+код страны...)\nUZ: Raqam noto‘g‘ri. +mamlakat kodi bilan yuboring.")
-    await state.update_data(phone=phone)
+async def reg_phone(m: types.Message, state: FSMContext, ev: EventContext, t: Locale):
+    phone = parse_phone(m.text)
+    if phone is None:
+        return await m.answer(t["bad_phone"])
+    if await ev.dupes.has_phone(phone.e164):
+        return await m.answer(t["phone_taken"])
+    await state.update_data(phone=phone.e164)
     await state.set_state(RegForm.payment)
-    await m.answer(
-        "💳 Kirish to‘lovi / Входной взнос — 200 000 so‘m mashina boshiga / за автомобиль\n"
-        "(tashkiliy xarajatlar uchun / на организационные расходы)\n\n"
-        "To‘lov uchun / Для оплаты:\n"
-        "UZCARD: 5614 6806 0888 2326 — Akbarjon Kulov\n"
-        "VISA: 4023 0602 2688 2305 — Akbarjon Kulov",
-        reply_markup=payment_kb()
-    )
+    await m.answer(**ev.payloads[t.lang]["payment"])
 
 @router.message(RegForm.payment)
-async def reg_payment(m: types.Message, state: FSMContext):
-    t = (m.text or "").lower()
-    if "оплачу" in t or "keyin" in t:
-        await state.update_data(payment="later")
-    elif "оплат" in t or "to‘lov" in t or "tolov" in t:
-        await state.update_data(payment="paid")
-    elif "отмена" in t or "bekor" in t:
+async def reg_payment(m: types.Message, state: FSMContext, inventory: Inventory, t: Locale):
+    payment = PAYMENT.match(m.text).value
+    if payment == "cancel":
+        await inventory.release(m.from_user.id)
         await state.clear()
-        return await m.answer("Bekor qilindi / Отменено.", reply_markup=start_kb())
-    else:
-        await state.update_data(payment="-")
+        return await m.answer(t["cancelled"], reply_markup=t.kb["start"])
+    await state.update_data(payment=payment or "-")
     await state.set_state(RegForm.people)
-    await m.answer("👥 RU: Сколько человек будет в автомобиле (включая водителя)? Только число.\nUZ: Mashinada (haydovchini qo‘shib) nechta odam? Faqat raqam yozing.")
+    await m.answer(t["ask_people"])
 
 @router.message(RegForm.people)
-async def reg_people(m: types.Message, state: FSMContext):
+async def reg_people(m: types.Message, state: FSMContext, bot: Bot, db: Database, inventory: Inventory,
+                     dupes: DuplicateIndex, tickets: Optional[TicketBook], event_update: types.Update, t: Locale):
     data = await state.get_data()
-    digits = re.sub(r"\D", "", (m.text or ""))
-    if not digits:
-        return await m.answer("RU: Введите только число.\nUZ: Faqat raqam yozing.")
-    people = int(digits)
+    people = parse_people(m.text)
+    if people is None:
+        return await m.answer(t["bad_people"])
 
-    ok = await insert_registration(
+    race, race_type = data.get("race", "no"), data.get("race_type", "-")
+    reg_id = await add_registration(
+        db,
         tg_id=m.from_user.id,
         name=data["name"],
         car=data["car"],
         plate=data["plate"],
         phone=data["phone"],
-        race=data.get("race", "no"),
-        race_type=data.get("race_type", "-"),
+        race=race,
+        race_type=race_type,
         payment=data.get("payment", "-"),
-        people=people
+        people=people,
+        lang=t.lang,
+        update_id=event_update.update_id
     )
-    if not ok:
-        return await m.answer("❗️ Регистрация с таким номером телефона или госномером уже существует.\nAgar ma’lumotni o‘zgartirmoqchi bo‘lsangiz — @UkAkbar bilan bog‘laning.")
-
-    race_line = data["race_type"] if data.get("race") == "yes" else "Нет"
+    if reg_id is None:
+        # Проверки на шагах не видят анкет, которые дописываются параллельно
+        await inventory.release(m.from_user.id)
+        return await m.answer(t["duplicate"])
+    dupes.add(m.from_user.id, data["plate"], data["phone"])
+    if tickets is not None:
+        tickets.add(reg_id, data["name"], data["car"], data["plate"], people)
+
+    if race == "yes":
+        # Бронь из шага race_type становится местом. Если она истекла и места
+        # за это время разобрали — регистрация остаётся, но без соревнований.
+        kind = RACE_KINDS[race_type]
+        slot = await inventory.take(kind, m.from_user.id)
+        if slot is None or slot.kind != kind:
+            await set_race(db, reg_id, "no", "-")
+            await m.answer(t("race_lost", race_type=race_type))
+            race, race_type = "no", "-"
+    payment = data.get("payment", "-")
     await m.answer(
-        "✅ <b>Регистрация успешна!</b>\n\n"
-        f"👤 {data['name']}\n"
-        f"🚙 {data['car']}  •  {data['plate']}\n"
-        f"📞 {data['phone']}\n"
-        f"🏁 Участие: {race_line}\n"
-        f"💰 Оплата: {data.get('payment','-')}\n"
-        f"👥 Людей: {people}",
-        parse_mode=ParseMode.HTML
-    )
-    await m.answer(
-        "🏡 <b>Проживание / Turar joy (ixtiyoriy):</b>\n"
-        "❌ Коттеджи — все уже забронированы — 1 500 000 сум\n"
-        "❌ Коттеджи — все уже забронированы — 2 000 000 сум\n"
-        "Юрты (3+ человек) — осталось ограниченное количество мест — 800 000 сум\n"
-        "Bron qilish / Бронь: shaxsiy xabar — @UkAkbar",
+        t("registered", name=escape(data["name"]), car=escape(data["car"]), plate=data["plate"],
+          phone=data["phone"], race=race_type if race == "yes" else t["race_none"],
+          payment=t.texts.get(f"pay_{payment}", payment), people=people),
         parse_mode=ParseMode.HTML,
-        reply_markup=start_kb()
+        reply_markup=t.kb["start"]
+    )
+    if tickets is not None:
+        await send_ticket(bot, m.chat.id, tickets, t, reg_id, data["plate"])
+    text, kb = lodging_offer(t, inventory)
+    await m.answer(text, parse_mode=ParseMode.HTML, reply_markup=kb)
+    await state.clear()
+    if payment == "paid":
+        await state.set_state(ReceiptForm.photo)
+        await state.update_data(reg_id=reg_id)
+        await m.answer(t["receipt_prompt"])
+
+# ---------- Lodging ----------
+def lodging_offer(t: Locale, inventory: Inventory):
+    lines = [t["lodging_header"]]
+    rows = []
+    for item in inventory.items.values():
+        if item.group != "lodging":
+            continue
+        left = inventory.available(item.kind)
+        title, price = t.item(item.kind, item.title), money(item.price)
+        if left > 0:
+            lines.append(t("lodging_free", title=title, left=left, price=price))
+            rows.append([InlineKeyboardButton(text=f"{title} — {price}",
+                                              callback_data=LodgingCb(kind=item.kind).pack())])
+        else:
+            lines.append(t("lodging_sold", title=title, price=price))
+    lines.append(t["lodging_footer"])
+    return "\n".join(lines), InlineKeyboardMarkup(inline_keyboard=rows) if rows else None
+
+@router.callback_query(LodgingCb.filter())
+async def lodging_book(c: types.CallbackQuery, callback_data: LodgingCb, db: Database, inventory: Inventory,
+                       t: Locale):
+    item = inventory.items.get(callback_data.kind)
+    if item is None or item.group != "lodging":
+        return await c.answer()
+    reg = await get_reg_by_user(db, c.from_user.id)
+    if reg is None:
+        return await c.answer(t["register_first"], show_alert=True)
+    slot = await inventory.take(item.kind, c.from_user.id)
+    if slot is None:
+        await c.answer(t["lodging_gone"], show_alert=True)
+        text, kb = lodging_offer(t, inventory)
+        try:
+            await c.message.edit_text(text, parse_mode=ParseMode.HTML, reply_markup=kb)
+        except TelegramAPIError:
+            pass
+        return
+    if slot.kind != item.kind:
+        booked = inventory.items[slot.kind]
+        return await c.answer(t("lodging_taken", booked=t.item(booked.kind, booked.title)), show_alert=True)
+    await set_lodging(db, reg.id, item.kind)
+    await c.message.edit_text(
+        t("lodging_booked", title=t.item(item.kind, item.title), price=money(item.price)),
+        reply_markup=None
+    )
+    await c.answer()
+
+# ---------- Receipts ----------
+@router.message(Command("receipt"))
+async def cmd_receipt(m: types.Message, state: FSMContext, db: Database, t: Locale):
+    reg = await get_reg_by_user(db, m.from_user.id)
+    if reg is None:
+        return await m.answer(t["register_first"], reply_markup=t.kb["start"])
+    await state.set_state(ReceiptForm.photo)
+    await state.update_data(reg_id=reg.id)
+    await m.answer(t["receipt_prompt"])
+
+@router.message(ReceiptForm.photo, F.photo)
+async def receipt_photo(m: types.Message, state: FSMContext, db: Database, receipts: ReceiptPipeline, t: Locale):
+    # Скачивание и хэш — в фоне (receipts.py), здесь только две записи в одном батче БД
+    reg_id = (await state.get_data())["reg_id"]
+    full, small = pick_photo(m.photo)
+    await asyncio.gather(
+        receipts.submit(reg_id, m.from_user.id, full.file_id, small.file_id, full.file_unique_id),
+        set_receipt(db, reg_id, full.file_id),
     )
     await state.clear()
+    await m.answer(t["receipt_received"], reply_markup=t.kb["start"])
+
+@router.message(ReceiptForm.photo)
+async def receipt_not_photo(m: types.Message, t: Locale):
+    await m.answer(t["receipt_prompt"])
+
+# ---------- Tickets ----------
+async def send_ticket(bot: Bot, chat_id: int, tickets: TicketBook, t: Locale, reg_id: int, plate: str,
+                      pay_status: str = None):
+    # В QR — ссылка на бота с кодом, чтобы на воротах хватало камеры телефона
+    code = tickets.issue(reg_id, plate, pay_status)
+    me = await bot.me()
+    png = await asyncio.get_running_loop().run_in_executor(
+        None, render_qr, f"https://t.me/{me.username}?start={code}"
+    )
+    await bot.send_photo(
+        chat_id, BufferedInputFile(png, filename="ticket.png"),
+        caption=t("ticket", plate=escape(plate or ""), status=t[f"ticket_{ticket_status(pay_status)}"], code=code),
+        parse_mode=ParseMode.HTML,
+    )
+
+@router.message(Command("ticket"))
+async def cmd_ticket(m: types.Message, bot: Bot, db: Database, tickets: Optional[TicketBook], t: Locale):
+    if tickets is None:
+        return await m.answer(t["ticket_off"])
+    reg = await get_reg_by_user(db, m.from_user.id)
+    if reg is None:
+        return await m.answer(t["register_first"], reply_markup=t.kb["start"])
+    await send_ticket(bot, m.chat.id, tickets, t, reg.id, reg.plate, reg.pay_status)
 
 # ================== Admin: export ==================
+EXPORT_USAGE = (
+    "Использование: /export или /exportxlsx [new | <id> | <YYYY-MM-DD>]\n"
+    "без аргумента — всё, new — изменения с вашей прошлой выгрузки,\n"
+    "<id> — регистрации после этого id, дата — созданные с этой даты (UTC)."
+)
+
+async def send_export(m: types.Message, command: CommandObject, ev: EventContext, fmt: str, caption: str = None):
+    db = ev.db
+    admin_id = m.from_user.id
+    try:
+        since = parse_since(command.args)
+    except ValueError:
+        return await m.answer(EXPORT_USAGE)
+    if since is not None and since.kind == "rev":
+        since = since._replace(value=await get_cursor(db, admin_id))
+    exp = await build_export(db, fmt, since)
+    try:
+        if since is not None and exp.rows == 0:
+            return await m.answer("Изменений нет.")
+        name = f"registrations_{ev.event.slug}_{datetime.utcnow().date()}"
+        if since is not None:
+            name += f"_since_{since.value}"
+            caption = f"{caption or 'Экспорт'}: изменено/добавлено {exp.rows}"
+        await m.answer_document(SpooledInputFile(exp.file, filename=f"{name}.{fmt}"), caption=caption)
+        # Курсор «new» сдвигается полной выгрузкой и выгрузкой изменений — только
+        # после отправки файла: если она не удалась, строки попадут в следующую
+        if since is None or since.kind == "rev":
+            await set_cursor(db, admin_id, exp.rev)
+    finally:
+        exp.file.close()
+
 @admin_router.message(Command("export"))
-async def cmd_export_csv(m: types.Message):
+async def cmd_export_csv(m: types.Message, command: CommandObject, ev: EventContext):
     if not is_admin(m):
         return await m.answer("❌ У вас нет доступа.")
-    import csv, io
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow([
-        "ID","Имя","Автомобиль","Госномер","Телефон","Кол-во",
-        "Участие(Да/Нет)","Дисциплина","Статус оплаты","Дата регистрации (UTC)"
-    ])
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute(
-            "SELECT id,name,car,plate,phone,people,race,race_type,payment,created_at "
-            "FROM registrations ORDER BY id"
-        ) as cur:
-            async for rid,name,car,plate,phone,people,race,race_type,payment,created_at in cur:
-                writer.writerow([
-                    rid, name, car, plate, phone, people,
-                    ("Да" if str(race).lower().startswith("y") else "Нет"),
-                    (race_type or "-"),
-                    (payment or "-"),
-                    created_at
-                ])
-    output.seek(0)
-    await m.answer_document(
-        types.BufferedInputFile(output.getvalue().encode("utf-8"),
-                                filename=f"registrations_{datetime.utcnow().date()}.csv")
-    )
+    await send_export(m, command, ev, "csv")
 
 @admin_router.message(Command("exportxlsx"))
-async def cmd_export_xlsx(m: types.Message):
+async def cmd_export_xlsx(m: types.Message, command: CommandObject, ev: EventContext):
     if not is_admin(m):
         return await m.answer("❌ У вас нет доступа.")
-    rows = []
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute(
-            "SELECT id,name,car,plate,phone,people,race,race_type,payment,created_at "
-            "FROM registrations ORDER BY id"
-        ) as cur:
-            async for r in cur:
-                rows.append(r)
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Registrations"
-    ws.append([
-        "ID","Имя","Автомобиль","Госномер","Телефон","Кол-во",
-        "Участие(Да/Нет)","Дисциплина","Статус оплаты","Дата регистрации (UTC)"
+    await send_export(m, command, ev, "xlsx", caption="Экспорт регистраций (Excel)")
+
+# ================== Admin: receipts ==================
+async def receipt_card(db: Database, r):
+    pos, total = await pending_position(db, r.id)
+    lines = [
+        f"🧾 Чек #{r.id} ({pos}/{total})",
+        f"👤 <b>{escape(r.name or '')}</b> — {escape(r.car or '')} • <code>{escape(r.plate or '')}</code>",
+        f"📞 {escape(r.phone or '')}",
+    ]
+    if r.dup_kind == "file":
+        lines.append(f"⚠️ Этот же файл уже присылали: чек #{r.dup_of}")
+    elif r.dup_kind == "similar":
+        lines.append(f"⚠️ Похож на чек #{r.dup_of} другой регистрации")
+    elif r.phash is None:
+        lines.append("⏳ Проверка на дубликаты ещё идёт")
+    kb = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="✅ Подтвердить", callback_data=ReceiptCb(action="ok", rid=r.id).pack()),
+         InlineKeyboardButton(text="❌ Отклонить", callback_data=ReceiptCb(action="no", rid=r.id).pack())],
+        [InlineKeyboardButton(text="◀️", callback_data=ReceiptCb(action="prev", rid=r.id).pack()),
+         InlineKeyboardButton(text="▶️", callback_data=ReceiptCb(action="next", rid=r.id).pack())],
     ])
-    for rid,name,car,plate,phone,people,race,race_type,payment,created_at in rows:
-        ws.append([
-            rid, name, car, plate, phone, people,
-            ("Да" if str(race).lower().startswith("y") else "Нет"),
-            (race_type or "-"),
-            (payment or "-"),
-            created_at
-        ])
-    for col in ws.columns:
-        width = max(len(str(c.value)) if c.value is not None else 0 for c in col)
-        ws.column_dimensions[col[0].column_letter].width = min(width + 2, 42)
-
-    buf = BytesIO(); wb.save(buf); buf.seek(0)
-    await m.answer_document(
-        types.BufferedInputFile(buf.getvalue(),
-                                filename=f"registrations_{datetime.utcnow().date()}.xlsx"),
-        caption="Экспорт регистраций (Excel)"
-    )
+    return "\n".join(lines), kb
+
+@admin_router.message(Command("receipts"))
+async def cmd_receipts(m: types.Message, db: Database):
+    if not is_admin(m):
+        return await m.answer("❌ У вас нет доступа.")
+    r = await pending_near(db, 0, "next")
+    if r is None:
+        return await m.answer("Очередь чеков пуста.")
+    caption, kb = await receipt_card(db, r)
+    await m.answer_photo(r.file_id, caption=caption, reply_markup=kb)
+
+@admin_router.callback_query(ReceiptCb.filter())
+async def receipt_review(c: types.CallbackQuery, callback_data: ReceiptCb, bot: Bot, db: Database,
+                         tickets: Optional[TicketBook], langs: LangStore):
+    if not is_admin(c):
+        return await c.answer("❌ У вас нет доступа.", show_alert=True)
+    rid = callback_data.rid
+    if callback_data.action in ("ok", "no"):
+        r = await get_receipt(db, rid)
+        if r is not None and r.status == "pending":
+            reg = None
+            if callback_data.action == "ok":
+                await confirm_payment(db, r.reg_id)
+                await decide(db, rid, "confirmed")
+                note = "receipt_approved"
+                reg = await get_registration(db, r.reg_id)
+                if reg is not None and tickets is not None:
+                    tickets.add(reg.id, reg.name, reg.car, reg.plate, reg.people, reg.pay_status)
+            else:
+                await reject_payment(db, r.reg_id)
+                await decide(db, rid, "rejected")
+                note = "receipt_rejected"
+            # Уведомление — на языке участника, а не админа
+            t = LOCALES[await langs.get(r.tg_id)]
+            try:
+                await bot.send_message(r.tg_id, t[note])
+                if reg is not None and tickets is not None:
+                    # Билет «оплачено» взамен выданного при регистрации
+                    await send_ticket(bot, r.tg_id, tickets, t, reg.id, reg.plate, reg.pay_status)
+            except TelegramAPIError:
+                pass
+        nxt = await pending_near(db, rid, "next") or await pending_near(db, rid, "prev")
+    else:
+        nxt = await pending_near(db, rid, callback_data.action)
+        if nxt is None:
+            return await c.answer("Дальше чеков нет.")
+    if nxt is None:
+        await c.message.edit_caption(caption="✅ Очередь чеков пуста.", reply_markup=None)
+        return await c.answer()
+    caption, kb = await receipt_card(db, nxt)
+    await c.message.edit_media(InputMediaPhoto(media=nxt.file_id, caption=caption), reply_markup=kb)
+    await c.answer()
+
+# ================== Admin: broadcast ==================
+@admin_router.message(Command("broadcast"))
+async def cmd_broadcast(m: types.Message, command: CommandObject, broadcaster: Broadcaster):
+    if not is_admin(m):
+        return await m.answer("❌ У вас нет доступа.")
+    text = (command.args or "").strip()
+    if not text:
+        return await m.answer("Использование: /broadcast <текст>\nСообщение уйдёт всем зарегистрированным.")
+    bid = await broadcaster.create(text, m.chat.id)
+    broadcaster.start(bid)
+
+# ================== Admin: search ==================
+@admin_router.message(Command("find"))
+async def cmd_find(m: types.Message, command: CommandObject, db: Database):
+    if not is_admin(m):
+        return await m.answer("❌ У вас нет доступа.")
+    q = (command.args or "").strip()
+    if not q:
+        return await m.answer("Использование: /find <часть госномера, хвост телефона или имя>")
+    rows = await find_registrations(db, q)
+    if not rows:
+        return await m.answer("Ничего не найдено.")
+    lines = [
+        f"#{rid} <b>{escape(name or '')}</b> — {escape(car or '')} • <code>{escape(plate or '')}</code>\n"
+        f"📞 {escape(phone or '')}  🏁 {escape(race_type or '-')}  💰 {escape(payment or '-')}  👥 {people}"
+        for rid, name, car, plate, phone, race_type, payment, people in rows
+    ]
+    await m.answer("\n\n".join(lines), parse_mode=ParseMode.HTML)
 
 @admin_router.message(Command("count"))
-async def cmd_count(m: types.Message):
+async def cmd_count(m: types.Message, db: Database):
+    if not is_admin(m):
+        return await m.answer("❌ У вас нет доступа.")
+    stats = await get_stats(db)
+    await m.answer(f"Всего регистраций: <b>{stats.get('total', 0)}</b>", parse_mode=ParseMode.HTML)
+
+@admin_router.message(Command("stats"))
+async def cmd_stats(m: types.Message, command: CommandObject, ev: EventContext, throttle: ThrottleMiddleware):
     if not is_admin(m):
         return await m.answer("❌ У вас нет доступа.")
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute("SELECT COUNT(*) FROM registrations") as cur:
-            row = await cur.fetchone()
-    await m.answer(f"Всего регистраций: <b>{row[0]}</b>", parse_mode=ParseMode.HTML)
+    db = ev.db
+    if (command.args or "").strip().lower() == "recompute":
+        await recompute_stats(db)
+    s = await get_stats(db)
+    t = throttle.stats()
+    total = s.get("total", 0)
+    await m.answer(
+        f"📊 <b>Статистика — {escape(ev.event.title)}</b>\n\n"
+        f"Всего регистраций: <b>{total}</b>\n"
+        f"👥 Людей всего: <b>{s.get('people', 0)}</b>\n\n"
+        f"🏁 Jeep Sprint: {s.get('race:Jeep Sprint', 0)}\n"
+        f"🧗 Jeep Trial: {s.get('race:Jeep Trial', 0)}\n"
+        f"🚙 Без соревнований: {s.get('race:-', 0)}\n\n"
+        f"💰 Оплатили: {s.get('payment:paid', 0)}\n"
+        f"⏳ Оплатят позже: {s.get('payment:later', 0)}\n"
+        f"❔ Без статуса: {s.get('payment:-', 0)}\n\n"
+        f"🛡 Антифлуд: пропущено {t['passed']}, отброшено "
+        f"{t['dropped_user'] + t['dropped_global'] + t['dropped_inflight']}",
+        parse_mode=ParseMode.HTML
+    )
+
+# ================== Admin: slots ==================
+@admin_router.message(Command("slots"))
+async def cmd_slots(m: types.Message, command: CommandObject, inventory: Inventory):
+    if not is_admin(m):
+        return await m.answer("❌ У вас нет доступа.")
+    args = (command.args or "").split()
+    if args:
+        if len(args) != 2 or args[0] not in inventory.items or not args[1].isdigit():
+            return await m.answer("Использование: /slots [<вид> <мест>]\nВиды: " + ", ".join(inventory.items))
+        if not await inventory.set_capacity(args[0], int(args[1])):
+            return await m.answer("❌ Нельзя поставить меньше, чем уже занято и забронировано.")
+    lines = ["🎟 <b>Места</b>"]
+    for item, capacity, held, taken in await inventory.summary():
+        lines.append(f"{item.title} (<code>{item.kind}</code>): занято {taken}, бронь {held}, "
+                     f"свободно {capacity - held - taken} из {capacity}")
+    await m.answer("\n".join(lines), parse_mode=ParseMode.HTML)
+
+# ================== Admin: events ==================
+EVENT_USAGE = (
+    "/events — список мероприятий\n"
+    "/event <slug> — работать с мероприятием (выгрузки, поиск, статистика); /event - — с активным\n"
+    "/newevent <slug> <YYYY-MM-DD> <название> — новое мероприятие со своей базой\n"
+    "/activate <slug> — сделать мероприятие активным для участников\n"
+    "/eventset <slug> <fee|title|starts_on|ends_on|" + "|".join(TEXT_KEYS) + "> <значение>\n"
+    "   текст для одного языка — с суффиксом: " + ", ".join(f"{k}_{lang}" for k in TEXT_KEYS[:1] for lang in LANGS)
+)
+
+@admin_router.message(Command("events"))
+async def cmd_events(m: types.Message, events: EventRegistry):
+    if not is_admin(m):
+        return await m.answer("❌ У вас нет доступа.")
+    view = events.view(m.from_user.id)
+    lines = ["🗓 <b>Мероприятия</b>"]
+    for e in events.events():
+        marks = ("🟢 " if e.active else "") + ("👁 " if e.slug == view else "")
+        lines.append(f"{marks}<code>{e.slug}</code> — {escape(e.title)} ({e.starts_on or '-'}), взнос {money(e.fee)}")
+    lines.append("")
+    lines.append(EVENT_USAGE)
+    await m.answer("\n".join(lines), parse_mode=ParseMode.HTML)
+
+@admin_router.message(Command("event"))
+async def cmd_event(m: types.Message, command: CommandObject, events: EventRegistry):
+    if not is_admin(m):
+        return await m.answer("❌ У вас нет доступа.")
+    slug = (command.args or "").strip()
+    if slug in ("", "-"):
+        events.set_view(m.from_user.id, None)
+    elif events.get(slug) is None:
+        return await m.answer("Нет такого мероприятия. Список — /events")
+    else:
+        events.set_view(m.from_user.id, slug)
+    current = events.get(events.view(m.from_user.id))
+    await m.answer(f"Вы работаете с: <b>{escape(current.title)}</b> (<code>{current.slug}</code>)",
+                   parse_mode=ParseMode.HTML)
+
+@admin_router.message(Command("newevent"))
+async def cmd_newevent(m: types.Message, command: CommandObject, events: EventRegistry):
+    if not is_admin(m):
+        return await m.answer("❌ У вас нет доступа.")
+    parts = (command.args or "").split(maxsplit=2)
+    if len(parts) != 3 or not valid_slug(parts[0]) or not re.fullmatch(r"\d{4}-\d{2}-\d{2}", parts[1]):
+        return await m.answer(EVENT_USAGE)
+    slug, starts_on, title = parts
+    if events.get(slug) is not None:
+        return await m.answer("Такое мероприятие уже есть.")
+    event = await events.create(slug, title, starts_on)
+    await m.answer(f"✅ Создано: {escape(event.title)} (<code>{event.slug}</code>). "
+                   f"Активировать — /activate {event.slug}", parse_mode=ParseMode.HTML)
+
+@admin_router.message(Command("activate"))
+async def cmd_activate(m: types.Message, command: CommandObject, events: EventRegistry):
+    if not is_admin(m):
+        return await m.answer("❌ У вас нет доступа.")
+    slug = (command.args or "").strip()
+    if events.get(slug) is None:
+        return await m.answer("Нет такого мероприятия. Список — /events")
+    await events.activate(slug)
+    await m.answer(f"🟢 Активно: {escape(events.get(slug).title)}", parse_mode=ParseMode.HTML)
+
+@admin_router.message(Command("eventset"))
+async def cmd_eventset(m: types.Message, command: CommandObject, events: EventRegistry):
+    if not is_admin(m):
+        return await m.answer("❌ У вас нет доступа.")
+    parts = (command.args or "").split(maxsplit=2)
+    if len(parts) != 3 or events.get(parts[0]) is None:
+        return await m.answer(EVENT_USAGE)
+    slug, key, value = parts
+    if key == "fee":
+        if not value.replace(" ", "").isdigit():
+            return await m.answer("Взнос — число, например 250000")
+        value = int(value.replace(" ", ""))
+    try:
+        await events.update(slug, **{key: value})
+    except KeyError:
+        return await m.answer(EVENT_USAGE)
+    await m.answer("✅ Сохранено.")
+
+# ================== Admin: jobs ==================
+@admin_router.message(Command("jobs"))
+async def cmd_jobs(m: types.Message, command: CommandObject, jobs=None):
+    if not is_admin(m):
+        return await m.answer("❌ У вас нет доступа.")
+    from scheduler import TZ, job_status
+
+    name = (command.args or "").strip()
+    if name:
+        if jobs is None or name not in jobs.jobs:
+            return await m.answer("Нет такой задачи (или планировщик работает в другом воркере).")
+        jobs.run_now(name)
+        return await m.answer(f"▶️ {name} запущена вне расписания. Итог — /jobs")
+
+    def when(ts):
+        return datetime.fromtimestamp(ts, TZ).strftime("%d.%m %H:%M") if ts else "—"
+
+    lines = ["⏱ <b>Задачи</b>"]
+    for job_id, next_run, last in await job_status(db):
+        line = f"<code>{job_id}</code> — след. {when(next_run)}"
+        if last is not None:
+            line += f"; посл. {when(last.scheduled_at)} {last.status}"
+            if last.started_at is not None:
+                line += f", {last.seconds:.1f} с, задержка {last.lag:.1f} с"
+            if last.result:
+                line += f" → {escape(last.result[:80])}"
+        lines.append(line)
+    lines.append("\n/jobs <задача> — запустить сейчас")
+    await m.answer("\n".join(lines), parse_mode=ParseMode.HTML)
+
+# ================== Admin: check-in ==================
+CHECKIN_HELP = (
+    "🚧 <b>Режим въезда</b>\n"
+    "Наведите камеру телефона на QR участника — откроется бот с билетом; "
+    "код или ссылку можно прислать и сообщением. Каждый подлинный билет "
+    "отмечается въехавшим.\n"
+    "/checkin off — выйти, /tickets — файл для проверки на воротах без связи."
+)
+TICKET_STATUS = {"paid": "✅ оплачено", "unpaid": "❗️ не оплачено"}
+TICKETS_OFF = "🎫 Билеты выключены: задайте TICKET_SECRET."
+
+def checkin_card(check: Check, recorded: bool, earlier: float = None, scanning: bool = True) -> str:
+    from pytz import timezone
+
+    reg_id = check.ticket.reg_id
+    if recorded:
+        lines = [f"✅ <b>Въезд отмечен</b> — билет #{reg_id}"]
+    elif earlier is not None:
+        at = datetime.fromtimestamp(earlier, timezone(TIMEZONE)).strftime("%d.%m %H:%M")
+        lines = [f"⚠️ <b>Уже въехал</b> {at} — билет #{reg_id}"]
+    else:
+        lines = [f"🎫 Билет #{reg_id} подлинный"]
+    e = check.entry
+    if e is None:
+        # Подпись верна, но регистрации нет в базе выбранного мероприятия
+        lines.append(f"❓ Регистрация не найдена; номер в билете: <code>{escape(check.ticket.plate)}</code>")
+    else:
+        lines += [
+            f"👤 <b>{escape(e.name)}</b> — {escape(e.car)} • <code>{escape(e.plate)}</code>",
+            f"👥 Людей: {e.people}",
+            f"💰 {TICKET_STATUS[e.status]}",
+        ]
+        if check.outdated:
+            lines.append(f"ℹ️ В билете статус «{TICKET_STATUS[check.ticket.status]}», выше — текущий")
+    if not scanning:
+        lines.append("Въезд не отмечен: включите /checkin")
+    return "\n".join(lines)
+
+def ticket_owner(code: str, ev: EventContext, events: EventRegistry) -> Optional[EventContext]:
+    # Ключ подписи у каждого мероприятия свой, поэтому мероприятие билета
+    # определяет сама подпись: сначала текущее (активное или выбранное через
+    # /event), затем остальные открытые. Ссылка из QR и код, набранный в
+    # режиме /checkin, так проверяются одинаково
+    for ctx in (ev, *events.contexts()):
+        if ctx.tickets is not None and ctx.tickets.signer.verify(code) is not None:
+            return ctx
+    return None
+
+async def scan_ticket(m: types.Message, text: str, state: FSMContext, ev: EventContext, events: EventRegistry):
+    # Подпись и карточка — из памяти (tickets.py); в базу идёт только отметка
+    if ev.tickets is None:
+        return await m.answer(TICKETS_OFF)
+    code = extract(text)
+    owner = ticket_owner(code, ev, events) or ev
+    tickets = owner.tickets
+    check = await tickets.check(code)
+    if check is None:
+        return await m.answer("❌ Билет недействителен.")
+    scanning = await state.get_state() == CheckinForm.scan.state
+    if scanning and check.entry is not None:
+        earlier = await tickets.checkin(check.ticket.reg_id, m.from_user.id)
+        card = checkin_card(check, earlier is None, earlier)
+    else:
+        card = checkin_card(check, False, check.checked_at, scanning)
+    if owner is not ev:
+        card = f"🗓 {escape(owner.event.title)}\n{card}"
+    await m.answer(card, parse_mode=ParseMode.HTML)
+
+@admin_router.message(Command("checkin"))
+async def cmd_checkin(m: types.Message, command: CommandObject, state: FSMContext, ev: EventContext,
+                      tickets: Optional[TicketBook]):
+    if not is_admin(m):
+        return await m.answer("❌ У вас нет доступа.")
+    if tickets is None:
+        return await m.answer(TICKETS_OFF)
+    if (command.args or "").strip().lower() == "off":
+        await state.clear()
+        return await m.answer("Режим въезда выключен.")
+    await state.set_state(CheckinForm.scan)
+    await m.answer(
+        f"{CHECKIN_HELP}\n\n{escape(ev.event.title)}: въехало {len(tickets.checkins)} из {len(tickets)}.",
+        parse_mode=ParseMode.HTML,
+    )
+
+@admin_router.message(Command("tickets"))
+async def cmd_tickets(m: types.Message, ev: EventContext, tickets: Optional[TicketBook]):
+    if not is_admin(m):
+        return await m.answer("❌ У вас нет доступа.")
+    if tickets is None:
+        return await m.answer(TICKETS_OFF)
+    await tickets.refresh()
+    data = await asyncio.get_running_loop().run_in_executor(None, tickets.export)
+    await m.answer_document(
+        BufferedInputFile(data, filename=f"tickets_{ev.event.slug}_{datetime.utcnow().date()}.bin"),
+        caption=f"🎫 Билетов: {len(tickets)}, въехало: {len(tickets.checkins)}.\n"
+                f"Проверка без связи: python tickets.py <файл>, коды — построчно со сканера.",
+    )
+
+@admin_router.message(CheckinForm.scan, F.text)
+async def checkin_text(m: types.Message, state: FSMContext, ev: EventContext, events: EventRegistry):
+    await scan_ticket(m, m.text, state, ev, events)
+
+# ================== Jobs ==================
+# Фоновые задачи по расписанию (scheduler.py). Каждая возвращает короткий
+# итог — он попадает в job_runs и в /jobs
+async def expire_sessions(dp: Dispatcher):
+    removed = await dp.storage.expire()
+    if dp["dedup"]:
+        await dp["dedup"].prune()
+    return removed
+
+async def remind_payments(dp: Dispatcher):
+    events = dp["events"]
+    await events.ready()
+    ctx = events.active()
+    fee = money(ctx.event.fee)
+
+    def render(r):
+        return LOCALES.get(r.lang, LOCALES[DEFAULT_LANG])("pay_reminder", fee=fee)
+
+    counts = await send_reminders(ctx.db, events.scheduler, render)
+    return " ".join(f"{k}={v}" for k, v in counts.items())
+
+async def backup_databases(dp: Dispatcher):
+    events = dp["events"]
+    await events.ready()
+    paths = [await backup(db)]
+    for ctx in events.contexts():
+        if ctx.db.path != db.path:
+            paths.append(await backup(ctx.db))
+    await dp["jobs"].prune()
+    return len(paths)
+
+async def prebuild_exports(dp: Dispatcher):
+    # Снимки для /export и /exportxlsx ночью: днём первая выгрузка отдаётся из кэша
+    events = dp["events"]
+    await events.ready()
+    ctx = events.active()
+    for fmt in ("csv", "xlsx"):
+        exp = await build_export(ctx.db, fmt)
+        exp.file.close()
+    return ctx.event.slug
+
+async def start_jobs(dp: Dispatcher):
+    # apscheduler грузится здесь, когда бот уже принимает апдейты
+    from scheduler import IDLE_HOUR, JobScheduler, daily, every
+
+    jobs = JobScheduler(db)
+    jobs.add("fsm_expire", every(FSM_EXPIRE_EVERY), expire_sessions, dp)
+    jobs.add("payment_reminders", daily(REMIND_HOUR), remind_payments, dp)
+    jobs.add("backup", daily(IDLE_HOUR), backup_databases, dp)
+    jobs.add("export_snapshots", daily(IDLE_HOUR, 30), prebuild_exports, dp)
+    dp["jobs"] = jobs
+    await jobs.start()
+    if metrics.ENABLED:
+        metrics.REGISTRY.gauge("bot_jobs", "Scheduled jobs registered and running now",
+                               lambda: {(k,): v for k, v in jobs.stats().items()}, ("kind",))
+    return jobs
 
 # ================== Runner ==================
-async def main():
+def freeze_startup():
+    # Объекты старта (модули, роутеры, модели aiogram) — из-под полных сборок
+    # мусора. Это настройка GC всего процесса: без неё сборку, которую запускают
+    # аллокации openpyxl в снимке выгрузки, приходится делать по всей куче, и
+    # loop стоит ~100 мс. Вызывается один раз, когда бот собран (main, воркеры)
+    gc.collect()
+    gc.freeze()
+
+async def warm_up(dp: Dispatcher):
+    # Некритичная часть старта, пока бот уже отвечает: чеки и рассылки,
+    # не досланные до рестарта, снимок CSV для первого /export и планировщик
+    events = dp["events"]
+    await events.ready()
+    ctx = events.active()
+    await ctx.broadcaster.resume()
+    await ctx.receipts.resume()
+    try:
+        exp = await build_export(ctx.db, "csv")
+        exp.file.close()
+    except Exception:
+        log.exception("export snapshot warm-up failed")
+    await start_jobs(dp)
+
+async def setup_bot(bot: Bot = None, fast: bool = False, dedup: bool = DEDUP):
     await init_db()
-    bot = Bot(TOKEN, parse_mode=ParseMode.HTML)
-    dp = Dispatcher(storage=MemoryStorage())
+    # Таблицы FSM, дедупа и рассылок создаются миграциями, setup() не нужен
+    storage = SQLiteStorage(db, ttl=FSM_TTL)
+    dedup = DedupMiddleware(db) if dedup else None
+    bot = bot or Bot(TOKEN, session=CachedSession(), parse_mode=ParseMode.HTML)
+    dp = Dispatcher(storage=storage)
+    dp["dedup"] = dedup
+    throttle = ThrottleMiddleware(admins=ADMINS, workers=BOT_WORKERS, in_form=storage.in_form)
+    dp["throttle"] = throttle
+    # Планировщик — только в процессе, который его запустил (start_jobs)
+    dp["jobs"] = None
+    # База, места, чеки и рассылки — свои у каждого мероприятия (events.py);
+    # хендлеры получают их через EventMiddleware
+    events = EventRegistry(db, bot, render=render_event)
+    if fast:
+        events.load_later()
+    else:
+        await events.load()
+    dp["events"] = events
+    # Язык участника — общий для всех мероприятий, хранится в основной базе
+    langs = LangStore(db)
+    dp["langs"] = langs
+    throttle.install(dp)
+    if dedup:
+        dp.update.outer_middleware(dedup)
+    dp.update.outer_middleware(EventMiddleware(events))
+    dp.update.outer_middleware(LocaleMiddleware(langs))
+    if metrics.ENABLED:
+        dp.message.middleware(HandlerMetrics())
+        dp.callback_query.middleware(HandlerMetrics())
+        bot.session.middleware(ApiMetrics())
+        metrics.REGISTRY.gauge("bot_throttle_updates", "Updates passed and dropped by the throttle",
+                               lambda: {(k,): v for k, v in throttle.stats().items()}, ("result",))
+        metrics.REGISTRY.gauge("bot_receipts", "Receipt pipeline queue and processed counters",
+                               lambda: {(k,): v for k, v in events.active().receipts.stats().items()}, ("kind",))
+        metrics.REGISTRY.gauge("bot_inventory_free", "Free lodging and race slots",
+                               lambda: {(k,): v for k, v in events.active().inventory.stats().items()}, ("kind",))
+        metrics.REGISTRY.gauge("bot_duplicate_index", "Registered keys in the duplicate index and early rejections",
+                               lambda: {(k,): v for k, v in events.active().dupes.stats().items()}, ("kind",))
+        if TICKET_SECRET:
+            metrics.REGISTRY.gauge("bot_tickets", "Tickets in the gate index, check-ins and verified/rejected scans",
+                                   lambda: {(k,): v for k, v in events.active().tickets.stats().items()}, ("kind",))
     dp.include_router(router)
     dp.include_router(admin_router)
-    await dp.start_polling(bot)
+    return dp, bot
+
+def webhook_secret() -> str:
+    # Без секрета поддельный апдейт может прислать любой, кто знает URL. Webhook
+    # регистрирует сам бот (set_webhook с WEBHOOK_URL), поэтому, если секрет не
+    # задан, хватает случайного на время жизни процесса
+    if BOT_MODE != "webhook" or not WEBHOOK_URL or WEBHOOK_SECRET:
+        return WEBHOOK_SECRET
+    log.warning("WEBHOOK_SECRET is not set: using a random secret for this run")
+    return secrets.token_urlsafe(32)
+
+async def main(bot: Bot = None):
+    webhook = dict(
+        url=WEBHOOK_URL, path=WEBHOOK_PATH, secret=webhook_secret(),
+        host=WEBHOOK_HOST, port=WEBHOOK_PORT,
+    )
+    if BOT_WORKERS > 1:
+        from workers import run_workers
+
+        # Фронт только принимает апдейты; Dispatcher с роутерами здесь нужен
+        # лишь для списка allowed_updates
+        dp = Dispatcher()
+        dp.include_router(router)
+        dp.include_router(admin_router)
+        bot = bot or Bot(TOKEN, session=CachedSession(), parse_mode=ParseMode.HTML)
+        try:
+            return await run_workers(dp, bot, BOT_WORKERS, BOT_MODE, **webhook)
+        finally:
+            await bot.session.close()
+
+    bot = bot or Bot(TOKEN, session=CachedSession(), parse_mode=ParseMode.HTML)
+    if FAST_START:
+        # start_polling возьмёт bot.me() из кэша Bot
+        (dp, bot), _ = await asyncio.gather(setup_bot(bot, fast=True), bot.me())
+        warming = asyncio.create_task(warm_up(dp))
+    else:
+        dp, bot = await setup_bot(bot)
+        await warm_up(dp)
+        warming = None
+    freeze_startup()
+    exporter = await metrics.serve(metrics.METRICS_HOST, metrics.METRICS_PORT) if metrics.ENABLED else None
+    try:
+        if BOT_MODE == "webhook":
+            from webhook import run_webhook
+
+            await run_webhook(dp, bot, workers=WEBHOOK_WORKERS, queue_size=WEBHOOK_QUEUE, **webhook)
+        else:
+            await dp.start_polling(bot)
+    finally:
+        if warming:
+            warming.cancel()
+        if dp["jobs"]:
+            dp["jobs"].shutdown()
+        await dp["events"].close()
+        if exporter:
+            await exporter.cleanup()
+        await close_all()
 
 if __name__ == "__main__":
     asyncio.run(main())
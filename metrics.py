@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+# Метрики в текстовом формате Prometheus без внешних зависимостей.
+# Горячий путь — observe()/inc(): поиск по словарю и bisect по границам
+# корзин, без блокировок (всё в одном event loop) и без аллокаций на строки;
+# кумулятивные суммы и текст считаются только при запросе /metrics.
+import logging
+import os
+import time
+from bisect import bisect_left
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import TelegramObject
+
+log = logging.getLogger("metrics")
+
+# /metrics слушает только локальный интерфейс. По умолчанию выключено:
+# METRICS_PORT=0 убирает и endpoint, и инструментирование хендлеров, Bot API и БД
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+ENABLED = METRICS_PORT > 0
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(9))  # 1 KB .. 64 MB
+COUNT_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# ================== Metric types ==================
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        for key, value in self.values.items():
+            yield f"{self.name}{_labels(self.labels, key)} {_num(value)}"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # labels -> [счётчики по корзинам (+Inf последней), sum, count]
+        self.values = {}
+
+    def observe(self, value, *labels):
+        slot = self.values.get(labels)
+        if slot is None:
+            slot = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        slot[0][bisect_left(self.buckets, value)] += 1
+        slot[1] += value
+        slot[2] += 1
+
+    def render(self):
+        for key, (counts, total, n) in self.values.items():
+            acc = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                acc += c
+                le = 'le="%s"' % _num(bound)
+                yield f"{self.name}_bucket{_labels(self.labels, key, le)} {acc}"
+            yield f"{self.name}_sum{_labels(self.labels, key)} {_num(total)}"
+            yield f"{self.name}_count{_labels(self.labels, key)} {n}"
+
+
+class Gauge:
+    # Значение снимается функцией в момент запроса /metrics:
+    # число или словарь {кортеж меток: число}
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn: Callable[[], Any], labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.fn = fn
+
+    def render(self):
+        value = self.fn()
+        if not isinstance(value, dict):
+            value = {(): value}
+        for key, v in value.items():
+            yield f"{self.name}{_labels(self.labels, key)} {_num(v)}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def _add(self, metric):
+        # Повторная регистрация (например, второй setup_bot в процессе) отдаёт
+        # уже существующую метрику, а для Gauge — подменяет источник
+        existing = self.metrics.get(metric.name)
+        if existing is not None and existing.kind == metric.kind:
+            if isinstance(metric, Gauge):
+                existing.fn = metric.fn
+            return existing
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labels=()) -> Counter:
+        return self._add(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name, help, fn, labels=()) -> Gauge:
+        return self._add(Gauge(name, help, fn, labels))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            try:
+                lines.extend(metric.render())
+            except Exception:
+                log.exception("metric %s failed to render", metric.name)
+        lines.append("")
+        return "\n".join(lines)
+
+
+REGISTRY = Registry()
+
+# ================== Bot metrics ==================
+HANDLER_SECONDS = REGISTRY.histogram(
+    "bot_handler_seconds", "Handler latency by handler and FSM state", ("handler", "state"))
+HANDLER_ERRORS = REGISTRY.counter(
+    "bot_handler_errors_total", "Handler exceptions by handler and FSM state", ("handler", "state"))
+DB_SECONDS = REGISTRY.histogram(
+    "bot_db_seconds", "SQLite call latency by operation, including queue and lock waits", ("op",))
+DB_ERRORS = REGISTRY.counter("bot_db_errors_total", "SQLite call errors by operation", ("op",))
+DB_BATCH = REGISTRY.histogram(
+    "bot_db_batch_size", "Statements per write-behind transaction", buckets=COUNT_BUCKETS)
+EXPORT_SECONDS = REGISTRY.histogram("bot_export_seconds", "Export build time by format", ("format",))
+EXPORT_CACHE = REGISTRY.counter(
+    "bot_export_cache_total", "Full exports served from the snapshot cache or rebuilt", ("format", "result"))
+EXPORT_BYTES = REGISTRY.histogram(
+    "bot_export_bytes", "Export file size by format", ("format",), buckets=SIZE_BUCKETS)
+FSM_ENTERED = REGISTRY.counter("bot_fsm_entered_total", "FSM state entries (funnel steps)", ("state",))
+FSM_EXPIRED = REGISTRY.counter("bot_fsm_expired_total", "Sessions abandoned and expired, by last state", ("state",))
+RECEIPT_SECONDS = REGISTRY.histogram(
+    "bot_receipt_seconds", "Receipt pipeline time by stage (download, hash)", ("stage",))
+API_SECONDS = REGISTRY.histogram("bot_telegram_api_seconds", "Bot API call latency by method", ("method",))
+API_ERRORS = REGISTRY.counter(
+    "bot_telegram_api_errors_total", "Bot API call errors by method and exception", ("method", "error"))
+
+
+class HandlerMetrics(BaseMiddleware):
+    # Inner-middleware на dp.message и dp.callback_query: срабатывает только
+    # для найденного хендлера, поэтому в data уже есть сам хендлер и raw_state из FSM
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        obj = data.get("handler")
+        name = getattr(getattr(obj, "callback", None), "__name__", "-")
+        state = data.get("raw_state") or "-"
+        t0 = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.inc(name, state)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - t0, name, state)
+
+
+class ApiMetrics(BaseRequestMiddleware):
+    # Middleware сессии бота: время каждого запроса к Bot API и его ошибки
+
+    async def __call__(self, make_request, bot, method):
+        name = method.__api_method__
+        t0 = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            API_ERRORS.inc(name, type(e).__name__)
+            raise
+        finally:
+            API_SECONDS.observe(time.perf_counter() - t0, name)
+
+
+# ================== HTTP ==================
+# aiohttp.web (~25 мс импорта) нужен только серверу /metrics: при METRICS_PORT=0
+# и во фронте BOT_WORKERS он не грузится
+async def metrics_view(request):
+    from aiohttp import web
+
+    return web.Response(text=REGISTRY.render(), content_type="text/plain", charset="utf-8",
+                        headers={"X-Content-Type-Options": "nosniff"})
+
+
+async def serve(host: str, port: int):
+    # Отдельный маленький сервер только с /metrics (по умолчанию на 127.0.0.1)
+    from aiohttp import web
+
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_view)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as e:
+        # Порт занят (второй экземпляр, чужой exporter) — бот работает и без /metrics
+        log.error("metrics exporter disabled: cannot listen on %s:%s - %s", host, port, e)
+        await runner.cleanup()
+        return None
+    log.info("metrics on http://%s:%s/metrics", host, port)
+    return runner
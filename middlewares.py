@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import aiosqlite
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update, User
+
+from db import Database
+from schema import DEDUP_SQL
+
+# Схема создаётся миграцией 6 (repository.py), DDL — в schema.py
+
+# Telegram повторяет доставку не дольше суток
+DEDUP_KEEP = 24 * 3600
+DEDUP_RECENT = 50000
+
+# Антифлуд: живой человек не пишет чаще раза в секунду дольше пары секунд,
+# а общий поток не должен превышать то, что успевают хендлеры и Bot API.
+# GLOBAL_* — на весь бот; при нескольких воркерах делится между ними
+USER_RATE = 1.0
+USER_BURST = 5
+GLOBAL_RATE = 200.0
+GLOBAL_BURST = 400
+USER_INFLIGHT = 2
+THROTTLE_USERS = 100000
+
+
+class DedupMiddleware(BaseMiddleware):
+    # Outer-middleware на dp.update: повторно доставленный апдейт (ретрай webhook,
+    # рестарт воркера) отбрасывается до хендлеров. Общая таблица в SQLite делает
+    # дедуп сквозным для всех воркеров; свежие id ещё и в памяти, чтобы дубль
+    # внутри процесса не доходил до БД.
+
+    def __init__(self, db: Database, recent: int = DEDUP_RECENT):
+        self.db = db
+        self.recent = recent
+        self._seen = OrderedDict()
+        self.duplicates = 0
+
+    async def setup(self):
+        await self.db.executescript(DEDUP_SQL)
+
+    async def claim(self, update_id: int) -> bool:
+        if update_id in self._seen:
+            return False
+        self._seen[update_id] = None
+        if len(self._seen) > self.recent:
+            self._seen.popitem(last=False)
+        try:
+            await self.db.enqueue(
+                "INSERT INTO processed_updates (update_id, seen_at) VALUES (?, ?)",
+                (update_id, time.time()),
+            )
+        except aiosqlite.IntegrityError:
+            return False
+        return True
+
+    async def prune(self, keep: float = DEDUP_KEEP):
+        await self.db.enqueue("DELETE FROM processed_updates WHERE seen_at < ?", (time.time() - keep,))
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if isinstance(event, Update) and not await self.claim(event.update_id):
+            self.duplicates += 1
+            return None
+        return await handler(event, data)
+
+
+class Bucket:
+    # Неблокирующий token bucket: take() сразу говорит «да» или «нет»
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def take(self, now: float) -> bool:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class ThrottleMiddleware(BaseMiddleware):
+    # Outer-middleware на dp.update, ставится перед FSM и дедупом (install):
+    # лишние апдейты отбрасываются молча, только по словарям в памяти — без БД,
+    # FSM и ответов в Telegram, чтобы флуд не превращался в такой же поток исходящих.
+    # Админы не ограничиваются. Общий bucket не трогает тех, кто уже в диалоге:
+    # ответы RegForm (in_form — по кэшу FSM-хранилища) и нажатия inline-кнопок
+    # ограничиваются только своим bucket'ом — иначе волна новых /start срывала
+    # бы начатые анкеты.
+
+    def __init__(self, user_rate: float = USER_RATE, user_burst: int = USER_BURST,
+                 global_rate: float = GLOBAL_RATE, global_burst: int = GLOBAL_BURST,
+                 inflight: int = USER_INFLIGHT, users: int = THROTTLE_USERS, admins=(), workers: int = 1,
+                 in_form: Optional[Callable[[int], bool]] = None):
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.inflight = inflight
+        self.users = users
+        self.admins = {a.lower() for a in admins}
+        # Каждый воркер-процесс держит свой bucket — делим общий лимит поровну
+        # (апдейты раскладываются по from_user.id, нагрузка между ними ровная)
+        workers = max(1, workers)
+        self.bucket = Bucket(global_rate / workers, max(1, global_burst // workers), time.monotonic())
+        self.in_form = in_form
+        self._buckets = OrderedDict()
+        self._running = {}
+        self.passed = 0
+        self.dropped_user = 0
+        self.dropped_global = 0
+        self.dropped_inflight = 0
+
+    def install(self, dp):
+        # Встаёт сразу после UserContextMiddleware (нужен event_from_user) и
+        # перед FSMContextMiddleware: отброшенный апдейт не читает состояние из БД
+        outer = dp.update.outer_middleware
+        outer.unregister(dp.fsm)
+        outer(self)
+        outer(dp.fsm)
+
+    def stats(self) -> dict:
+        return {
+            "passed": self.passed,
+            "dropped_user": self.dropped_user,
+            "dropped_global": self.dropped_global,
+            "dropped_inflight": self.dropped_inflight,
+            "users": len(self._buckets),
+            "inflight": sum(self._running.values()),
+        }
+
+    def _user_bucket(self, user_id: int, now: float) -> Bucket:
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = Bucket(self.user_rate, self.user_burst, now)
+            if len(self._buckets) > self.users:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(user_id)
+        return bucket
+
+    def allow(self, user: User, exempt: bool = False) -> bool:
+        now = time.monotonic()
+        if self._running.get(user.id, 0) >= self.inflight:
+            self.dropped_inflight += 1
+            return False
+        if not self._user_bucket(user.id, now).take(now):
+            self.dropped_user += 1
+            return False
+        if not exempt and not self.bucket.take(now):
+            self.dropped_global += 1
+            return False
+        return True
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is None or (user.username or "").lower() in self.admins:
+            return await handler(event, data)
+        exempt = (isinstance(event, Update) and event.callback_query is not None) or (
+            self.in_form is not None and self.in_form(user.id))
+        if not self.allow(user, exempt):
+            return None
+        self.passed += 1
+        self._running[user.id] = self._running.get(user.id, 0) + 1
+        try:
+            return await handler(event, data)
+        finally:
+            left = self._running.pop(user.id) - 1
+            if left:
+                self._running[user.id] = left
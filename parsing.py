@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+# Разбор ввода анкеты. Все таблицы и регулярки собираются один раз при импорте.
+# Ответ ищется сначала точным совпадением в словаре (текст кнопки или типовой
+# ответ вроде «да» / «keyin»), затем одной скомпилированной альтернативой с
+# якорем на начало и границей слова: «ha» не находится внутри «hamma», а
+# «оплачу» не путается с «оплатил». Альтернатива работает по тексту в нижнем
+# регистре как есть — варианты апострофа и разделители уже в ней.
+import re
+from typing import NamedTuple, Optional
+
+from locales import RU, UZ
+
+
+# ================== Text ==================
+_APOSTROPHES = "‘’ʻʼ`´"
+_word_re = re.compile(r"[\w']+")
+
+
+def normalize_text(text: str) -> str:
+    # Нижний регистр, один вид апострофа, без эмодзи и знаков, одиночные пробелы
+    t = (text or "").lower()
+    if not t.isascii():
+        for ch in _APOSTROPHES:
+            t = t.replace(ch, "'")
+    return " ".join(_word_re.findall(t))
+
+
+# ================== Choices ==================
+class Choice(NamedTuple):
+    value: Optional[str]
+    exact: bool = False
+
+
+NO_CHOICE = Choice(None)
+
+
+# Всё, что normalize_text сводит к «'» и к пробелу, — прямо в регулярке
+_APOS = f"['{_APOSTROPHES}]"
+_SEP = rf"[^\w{_APOSTROPHES}']+"
+_literal_re = re.compile(r"[\w' ]+")
+# Набранные ответы повторяются («Да», «оплачу позже»): короткие запоминаются
+SEEN_MAX = 4096
+SEEN_LEN = 32
+# Знаки вокруг первого слова: «Ha, albatta» / «ДА!» — это «ha» / «да»
+_PUNCT = ".,!?;:()\"«»"
+
+
+def _compile(p: str) -> str:
+    return p.replace("'", _APOS).replace(" ", _SEP)
+
+
+class IntentTable:
+    # Результаты — заранее созданные Choice: на нажатие кнопки и на типовой
+    # ответ один-два поиска в словаре и ни одной аллокации
+    __slots__ = ("buttons", "pattern", "choices", "anchored", "seen")
+
+    def __init__(self, buttons: dict, patterns, anchored: bool = True):
+        # buttons: текст кнопки -> значение; patterns: [(регулярка, значение)],
+        # регулярка описывает слово целиком (окончания — через \w*)
+        self.buttons = {}
+        self.anchored = anchored
+        self.seen = {}
+        self.choices = [Choice(value) for _, value in patterns]
+        # Простые слова из альтернатив («да|ha|нет») — тоже в словарь
+        for (p, _), choice in zip(patterns, self.choices):
+            for word in p.split("|"):
+                if _literal_re.fullmatch(word):
+                    self.buttons[word] = choice
+        for text, value in buttons.items():
+            self.buttons[text] = self.buttons[text.lower()] = self.buttons[normalize_text(text)] = Choice(value, True)
+        alternation = "|".join(f"(?P<g{i}>{_compile(p)})" for i, (p, _) in enumerate(patterns))
+        start = r"^[^\w]*" if anchored else rf"(?<![\w{_APOSTROPHES}'])"
+        self.pattern = re.compile(f"{start}(?:{alternation})(?![\\w{_APOSTROPHES}'])")
+
+    def match(self, text: str) -> Choice:
+        choice = self.buttons.get(text)
+        if choice is None:
+            choice = self.seen.get(text)
+        if choice is not None:
+            return choice
+        choice = self._match(text)
+        if len(self.seen) < SEEN_MAX and len(text or "") <= SEEN_LEN:
+            self.seen[text] = choice
+        return choice
+
+    def _match(self, text: str) -> Choice:
+        t = (text or "").lower()
+        choice = self.buttons.get(t)
+        if choice is not None:
+            return choice
+        if self.anchored:
+            # Ответ начинается с типового слова — регулярка не нужна
+            choice = self.buttons.get(t.partition(" ")[0].strip(_PUNCT))
+            if choice is not None:
+                return choice
+        m = self.pattern.match(t) if self.anchored else self.pattern.search(t)
+        return NO_CHOICE if m is None else self.choices[int(m.lastgroup[1:])]
+
+
+def _buttons(**keys) -> dict:
+    # Кнопки обеих локалей: ключ в locales.py -> значение
+    return {t[key]: value for t in (RU, UZ) for key, value in keys.items()}
+
+
+# Двуязычные тексты — кнопки прежних клавиатур, которые ещё могут быть у пользователей
+RACE = IntentTable(
+    {"✅ Да / Ha": "yes", "❌ Нет / Yo‘q": "no", **_buttons(btn_yes="yes", btn_no="no")},
+    [
+        (r"да|ha|ха|xa|yes|ага", "yes"),
+        (r"нет|yo'?q|yok|йўқ|йук|no", "no"),
+    ],
+)
+
+RACE_TYPE = IntentTable(
+    {"🏁 Jeep Sprint": "Jeep Sprint", "🧗 Jeep Trial": "Jeep Trial"},
+    [
+        (r"sprint\w*|спринт\w*", "Jeep Sprint"),
+        (r"trial\w*|триал\w*", "Jeep Trial"),
+    ],
+    anchored=False,
+)
+
+PAYMENT = IntentTable(
+    {
+        "💰 Я оплатил(а) / To‘lov qildim": "paid",
+        "⏳ Оплачу позже / Keyin to‘layman": "later",
+        "❌ Отмена / Bekor qilish": "cancel",
+        **_buttons(btn_paid="paid", btn_later="later", btn_cancel="cancel"),
+    },
+    [
+        (r"оплачу|позже|потом|keyin\w*|later", "later"),
+        (r"(?:я )?(?:оплатил\w*|оплачен\w*|to'?lov qildim|to'?ladim|paid)", "paid"),
+        (r"отмен\w*|bekor\w*|cancel", "cancel"),
+    ],
+)
+
+
+# ================== Plates ==================
+class Plate(NamedTuple):
+    text: str
+    country: Optional[str]
+
+
+# Кириллица, похожая на латиницу, — к латинице: «01А777АА» и «01A777AA» один номер.
+# Пробелы и дефисы убираются заменой, остальной мусор — регуляркой
+_PLATE_LETTERS = str.maketrans("АВЕКМНОРСТУХ", "ABEKMHOPCTYX")
+_plate_junk_re = re.compile(r"[^0-9A-ZА-ЯЁ]")
+_PLATE_PREFIXES = ("UZ", "KZ", "RU")
+_plate_prefix_re = re.compile(r"(UZ|KZ|RUS|RU)(?=\d|[A-Z]\d)")
+# Формат номера — по «форме»: цифры -> 9, буквы -> A, затем поиск в словаре
+_PLATE_SHAPE = bytes.maketrans(b"0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ", b"9" * 10 + b"A" * 26)
+_PLATE_FORMATS = {
+    "99A999AA": "UZ",   # 01A777AA
+    "99999AAA": "UZ",   # 01 777 AAA (юрлица)
+    "999AA99": "KZ",    # 321 AB 05
+    "999AAA99": "KZ",   # 321 ABC 05
+    "A999AA99": "RU",   # A123BC 77
+    "A999AA999": "RU",  # A123BC 777
+}
+# В российских номерах — только буквы, одинаковые в кириллице и латинице
+_RU_PLATE_CHARS = "0123456789ABEKMHOPCTYX"
+PLATE_MIN = 4
+
+
+def parse_plate(text: str) -> Optional[Plate]:
+    # Известный формат UZ/KZ/RU — с кодом страны; иначе любой номер от 4 символов
+    p = (text or "").upper()
+    if not (p.isascii() and p.isalnum()):
+        p = p.replace(" ", "").replace("-", "")
+        if not p.isascii():
+            p = p.translate(_PLATE_LETTERS)
+        if not (p.isascii() and p.isalnum()):
+            p = _plate_junk_re.sub("", p)
+    hint = None
+    if p[:1] > "9" and p.startswith(_PLATE_PREFIXES):
+        m = _plate_prefix_re.match(p)
+        if m:
+            hint = "RU" if m.group(1) == "RUS" else m.group(1)
+            p = p[m.end():]
+    country = _PLATE_FORMATS.get(p.encode().translate(_PLATE_SHAPE).decode("latin-1"))
+    if country == "RU" and p.strip(_RU_PLATE_CHARS):
+        country = None
+    if country is not None:
+        return Plate(p, country)
+    if len(p) < PLATE_MIN:
+        return None
+    return Plate(p, hint)
+
+
+# ================== Phones ==================
+class Phone(NamedTuple):
+    e164: str
+    country: Optional[str]
+
+
+_digits_re = re.compile(r"\D")
+
+
+def parse_phone(text: str) -> Optional[Phone]:
+    # +998 XX XXX XX XX, 90 123 45 67 (без кода — Узбекистан), +7/8 (7XX) — Казахстан,
+    # остальные +7/8 — Россия; прочие страны принимаются с «+» и 7–15 цифрами
+    raw = (text or "").strip()
+    digits = _digits_re.sub("", raw)
+    plus = raw.startswith("+")
+    if digits.startswith("00"):
+        digits, plus = digits[2:], True
+    if len(digits) == 12 and digits.startswith("998"):
+        return Phone("+" + digits, "UZ")
+    if len(digits) == 9 and not plus:
+        return Phone("+998" + digits, "UZ")
+    if len(digits) == 11 and (digits[0] == "7" or (digits[0] == "8" and not plus)):
+        digits = "7" + digits[1:]
+        return Phone("+" + digits, "KZ" if digits[1] == "7" else "RU")
+    if plus and 7 <= len(digits) <= 15:
+        return Phone("+" + digits, None)
+    return None
+
+
+# ================== Numbers ==================
+_int_re = re.compile(r"\d{1,3}")
+PEOPLE_MAX = 50
+
+
+def parse_people(text: str) -> Optional[int]:
+    # Первое число в ответе: «3 человека» -> 3, «2-3» -> 2
+    m = _int_re.search(text or "")
+    if m is None:
+        return None
+    n = int(m.group())
+    return n if 1 <= n <= PEOPLE_MAX else None
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+# Чеки об оплате: хендлер только ставит фото в очередь и сразу отвечает.
+# Скачивание идёт в ограниченном пуле корутин, перцептивный хэш (dHash) —
+# в пуле процессов, чтобы декодирование JPEG не занимало event loop.
+# Повторно присланный файл ловится по file_unique_id ещё до скачивания,
+# пересохранённый/пережатый скриншот — по расстоянию Хэмминга между хэшами.
+import asyncio
+import io
+import logging
+import multiprocessing as mp
+import time
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from aiogram import Bot
+
+from db import Database
+from metrics import RECEIPT_SECONDS
+
+log = logging.getLogger("receipts")
+
+# Схема создаётся миграцией 9 (repository.py), DDL — в schema.py
+
+WORKERS = 4
+QUEUE_SIZE = 500
+PROCESSES = 2
+# Для хэша хватает небольшой копии фото: меньше качать и декодировать
+HASH_MIN_SIDE = 320
+HASH_SIZE = 8
+# Порог «тот же чек»: до 6 различающихся бит из 64
+DISTANCE = 6
+
+
+# ================== Hashing ==================
+def dhash(data: bytes, size: int = HASH_SIZE) -> int:
+    # Выполняется в процессе пула. draft() просит JPEG-декодер сразу
+    # уменьшить картинку, поэтому большой скриншот целиком не раскодируется.
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as img:
+        img.draft("L", (size * 8, size * 8))
+        px = list(img.convert("L").resize((size + 1, size), Image.LANCZOS).getdata())
+    h = 0
+    for row in range(size):
+        base = row * (size + 1)
+        for col in range(size):
+            h = (h << 1) | (px[base + col] > px[base + col + 1])
+    return h
+
+
+def to_signed(h: int) -> int:
+    # SQLite INTEGER — знаковые 64 бита
+    return h - (1 << 64) if h >= 1 << 63 else h
+
+
+def to_unsigned(h: int) -> int:
+    return h + (1 << 64) if h < 0 else h
+
+
+def pick_photo(sizes):
+    # (для показа админу, для хэша): самый большой размер и самый маленький,
+    # у которого меньшая сторона не меньше HASH_MIN_SIDE
+    largest = sizes[-1]
+    for size in sizes:
+        if min(size.width, size.height) >= HASH_MIN_SIDE:
+            return largest, size
+    return largest, largest
+
+
+# ================== Rows ==================
+class Receipt(NamedTuple):
+    id: int
+    reg_id: int
+    tg_id: int
+    file_id: str
+    phash: Optional[int]
+    dup_of: Optional[int]
+    dup_kind: Optional[str]
+    status: str
+    name: Optional[str]
+    car: Optional[str]
+    plate: Optional[str]
+    phone: Optional[str]
+
+
+RECEIPT_SELECT = (
+    "SELECT r.id, r.reg_id, r.tg_id, r.file_id, r.phash, r.dup_of, r.dup_kind, r.status, "
+    "g.name, g.car, g.plate, g.phone FROM receipts r LEFT JOIN registrations g ON g.id = r.reg_id"
+)
+
+
+# ================== Pipeline ==================
+class ReceiptPipeline:
+    def __init__(self, db: Database, bot: Bot, workers: int = WORKERS, queue_size: int = QUEUE_SIZE,
+                 processes: int = PROCESSES, distance: int = DISTANCE, fetch=None):
+        self.db = db
+        self.bot = bot
+        self.workers = max(1, workers)
+        self.processes = max(1, processes)
+        self.distance = distance
+        # fetch(file_id) -> bytes; по умолчанию — скачивание через Bot API
+        self.fetch = fetch or self._download
+        self._queue = asyncio.Queue(maxsize=queue_size)
+        self._tasks = []
+        self._pool = None
+        # Известные хэши: receipt_id -> (reg_id, hash). Дочитываются из БД
+        # по id перед каждой проверкой, поэтому видят и чеки других воркеров.
+        self._hashes = {}
+        self._hashes_upto = 0
+        self.processed = 0
+        self.duplicates = 0
+        self.failed = 0
+
+    def stats(self) -> dict:
+        return {
+            "queue": self._queue.qsize(),
+            "processed": self.processed,
+            "duplicates": self.duplicates,
+            "failed": self.failed,
+        }
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self):
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def resume(self) -> int:
+        # Чеки, которые не успели обработать до рестарта или не влезли в очередь
+        rows = await self.db.fetchall(
+            "SELECT id FROM receipts WHERE phash IS NULL AND dup_kind IS NULL AND status='pending' ORDER BY id"
+        )
+        n = 0
+        for (rid,) in rows:
+            try:
+                self._queue.put_nowait(rid)
+                n += 1
+            except asyncio.QueueFull:
+                break
+        return n
+
+    async def submit(self, reg_id: int, tg_id: int, file_id: str, hash_file_id: str, file_unique_id: str) -> int:
+        # Запись чека идёт через write-behind очередь, обработка — в фоне.
+        # Статус регистрации (set_receipt) выставляет вызывающий.
+        # Если очередь переполнена, чек дождётся resume() при следующем старте.
+        rid = await self.db.enqueue(
+            "INSERT INTO receipts (reg_id, tg_id, file_id, hash_file_id, file_unique_id, created_at) "
+            "VALUES (?,?,?,?,?,?)",
+            (reg_id, tg_id, file_id, hash_file_id, file_unique_id, datetime.utcnow().isoformat()),
+        )
+        try:
+            self._queue.put_nowait(rid)
+        except asyncio.QueueFull:
+            log.warning("receipt queue full, receipt %s left for resume()", rid)
+        return rid
+
+    async def _download(self, file_id: str) -> bytes:
+        buf = await self.bot.download(file_id, destination=io.BytesIO())
+        return buf.getvalue()
+
+    def _executor(self):
+        if self._pool is None:
+            # Пул процессов — только когда пришёл первый чек, не при старте бота
+            from concurrent.futures import ProcessPoolExecutor
+
+            self._pool = ProcessPoolExecutor(self.processes, mp_context=mp.get_context("spawn"))
+        return self._pool
+
+    async def _worker(self):
+        while True:
+            rid = await self._queue.get()
+            try:
+                await self.process(rid)
+                self.processed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.failed += 1
+                log.exception("receipt %s processing failed", rid)
+            finally:
+                self._queue.task_done()
+
+    async def join(self):
+        await self._queue.join()
+
+    async def process(self, rid: int):
+        row = await self.db.fetchone(
+            "SELECT reg_id, hash_file_id, file_unique_id FROM receipts WHERE id=?", (rid,)
+        )
+        if row is None:
+            return
+        reg_id, hash_file_id, file_unique_id = row
+        # Тот же файл уже присылали — качать и хэшировать незачем
+        same = await self.db.fetchone(
+            "SELECT id, reg_id FROM receipts WHERE file_unique_id=? AND id<? ORDER BY id LIMIT 1",
+            (file_unique_id, rid),
+        )
+        if same is not None and same[1] != reg_id:
+            self.duplicates += 1
+            await self.db.enqueue("UPDATE receipts SET dup_of=?, dup_kind='file' WHERE id=?", (same[0], rid))
+            return
+        t0 = time.perf_counter()
+        data = await self.fetch(hash_file_id)
+        t1 = time.perf_counter()
+        RECEIPT_SECONDS.observe(t1 - t0, "download")
+        h = await asyncio.get_running_loop().run_in_executor(self._executor(), dhash, data)
+        RECEIPT_SECONDS.observe(time.perf_counter() - t1, "hash")
+        match = await self.find_similar(h, reg_id)
+        # В индекс сразу, без await между проверкой и вставкой: из двух похожих
+        # чеков, обработанных параллельно, второй увидит первый
+        self._hashes[rid] = (reg_id, h)
+        if match is not None:
+            self.duplicates += 1
+        await self.db.enqueue(
+            "UPDATE receipts SET phash=?, dup_of=?, dup_kind=? WHERE id=?",
+            (to_signed(h), match, "similar" if match is not None else None, rid),
+        )
+
+    async def _refresh(self):
+        rows = await self.db.fetchall(
+            "SELECT id, reg_id, phash FROM receipts WHERE id>? AND phash IS NOT NULL ORDER BY id",
+            (self._hashes_upto,),
+        )
+        for rid, reg_id, h in rows:
+            self._hashes[rid] = (reg_id, to_unsigned(h))
+        if rows:
+            self._hashes_upto = rows[-1][0]
+
+    async def find_similar(self, h: int, reg_id: int) -> Optional[int]:
+        # Первый чек другой регистрации на расстоянии <= distance. Линейный
+        # проход по int.bit_count — микросекунды на тысячу чеков.
+        await self._refresh()
+        for rid, (other_reg, other) in self._hashes.items():
+            if other_reg != reg_id and (h ^ other).bit_count() <= self.distance:
+                return rid
+        return None
+
+
+# ================== Review queue ==================
+async def get_receipt(db: Database, rid: int) -> Optional[Receipt]:
+    row = await db.fetchone(f"{RECEIPT_SELECT} WHERE r.id=?", (rid,))
+    return Receipt._make(row) if row else None
+
+
+async def pending_near(db: Database, rid: int, direction: str) -> Optional[Receipt]:
+    # Постраничный обход очереди по ключу: следующий/предыдущий pending по id
+    if direction == "prev":
+        sql = f"{RECEIPT_SELECT} WHERE r.status='pending' AND r.id<? ORDER BY r.id DESC LIMIT 1"
+    else:
+        sql = f"{RECEIPT_SELECT} WHERE r.status='pending' AND r.id>? ORDER BY r.id LIMIT 1"
+    row = await db.fetchone(sql, (rid,))
+    return Receipt._make(row) if row else None
+
+
+async def pending_position(db: Database, rid: int):
+    # (номер в очереди, всего в очереди)
+    return await db.fetchone(
+        "SELECT COALESCE(SUM(id<=?), 0), COUNT(*) FROM receipts WHERE status='pending'", (rid,)
+    )
+
+
+async def decide(db: Database, rid: int, status: str):
+    await db.enqueue(
+        "UPDATE receipts SET status=?, decided_at=? WHERE id=? AND status='pending'",
+        (status, datetime.utcnow().isoformat(), rid),
+    )
+
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# Напоминания об оплате тем, кто выбрал «оплачу позже». Запускаются по
+# расписанию (scheduler.py) пачками: выбор получателей — одно чтение с
+# LIMIT, отправка — через общий SendScheduler (лимиты Bot API общие с
+# рассылками). Напоминание засчитывается до отправки (write-behind очередь
+# сводит отметки пачки в несколько транзакций), поэтому падение посреди пачки
+# не приведёт к повтору; отправки, которые точно не дошли, в конце пачки
+# одним executemany возвращаются в выборку или закрываются.
+# Каждому участнику — не чаще REMIND_EVERY и не больше REMIND_MAX раз;
+# кто прислал чек или получил подтверждение, из выборки выпадает сам.
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Callable, NamedTuple, Optional
+
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from broadcast import SendScheduler
+from db import Database
+
+log = logging.getLogger("reminders")
+
+# Схема создаётся миграцией 15 (repository.py), DDL — в schema.py
+
+# Первое напоминание — не раньше чем через сутки после регистрации
+REMIND_AFTER = timedelta(hours=24)
+REMIND_EVERY = 48 * 3600
+REMIND_MAX = 3
+BATCH = 500
+SENDERS = 4
+
+DUE_SQL = (
+    "SELECT r.id, r.tg_id, r.lang, p.last_at FROM registrations r "
+    "LEFT JOIN payment_reminders p ON p.reg_id = r.id "
+    "WHERE r.payment = 'later' AND r.tg_id IS NOT NULL "
+    "AND COALESCE(r.pay_status, '') NOT IN ('paid_pending', 'paid_confirmed') "
+    "AND r.created_at < ? AND (p.reg_id IS NULL OR (p.sent < ? AND p.last_at < ?)) "
+    "ORDER BY r.id LIMIT ?"
+)
+
+MARK_SQL = (
+    "INSERT INTO payment_reminders (reg_id, sent, last_at, error) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT(reg_id) DO UPDATE SET sent = sent + excluded.sent, last_at = excluded.last_at, "
+    "error = excluded.error"
+)
+# Исход отправки, которая не дошла: (поправка к sent, last_at, ошибка, reg_id)
+RESULT_SQL = "UPDATE payment_reminders SET sent = sent + ?, last_at = ?, error = ? WHERE reg_id = ?"
+
+
+class Due(NamedTuple):
+    reg_id: int
+    tg_id: int
+    lang: str
+    last_at: Optional[float]
+
+
+async def due(db: Database, limit: int = BATCH) -> list:
+    now = time.time()
+    cutoff = (datetime.utcnow() - REMIND_AFTER).isoformat()
+    rows = await db.fetchall(DUE_SQL, (cutoff, REMIND_MAX, now - REMIND_EVERY, limit))
+    return [Due._make(row) for row in rows]
+
+
+async def send_reminders(db: Database, scheduler: SendScheduler, render: Callable[[Due], str],
+                         batch: int = BATCH, senders: int = SENDERS) -> dict:
+    # Одна пачка до batch получателей; render(due) — текст на языке участника.
+    # Остаток уйдёт следующим запуском.
+    pending = await due(db, batch)
+    queue = asyncio.Queue()
+    for item in pending:
+        queue.put_nowait(item)
+    results = []
+    counts = {"sent": 0, "failed": 0}
+
+    async def sender():
+        while not queue.empty():
+            item = queue.get_nowait()
+            now = time.time()
+            await db.enqueue(MARK_SQL, (item.reg_id, 1, now, None))
+            while True:
+                try:
+                    await scheduler.call(SendMessage(chat_id=item.tg_id, text=render(item)), item.tg_id)
+                except TelegramRetryAfter:
+                    continue
+                except (TelegramForbiddenError, TelegramBadRequest) as e:
+                    # Бот заблокирован — больше не напоминаем
+                    counts["failed"] += 1
+                    results.append((REMIND_MAX, now, e.message[:200], item.reg_id))
+                except TelegramAPIError as e:
+                    # Сеть и прочее — отметку снимаем, попробуем в следующий запуск
+                    counts["failed"] += 1
+                    results.append((-1, item.last_at or 0, str(e)[:200], item.reg_id))
+                else:
+                    counts["sent"] += 1
+                break
+
+    await asyncio.gather(*(sender() for _ in range(senders)))
+    if results:
+        await db.executemany(RESULT_SQL, results)
+    if pending:
+        log.info("payment reminders: %d sent, %d failed", counts["sent"], counts["failed"])
+    return counts
@@ -0,0 +1,357 @@
+# -*- coding: utf-8 -*-
+# Единый слой данных: одна схема registrations для бота (main.py) и для старой
+# анкеты из storage.py, нумерованные миграции и типизированные строки.
+# Версия схемы хранится в PRAGMA user_version: на старте это один запрос,
+# DDL выполняется только для миграций, которых ещё не было.
+import asyncio
+import logging
+import os
+import re
+import sqlite3
+from datetime import datetime
+from typing import List, NamedTuple, Optional
+
+import aiosqlite
+from aiosqlite import Connection
+
+from db import Database
+from schema import (
+    BASE_SQL, BROADCAST_SQL, CHECKINS_SQL, DEDUP_SQL, EVENTS_SQL, EXPORT_SCHEMA_SQL, FSM_SQL, INDEXES_SQL,
+    INVENTORY_SQL, LANG_SQL, RECEIPTS_SQL, REMINDERS_SQL, REV_COLUMN, SCHEDULER_SQL, SEARCH_NAMES_SQL, SEARCH_SQL,
+    STATS_RECOMPUTE_SQL, STATS_SQL, UNIFIED_COLUMNS, UPDATE_COLUMN, UPDATE_INDEX_SQL,
+)
+from parsing import parse_plate
+from search import phone_key, plate_key
+
+log = logging.getLogger("repository")
+
+DB_PATH = os.getenv("DB_PATH", "registrations.db")
+# Файл старой анкеты (storage.py); переносится в DB_PATH миграцией 8
+LEGACY_DB_PATH = os.getenv("LEGACY_DB_PATH", "bot.db")
+# Пауза перед повторной попыткой, если миграцию держит другой процесс
+MIGRATE_RETRY = 0.5
+
+
+# ================== Rows ==================
+class Registration(NamedTuple):
+    id: int
+    tg_id: int
+    lang: Optional[str]
+    name: str
+    car: str
+    plate: str
+    phone: str
+    race: Optional[str]
+    race_type: Optional[str]
+    payment: Optional[str]
+    people: Optional[int]
+    lodging_plan: Optional[str]
+    photo_file_id: Optional[str]
+    pay_status: Optional[str]
+    pay_dt: Optional[str]
+    receipt_file_id: Optional[str]
+    created_at: Optional[str]
+
+
+REG_COLUMNS = ", ".join(Registration._fields)
+
+
+# ================== Migrations ==================
+async def _script(conn: Connection, script: str):
+    # executescript() в sqlite3 сначала делает COMMIT, поэтому внутри транзакции
+    # миграции скрипт выполняется по одному выражению
+    statement = ""
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            await conn.execute(statement)
+            statement = ""
+    if statement.strip():
+        await conn.execute(statement)
+
+
+async def _base(conn: Connection):
+    await _script(conn, BASE_SQL)
+
+
+async def _add_columns(conn: Connection, columns):
+    async with conn.execute("PRAGMA table_info(registrations)") as cur:
+        existing = {row[1] for row in await cur.fetchall()}
+    for name, decl in columns:
+        if name not in existing:
+            await conn.execute(f"ALTER TABLE registrations ADD COLUMN {name} {decl}")
+
+
+async def _unify(conn: Connection):
+    await _add_columns(conn, UNIFIED_COLUMNS)
+    await _script(conn, INDEXES_SQL)
+
+
+async def _search(conn: Connection):
+    # Старые базы: заполняем ключи поиска, FTS строим один раз
+    async with conn.execute("SELECT 1 FROM sqlite_master WHERE name='registrations_fts'") as cur:
+        has_fts = await cur.fetchone() is not None
+    async with conn.execute(
+        "SELECT id, plate, phone FROM registrations WHERE plate_rev IS NULL OR phone_rev IS NULL"
+    ) as cur:
+        rows = await cur.fetchall()
+    if rows:
+        await conn.executemany(
+            "UPDATE registrations SET plate_rev=?, phone_rev=? WHERE id=?",
+            [(plate_key(plate), phone_key(phone), rid) for rid, plate, phone in rows],
+        )
+    await _script(conn, SEARCH_SQL)
+    if not has_fts:
+        await conn.execute("INSERT INTO registrations_fts(registrations_fts) VALUES ('rebuild')")
+
+
+async def _stats(conn: Connection):
+    await _script(conn, STATS_SQL)
+    await conn.execute("DELETE FROM reg_counters")
+    await conn.execute(STATS_RECOMPUTE_SQL)
+
+
+async def _fsm(conn: Connection):
+    await _script(conn, FSM_SQL)
+
+
+async def _dedup(conn: Connection):
+    await _script(conn, DEDUP_SQL)
+
+
+async def _broadcasts(conn: Connection):
+    await _script(conn, BROADCAST_SQL)
+
+
+async def _receipts(conn: Connection):
+    await _script(conn, RECEIPTS_SQL)
+
+
+async def _export_versions(conn: Connection):
+    # Существующим строкам версия = id, счётчик стартует с MAX(id)
+    await _add_columns(conn, (REV_COLUMN,))
+    await conn.execute("UPDATE registrations SET rev = id WHERE rev IS NULL")
+    await _script(conn, EXPORT_SCHEMA_SQL)
+
+
+async def _inventory(conn: Connection):
+    await _script(conn, INVENTORY_SQL)
+
+
+async def _events(conn: Connection):
+    # Реестр нужен только основной базе; в файлах мероприятий таблица пустая
+    await _script(conn, EVENTS_SQL)
+
+
+async def _user_langs(conn: Connection):
+    # Язык из последней анкеты считается выбранным: этих пользователей не
+    # спрашиваем о языке повторно
+    await _script(conn, LANG_SQL)
+    await conn.execute(
+        "INSERT OR IGNORE INTO user_langs (tg_id, lang, updated_at) "
+        "SELECT tg_id, lang, created_at FROM registrations WHERE lang IN ('ru', 'uz') ORDER BY id DESC"
+    )
+
+
+async def _update_ids(conn: Connection):
+    await _add_columns(conn, (UPDATE_COLUMN,))
+    await _script(conn, UPDATE_INDEX_SQL)
+
+
+async def _jobs(conn: Connection):
+    await _script(conn, SCHEDULER_SQL)
+    await _script(conn, REMINDERS_SQL)
+
+
+async def _checkins(conn: Connection):
+    await _script(conn, CHECKINS_SQL)
+
+
+async def _normalize_plates(conn: Connection):
+    # Номера, сохранённые до parse_plate, — к форме новых: латиница, без
+    # разделителей и кода страны. Иначе «01 А777АА» и «01A777AA» не ловят ни
+    # проверка дублей, ни UNIQUE. Если нормальная форма уже занята другой
+    # строкой, номер остаётся как есть (UPDATE OR IGNORE)
+    async with conn.execute("SELECT id, plate FROM registrations WHERE plate IS NOT NULL") as cur:
+        rows = await cur.fetchall()
+    params = []
+    for rid, plate in rows:
+        parsed = parse_plate(plate)
+        if parsed is not None and parsed.text != plate:
+            params.append((parsed.text, plate_key(parsed.text), rid))
+    if params:
+        cur = await conn.executemany("UPDATE OR IGNORE registrations SET plate=?, plate_rev=? WHERE id=?", params)
+        log.info("normalized %d plates, %d kept (normal form already taken)", cur.rowcount, len(params) - cur.rowcount)
+        await cur.close()
+
+
+async def _search_names(conn: Connection):
+    await _script(conn, SEARCH_NAMES_SQL)
+    await conn.execute("INSERT INTO registrations_fts(registrations_fts) VALUES ('rebuild')")
+    await conn.execute("INSERT INTO registrations_names(registrations_names) VALUES ('rebuild')")
+
+
+def people_count(value) -> Optional[int]:
+    digits = re.sub(r"\D", "", str(value or ""))
+    return int(digits) if digits else None
+
+
+def _legacy_payment(pay_status) -> str:
+    return "paid" if pay_status in ("paid_pending", "paid_confirmed") else "-"
+
+
+async def _backfill_legacy(conn: Connection, path: str = None):
+    # Переносим последнюю анкету каждого пользователя из старого bot.db.
+    # Совпадения по tg_id/госномеру/телефону с уже существующими — пропускаем.
+    path = path or LEGACY_DB_PATH
+    async with conn.execute("PRAGMA database_list") as cur:
+        current = {row[1]: row[2] for row in await cur.fetchall()}["main"]
+    if not os.path.exists(path) or os.path.abspath(path) == os.path.abspath(current or ""):
+        return
+    async with aiosqlite.connect(f"file:{path}?mode=ro", uri=True) as legacy:
+        try:
+            async with legacy.execute(
+                "SELECT user_id, dt_created, lang, name, car, plate, people, phone, lodging_plan, "
+                "photo_file_id, pay_status, pay_dt, receipt_file_id FROM registrations "
+                "WHERE id IN (SELECT MAX(id) FROM registrations GROUP BY user_id)"
+            ) as cur:
+                rows = await cur.fetchall()
+        except sqlite3.OperationalError:
+            return
+    params = []
+    for (user_id, dt_created, lang, name, car, plate, people, phone, lodging_plan,
+         photo_file_id, pay_status, pay_dt, receipt_file_id) in rows:
+        plate = (plate or "").strip().upper()
+        params.append((
+            user_id, (lang or "").lower() or None, name, car, plate, phone, "no", "-",
+            _legacy_payment(pay_status), people_count(people), lodging_plan, photo_file_id,
+            pay_status, pay_dt, receipt_file_id, dt_created, plate_key(plate), phone_key(phone),
+        ))
+    await conn.executemany(
+        "INSERT OR IGNORE INTO registrations (tg_id, lang, name, car, plate, phone, race, race_type, payment, "
+        "people, lodging_plan, photo_file_id, pay_status, pay_dt, receipt_file_id, created_at, plate_rev, phone_rev) "
+        "VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+        params,
+    )
+    log.info("backfilled %d registrations from %s", len(params), path)
+
+
+# Номер миграции = значение user_version после неё. Только дописывать в конец
+# и не менять уже выпущенные шаги. Все шаги идемпотентны: базы, созданные до
+# миграций (user_version=0), проходят их целиком без ошибок.
+MIGRATIONS = (
+    (1, _base),
+    (2, _unify),
+    (3, _search),
+    (4, _stats),
+    (5, _fsm),
+    (6, _dedup),
+    (7, _broadcasts),
+    (8, _backfill_legacy),
+    (9, _receipts),
+    (10, _export_versions),
+    (11, _inventory),
+    (12, _events),
+    (13, _user_langs),
+    (14, _update_ids),
+    (15, _jobs),
+    (16, _checkins),
+    (17, _normalize_plates),
+    (18, _search_names),
+)
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+async def _user_version(conn: Connection) -> int:
+    async with conn.execute("PRAGMA user_version") as cur:
+        return (await cur.fetchone())[0]
+
+
+async def migrate(db: Database, legacy: bool = True) -> int:
+    # Каждый шаг и отметка его номера — одна транзакция BEGIN IMMEDIATE: падение
+    # посреди шага ничего не фиксирует, а воркеры, стартующие одновременно,
+    # идут по очереди и перечитывают user_version уже под блокировкой.
+    # legacy=False — база мероприятия: перенос из bot.db (шаг 8) только
+    # отмечается, анкеты старого сезона в новое мероприятие не попадают
+    version = (await db.fetchone("PRAGMA user_version"))[0]
+    for number, step in MIGRATIONS:
+        if number <= version:
+            continue
+        while True:
+            try:
+                async with db.transaction() as conn:
+                    version = await _user_version(conn)
+                    if number > version:
+                        if legacy or step is not _backfill_legacy:
+                            await step(conn)
+                        await conn.execute(f"PRAGMA user_version = {number}")
+                        log.info("schema migrated to version %d (%s)", number, step.__name__)
+                        version = number
+                break
+            except sqlite3.OperationalError as e:
+                # Другой процесс держит базу дольше busy_timeout (долгий шаг) — ждём его
+                if "locked" not in str(e):
+                    raise
+                log.info("migration %d waits for another process: %s", number, e)
+                await asyncio.sleep(MIGRATE_RETRY)
+    return version
+
+
+# ================== Queries ==================
+async def add_registration(db: Database, tg_id, name, car, plate, phone, race="no", race_type="-",
+                           payment="-", people=None, lang=None, lodging_plan=None,
+                           photo_file_id=None, pay_status=None, update_id=None) -> Optional[int]:
+    # id новой регистрации или None, если tg_id, госномер или телефон уже заняты.
+    # С update_id вставка идемпотентна: повтор того же апдейта (ретрай после
+    # сбоя, отброшенная запись дедупа) вернёт id уже созданной им строки.
+    try:
+        return await db.enqueue(
+            "INSERT INTO registrations (tg_id, lang, name, car, plate, phone, race, race_type, payment, people, "
+            "lodging_plan, photo_file_id, pay_status, created_at, plate_rev, phone_rev, update_id) "
+            "VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+            (tg_id, lang, name, car, plate, phone, race, race_type, payment, people, lodging_plan,
+             photo_file_id, pay_status, datetime.utcnow().isoformat(), plate_key(plate), phone_key(phone),
+             update_id),
+        )
+    except aiosqlite.IntegrityError:
+        if update_id is None:
+            return None
+        row = await db.fetchone("SELECT id FROM registrations WHERE update_id=?", (update_id,))
+        return row[0] if row else None
+
+
+async def set_receipt(db: Database, reg_id: int, file_id: str):
+    await db.enqueue("UPDATE registrations SET receipt_file_id=?, pay_status=? WHERE id=?",
+                     (file_id, "paid_pending", reg_id))
+
+
+async def set_race(db: Database, reg_id: int, race: str, race_type: str):
+    await db.enqueue("UPDATE registrations SET race=?, race_type=? WHERE id=?", (race, race_type, reg_id))
+
+
+async def set_lodging(db: Database, reg_id: int, lodging_plan: Optional[str]):
+    await db.enqueue("UPDATE registrations SET lodging_plan=? WHERE id=?", (lodging_plan, reg_id))
+
+
+async def confirm_payment(db: Database, reg_id: int):
+    await db.enqueue("UPDATE registrations SET pay_status=?, pay_dt=?, payment=? WHERE id=?",
+                     ("paid_confirmed", datetime.utcnow().isoformat(), "paid", reg_id))
+
+
+async def reject_payment(db: Database, reg_id: int):
+    await db.enqueue("UPDATE registrations SET pay_status=? WHERE id=?", ("submitted", reg_id))
+
+
+async def get_registration(db: Database, reg_id: int) -> Optional[Registration]:
+    row = await db.fetchone(f"SELECT {REG_COLUMNS} FROM registrations WHERE id=?", (reg_id,))
+    return Registration._make(row) if row else None
+
+
+async def get_reg_by_user(db: Database, tg_id: int) -> Optional[Registration]:
+    row = await db.fetchone(f"SELECT {REG_COLUMNS} FROM registrations WHERE tg_id=?", (tg_id,))
+    return Registration._make(row) if row else None
+
+
+async def all_regs(db: Database) -> List[Registration]:
+    rows = await db.fetchall(f"SELECT {REG_COLUMNS} FROM registrations ORDER BY id DESC")
+    return [Registration._make(row) for row in rows]
@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+# Фоновые задачи по расписанию на apscheduler: напоминания об оплате, чистка
+# брошенных анкет, бэкап и снимки выгрузок в ночные часы.
+#
+# Задачи хранятся в SQLite (scheduler_jobs основной базы), поэтому время
+# следующего запуска переживает рестарт: пропущенный за время простоя ночной
+# бэкап выполнится один раз сразу после старта (coalesce + misfire_grace_time).
+# В хранилище лежит только ссылка run_job(name) — сами корутины регистрируются
+# в процессе через add(), их не нужно пиклить.
+#
+# Все задачи идут через один executor с семафором на JOB_CONCURRENCY:
+# сколько бы задач ни совпало по времени, одновременно работают не больше
+# стольких, а тяжёлое (запись, сборка выгрузок, VACUUM INTO) уходит в потоки
+# aiosqlite и executor — обработка апдейтов не ждёт. Время выполнения и
+# задержка старта (lag: от запланированного времени до фактического, вместе
+# с ожиданием семафора) пишутся в метрики и в job_runs.
+#
+# Планировщик запускается в одном процессе: при BOT_WORKERS > 1 — в воркере 0.
+import asyncio
+import logging
+import os
+import pickle
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional
+
+import pytz
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_MISSED
+from apscheduler.executors.asyncio import AsyncIOExecutor
+from apscheduler.executors.base_py3 import run_coroutine_job
+from apscheduler.job import Job
+from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+from apscheduler.util import datetime_to_utc_timestamp
+
+from config import TIMEZONE
+from db import Database
+from metrics import REGISTRY
+
+log = logging.getLogger("scheduler")
+
+# Схема создаётся миграцией 15 (repository.py), DDL — в schema.py
+
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "2"))
+# Пропущенный запуск старше этого уже не выполняется (ждём следующего)
+MISFIRE_GRACE = 6 * 3600
+# Ночные часы по TIMEZONE: бэкап, сжатие, снимки выгрузок
+IDLE_HOUR = int(os.getenv("IDLE_HOUR", "4"))
+TZ = pytz.timezone(TIMEZONE)
+
+JOB_SECONDS = REGISTRY.histogram(
+    "bot_job_seconds", "Scheduled job run time", ("job",),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+JOB_LAG = REGISTRY.histogram(
+    "bot_job_lag_seconds", "Delay between scheduled and actual job start", ("job",),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0, 60.0, 300.0, 3600.0),
+)
+JOB_RUNS = REGISTRY.counter("bot_job_runs_total", "Scheduled job runs by status", ("job", "status"))
+
+
+def every(seconds: float) -> IntervalTrigger:
+    return IntervalTrigger(seconds=seconds, timezone=TZ)
+
+
+def daily(hour: int, minute: int = 0) -> CronTrigger:
+    return CronTrigger(hour=hour, minute=minute, timezone=TZ)
+
+
+class Run(NamedTuple):
+    job_id: str
+    status: str  # ok / error / missed
+    scheduled_at: float
+    started_at: Optional[float]
+    finished_at: Optional[float]
+    result: Optional[str]
+
+    @property
+    def lag(self) -> float:
+        return (self.started_at or self.scheduled_at) - self.scheduled_at
+
+    @property
+    def seconds(self) -> float:
+        return (self.finished_at or 0) - (self.started_at or 0)
+
+
+# ================== Job store ==================
+class SQLiteJobStore(MemoryJobStore):
+    # apscheduler 3 зовёт хранилище синхронно из event loop, поэтому задачи
+    # живут в памяти (MemoryJobStore), а scheduler_jobs — их копия для
+    # рестарта. База читается один раз (load), записи уходят через
+    # write-behind очередь Database: тот же писатель, что у остальных записей,
+    # без второго соединения и ожидания блокировки файла в event loop.
+    # Планировщик работает в одном процессе, поэтому память — источник истины.
+
+    def __init__(self, db: Database, pickle_protocol: int = pickle.HIGHEST_PROTOCOL):
+        super().__init__()
+        self.db = db
+        self.pickle_protocol = pickle_protocol
+
+    async def load(self):
+        # После start() хранилища: восстановленным задачам нужен планировщик
+        failed = []
+        for job_id, state in await self.db.fetchall("SELECT id, job_state FROM scheduler_jobs"):
+            try:
+                MemoryJobStore.add_job(self, self._reconstitute_job(state))
+            except Exception:
+                self._logger.exception('Unable to restore job "%s" -- removing it', job_id)
+                failed.append((job_id,))
+        if failed:
+            await self.db.executemany("DELETE FROM scheduler_jobs WHERE id=?", failed)
+
+    def add_job(self, job):
+        super().add_job(job)
+        self._save(job)
+
+    def update_job(self, job):
+        super().update_job(job)
+        self._save(job)
+
+    def remove_job(self, job_id):
+        super().remove_job(job_id)
+        self._write("DELETE FROM scheduler_jobs WHERE id=?", (job_id,))
+
+    def remove_all_jobs(self):
+        super().remove_all_jobs()
+        self._write("DELETE FROM scheduler_jobs")
+
+    def shutdown(self):
+        # MemoryJobStore.shutdown() зовёт remove_all_jobs — базу не трогаем
+        MemoryJobStore.remove_all_jobs(self)
+
+    def _save(self, job):
+        self._write(
+            "INSERT OR REPLACE INTO scheduler_jobs (id, next_run_time, job_state) VALUES (?,?,?)",
+            (job.id, datetime_to_utc_timestamp(job.next_run_time),
+             pickle.dumps(job.__getstate__(), self.pickle_protocol)),
+        )
+
+    def _write(self, sql: str, params=()):
+        asyncio.ensure_future(self.db.enqueue(sql, params)).add_done_callback(_log_failure)
+
+    def _reconstitute_job(self, job_state):
+        state = pickle.loads(job_state)
+        state["jobstore"] = self
+        job = Job.__new__(Job)
+        job.__setstate__(state)
+        job._scheduler = self._scheduler
+        job._jobstore_alias = self._alias
+        return job
+
+
+# ================== Executor ==================
+class LimitedExecutor(AsyncIOExecutor):
+    # AsyncIOExecutor с общим семафором и замером каждого запуска
+
+    def __init__(self, limit: int, on_run: Callable[[Job, list, float, float, list], None]):
+        super().__init__()
+        self.limit = limit
+        self.on_run = on_run
+        self.running = 0
+
+    def start(self, scheduler, alias):
+        super().start(scheduler, alias)
+        self._slots = asyncio.Semaphore(self.limit)
+
+    def _do_submit_job(self, job, run_times):
+        async def run():
+            async with self._slots:
+                self.running += 1
+                started = time.time()
+                try:
+                    events = await run_coroutine_job(job, job._jobstore_alias, run_times, self._logger.name)
+                finally:
+                    self.running -= 1
+            self.on_run(job, run_times, started, time.time(), events)
+            return events
+
+        def callback(f):
+            self._pending_futures.discard(f)
+            try:
+                events = f.result()
+            except BaseException as e:
+                self._run_job_error(job.id, e, e.__traceback__)
+            else:
+                self._run_job_success(job.id, events)
+
+        f = self._eventloop.create_task(run())
+        f.add_done_callback(callback)
+        self._pending_futures.add(f)
+
+
+# ================== Scheduler ==================
+def _log_failure(task: asyncio.Future):
+    if not task.cancelled() and task.exception() is not None:
+        log.error("scheduler write failed: %r", task.exception())
+
+
+_current: Optional["JobScheduler"] = None
+
+
+async def run_job(name: str):
+    # Точка входа, которая хранится в scheduler_jobs
+    return await _current.jobs[name]()
+
+
+class JobScheduler:
+    def __init__(self, db: Database, concurrency: int = JOB_CONCURRENCY):
+        self.db = db
+        self.concurrency = concurrency
+        # name -> корутина без аргументов; name -> триггер
+        self.jobs: Dict[str, Callable[[], Awaitable]] = {}
+        self.triggers = {}
+        self.scheduler = None
+        self.executor = None
+
+    def add(self, name: str, trigger, fn: Callable[..., Awaitable], *args):
+        self.jobs[name] = (lambda: fn(*args)) if args else fn
+        self.triggers[name] = trigger
+
+    async def start(self):
+        global _current
+        _current = self
+        store = SQLiteJobStore(self.db)
+        self.executor = LimitedExecutor(self.concurrency, self._on_run)
+        self.scheduler = AsyncIOScheduler(
+            jobstores={"default": store},
+            executors={"default": self.executor},
+            job_defaults=dict(coalesce=True, max_instances=1, misfire_grace_time=MISFIRE_GRACE),
+            timezone=TZ,
+        )
+        # Пауза на время сверки: задачи из базы не стартуют, пока не ясно,
+        # какие из них ещё нужны
+        self.scheduler.start(paused=True)
+        await store.load()
+        self._sync(store)
+        self.scheduler.resume()
+
+    def _sync(self, store: SQLiteJobStore):
+        # Задача с тем же расписанием остаётся как есть — вместе с сохранённым
+        # временем следующего запуска. Изменённые пересоздаются, лишние удаляются.
+        stored = {job.id: job for job in store.get_all_jobs()}
+        for name, trigger in self.triggers.items():
+            job = stored.pop(name, None)
+            if job is not None and str(job.trigger) == str(trigger) and job.func is run_job:
+                continue
+            self.scheduler.add_job(run_job, trigger, args=(name,), id=name, name=name, replace_existing=True)
+        for job_id in stored:
+            self.scheduler.remove_job(job_id)
+
+    def run_now(self, name: str):
+        # Внеочередной запуск (/jobs <name>) тем же путём, что и по расписанию:
+        # через семафор, с замером; следующий плановый запуск считается от триггера
+        self.scheduler.modify_job(name, next_run_time=datetime.now(TZ))
+
+    def shutdown(self):
+        global _current
+        if self.scheduler is not None and self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
+        if _current is self:
+            _current = None
+
+    # ---------- runs ----------
+    def _on_run(self, job: Job, run_times: list, started: float, finished: float, events: list):
+        for run_time, event in zip(run_times, events):
+            if event.code == EVENT_JOB_MISSED:
+                status, result = "missed", None
+            elif event.code == EVENT_JOB_ERROR:
+                status, result = "error", repr(event.exception)[:500]
+            else:
+                status, result = "ok", None if event.retval is None else str(event.retval)[:500]
+            run = Run(job.id, status, run_time.timestamp(), started, finished, result)
+            if status == "missed":
+                run = run._replace(started_at=None, finished_at=None)
+            self._record(run)
+
+    def _record(self, run: Run):
+        JOB_RUNS.inc(run.job_id, run.status)
+        if run.started_at is not None:
+            JOB_LAG.observe(run.lag, run.job_id)
+            JOB_SECONDS.observe(run.seconds, run.job_id)
+        asyncio.ensure_future(self.db.enqueue(
+            "INSERT INTO job_runs (job_id, status, scheduled_at, started_at, finished_at, result) "
+            "VALUES (?,?,?,?,?,?)", tuple(run),
+        )).add_done_callback(_log_failure)
+
+    def stats(self) -> dict:
+        return {"running": self.executor.running if self.executor else 0, "jobs": len(self.jobs)}
+
+    async def prune(self, keep: float = 30 * 24 * 3600):
+        await self.db.enqueue("DELETE FROM job_runs WHERE scheduled_at < ?", (time.time() - keep,))
+
+
+async def job_status(db: Database):
+    # [(задача, следующий запуск (unix time) | None, последний Run | None)].
+    # Читается из базы, поэтому /jobs работает в любом воркере
+    jobs = await db.fetchall("SELECT id, next_run_time FROM scheduler_jobs ORDER BY next_run_time")
+    rows = await db.fetchall(
+        "SELECT job_id, status, scheduled_at, started_at, finished_at, result FROM job_runs "
+        "WHERE id IN (SELECT MAX(id) FROM job_runs GROUP BY job_id)"
+    )
+    last = {row[0]: Run._make(row) for row in rows}
+    return [(job_id, next_run, last.get(job_id)) for job_id, next_run in jobs]
@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+# DDL всех таблиц, которые создают миграции repository.py. Здесь только
+# строки: модули фич берут отсюда свои таблицы, а слой данных не импортирует
+# сами фичи (и не тянет их на старте). Выпущенные строки не меняются —
+# правки схемы идут новыми миграциями.
+
+
+# ================== Registrations ==================
+BASE_SQL = """
+CREATE TABLE IF NOT EXISTS registrations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tg_id INTEGER UNIQUE,
+    name TEXT,
+    car TEXT,
+    plate TEXT UNIQUE,
+    phone TEXT UNIQUE,
+    race TEXT,
+    race_type TEXT,
+    payment TEXT,
+    people INTEGER,
+    created_at TEXT
+);
+"""
+
+# Колонки, которых не было в схеме main.py: поля старой анкеты и ключи поиска
+UNIFIED_COLUMNS = (
+    ("lang", "TEXT"),
+    ("lodging_plan", "TEXT"),
+    ("photo_file_id", "TEXT"),
+    ("pay_status", "TEXT"),
+    ("pay_dt", "TEXT"),
+    ("receipt_file_id", "TEXT"),
+    ("plate_rev", "TEXT"),
+    ("phone_rev", "TEXT"),
+)
+# Версия строки для инкрементальных выгрузок (миграция 10)
+REV_COLUMN = ("rev", "INTEGER")
+# Апдейт, создавший строку (миграция 14): повтор того же апдейта не даст второй строки
+UPDATE_COLUMN = ("update_id", "INTEGER")
+UPDATE_INDEX_SQL = """
+CREATE UNIQUE INDEX IF NOT EXISTS idx_registrations_update ON registrations(update_id) WHERE update_id IS NOT NULL;
+"""
+
+INDEXES_SQL = """
+CREATE INDEX IF NOT EXISTS idx_registrations_pay_status ON registrations(pay_status, id);
+CREATE INDEX IF NOT EXISTS idx_registrations_payment ON registrations(payment, id);
+"""
+
+# Миграции 3 и 4 — снимок схемы на момент их появления. Правки поиска и
+# счётчиков идут новыми миграциями, а не изменением этих строк: иначе старые
+# и новые базы разошлись бы в зависимости от того, когда их мигрировали.
+# Подстрочный поиск по имени, номеру и машине — FTS5 (trigram) поверх
+# registrations, хвосты телефона/номера — индексы по перевёрнутым ключам (search.py)
+SEARCH_SQL = """
+CREATE INDEX IF NOT EXISTS idx_registrations_plate_rev ON registrations(plate_rev);
+CREATE INDEX IF NOT EXISTS idx_registrations_phone_rev ON registrations(phone_rev);
+CREATE VIRTUAL TABLE IF NOT EXISTS registrations_fts USING fts5(
+    name, plate, car,
+    content='registrations', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS registrations_fts_ai AFTER INSERT ON registrations BEGIN
+    INSERT INTO registrations_fts(rowid, name, plate, car) VALUES (new.id, new.name, new.plate, new.car);
+END;
+CREATE TRIGGER IF NOT EXISTS registrations_fts_ad AFTER DELETE ON registrations BEGIN
+    INSERT INTO registrations_fts(registrations_fts, rowid, name, plate, car)
+    VALUES ('delete', old.id, old.name, old.plate, old.car);
+END;
+CREATE TRIGGER IF NOT EXISTS registrations_fts_au AFTER UPDATE OF name, plate, car ON registrations BEGIN
+    INSERT INTO registrations_fts(registrations_fts, rowid, name, plate, car)
+    VALUES ('delete', old.id, old.name, old.plate, old.car);
+    INSERT INTO registrations_fts(rowid, name, plate, car) VALUES (new.id, new.name, new.plate, new.car);
+END;
+"""
+
+# Счётчики /stats: обновляются триггерами в той же транзакции, что и запись (stats.py)
+STATS_SQL = """
+CREATE TABLE IF NOT EXISTS reg_counters (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS reg_counters_ai AFTER INSERT ON registrations BEGIN
+    INSERT INTO reg_counters (key, value) VALUES
+        ('total', 1),
+        ('people', COALESCE(new.people, 0)),
+        ('race:' || COALESCE(new.race_type, '-'), 1),
+        ('payment:' || COALESCE(new.payment, '-'), 1)
+    ON CONFLICT(key) DO UPDATE SET value = value + excluded.value;
+END;
+CREATE TRIGGER IF NOT EXISTS reg_counters_ad AFTER DELETE ON registrations BEGIN
+    INSERT INTO reg_counters (key, value) VALUES
+        ('total', -1),
+        ('people', -COALESCE(old.people, 0)),
+        ('race:' || COALESCE(old.race_type, '-'), -1),
+        ('payment:' || COALESCE(old.payment, '-'), -1)
+    ON CONFLICT(key) DO UPDATE SET value = value + excluded.value;
+END;
+CREATE TRIGGER IF NOT EXISTS reg_counters_au AFTER UPDATE OF people, race_type, payment ON registrations BEGIN
+    INSERT INTO reg_counters (key, value) VALUES
+        ('people', COALESCE(new.people, 0) - COALESCE(old.people, 0)),
+        ('race:' || COALESCE(old.race_type, '-'), -1),
+        ('race:' || COALESCE(new.race_type, '-'), 1),
+        ('payment:' || COALESCE(old.payment, '-'), -1),
+        ('payment:' || COALESCE(new.payment, '-'), 1)
+    ON CONFLICT(key) DO UPDATE SET value = value + excluded.value;
+END;
+"""
+STATS_RECOMPUTE_SQL = (
+    "INSERT INTO reg_counters (key, value) "
+    "SELECT 'total', COUNT(*) FROM registrations "
+    "UNION ALL SELECT 'people', COALESCE(SUM(people), 0) FROM registrations "
+    "UNION ALL SELECT 'race:' || COALESCE(race_type, '-'), COUNT(*) FROM registrations "
+    "GROUP BY COALESCE(race_type, '-') "
+    "UNION ALL SELECT 'payment:' || COALESCE(payment, '-'), COUNT(*) FROM registrations "
+    "GROUP BY COALESCE(payment, '-')"
+)
+
+# Миграция 18: имя ищется по началу слов — FTS5 unicode61 с префиксным
+# индексом, поиск — чтение короткого диапазона терминов. Trigram остаётся
+# только для подстрок госномера и машины: без имён его списки в разы короче.
+SEARCH_NAMES_SQL = """
+DROP TRIGGER IF EXISTS registrations_fts_ai;
+DROP TRIGGER IF EXISTS registrations_fts_ad;
+DROP TRIGGER IF EXISTS registrations_fts_au;
+DROP TABLE IF EXISTS registrations_fts;
+CREATE VIRTUAL TABLE registrations_fts USING fts5(
+    plate, car,
+    content='registrations', content_rowid='id', tokenize='trigram'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS registrations_names USING fts5(
+    name,
+    content='registrations', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+CREATE TRIGGER registrations_fts_ai AFTER INSERT ON registrations BEGIN
+    INSERT INTO registrations_fts(rowid, plate, car) VALUES (new.id, new.plate, new.car);
+    INSERT INTO registrations_names(rowid, name) VALUES (new.id, new.name);
+END;
+CREATE TRIGGER registrations_fts_ad AFTER DELETE ON registrations BEGIN
+    INSERT INTO registrations_fts(registrations_fts, rowid, plate, car) VALUES ('delete', old.id, old.plate, old.car);
+    INSERT INTO registrations_names(registrations_names, rowid, name) VALUES ('delete', old.id, old.name);
+END;
+CREATE TRIGGER registrations_fts_au AFTER UPDATE OF plate, car ON registrations BEGIN
+    INSERT INTO registrations_fts(registrations_fts, rowid, plate, car) VALUES ('delete', old.id, old.plate, old.car);
+    INSERT INTO registrations_fts(rowid, plate, car) VALUES (new.id, new.plate, new.car);
+END;
+DROP TRIGGER IF EXISTS registrations_names_au;
+CREATE TRIGGER registrations_names_au AFTER UPDATE OF name ON registrations BEGIN
+    INSERT INTO registrations_names(registrations_names, rowid, name) VALUES ('delete', old.id, old.name);
+    INSERT INTO registrations_names(rowid, name) VALUES (new.id, new.name);
+END;
+"""
+
+
+# ================== Features ==================
+# Миграция 5 (fsm_storage.py)
+FSM_SQL = """
+CREATE TABLE IF NOT EXISTS fsm_sessions (
+    key TEXT PRIMARY KEY,
+    state TEXT,
+    data TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_fsm_sessions_updated ON fsm_sessions(updated_at);
+"""
+
+# Миграция 6 (middlewares.py)
+DEDUP_SQL = """
+CREATE TABLE IF NOT EXISTS processed_updates (
+    update_id INTEGER PRIMARY KEY,
+    seen_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_processed_updates_seen ON processed_updates(seen_at);
+"""
+
+# Миграция 7 (broadcast.py)
+BROADCAST_SQL = """
+CREATE TABLE IF NOT EXISTS broadcasts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    admin_chat_id INTEGER,
+    progress_message_id INTEGER,
+    text TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'running',
+    total INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT,
+    finished_at TEXT
+);
+CREATE TABLE IF NOT EXISTS broadcast_recipients (
+    broadcast_id INTEGER NOT NULL,
+    chat_id INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    error TEXT,
+    PRIMARY KEY (broadcast_id, chat_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_broadcast_recipients_status ON broadcast_recipients(broadcast_id, status);
+"""
+
+# Миграция 9 (receipts.py)
+RECEIPTS_SQL = """
+CREATE TABLE IF NOT EXISTS receipts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    reg_id INTEGER NOT NULL,
+    tg_id INTEGER NOT NULL,
+    file_id TEXT NOT NULL,
+    hash_file_id TEXT NOT NULL,
+    file_unique_id TEXT NOT NULL,
+    phash INTEGER,
+    dup_of INTEGER,
+    dup_kind TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    created_at TEXT,
+    decided_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_receipts_status ON receipts(status, id);
+CREATE INDEX IF NOT EXISTS idx_receipts_unique ON receipts(file_unique_id);
+CREATE INDEX IF NOT EXISTS idx_receipts_reg ON receipts(reg_id, id);
+"""
+
+# Миграция 10 (export.py)
+# Версия таблицы: триггеры поднимают счётчик на каждую вставку, изменение
+# выгружаемых полей и удаление, а строке проставляют номер её последней версии.
+# Проверка «изменилось ли что-то» — чтение одной строки reg_version.
+# epoch отличает пересозданную базу, чтобы не отдать кэш от прежней.
+EXPORT_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS reg_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    value INTEGER NOT NULL,
+    epoch TEXT NOT NULL
+);
+INSERT OR IGNORE INTO reg_version (id, value, epoch)
+    VALUES (1, (SELECT COALESCE(MAX(id), 0) FROM registrations), lower(hex(randomblob(6))));
+CREATE INDEX IF NOT EXISTS idx_registrations_rev ON registrations(rev);
+CREATE TRIGGER IF NOT EXISTS reg_version_ai AFTER INSERT ON registrations BEGIN
+    UPDATE reg_version SET value = value + 1 WHERE id = 1;
+    UPDATE registrations SET rev = (SELECT value FROM reg_version WHERE id = 1) WHERE id = new.id;
+END;
+CREATE TRIGGER IF NOT EXISTS reg_version_au
+AFTER UPDATE OF name, car, plate, phone, people, race, race_type, payment ON registrations BEGIN
+    UPDATE reg_version SET value = value + 1 WHERE id = 1;
+    UPDATE registrations SET rev = (SELECT value FROM reg_version WHERE id = 1) WHERE id = new.id;
+END;
+CREATE TRIGGER IF NOT EXISTS reg_version_ad AFTER DELETE ON registrations BEGIN
+    UPDATE reg_version SET value = value + 1 WHERE id = 1;
+END;
+CREATE TABLE IF NOT EXISTS export_cursors (
+    admin_id INTEGER PRIMARY KEY,
+    rev INTEGER NOT NULL,
+    exported_at TEXT
+);
+"""
+
+# Миграция 11 (inventory.py)
+INVENTORY_SQL = """
+CREATE TABLE IF NOT EXISTS inventory (
+    kind TEXT PRIMARY KEY,
+    capacity INTEGER NOT NULL,
+    held INTEGER NOT NULL DEFAULT 0,
+    taken INTEGER NOT NULL DEFAULT 0,
+    CHECK (held >= 0 AND taken >= 0 AND held + taken <= capacity)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS holds (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    grp TEXT NOT NULL,
+    tg_id INTEGER NOT NULL,
+    qty INTEGER NOT NULL DEFAULT 1,
+    status TEXT NOT NULL DEFAULT 'held',
+    expires_at REAL,
+    created_at TEXT,
+    updated_at TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_holds_active ON holds(grp, tg_id) WHERE status IN ('held', 'taken');
+CREATE INDEX IF NOT EXISTS idx_holds_expiry ON holds(expires_at) WHERE status = 'held';
+CREATE TRIGGER IF NOT EXISTS holds_ai AFTER INSERT ON holds BEGIN
+    UPDATE inventory SET held = held + (new.status = 'held') * new.qty,
+                         taken = taken + (new.status = 'taken') * new.qty
+    WHERE kind = new.kind;
+END;
+CREATE TRIGGER IF NOT EXISTS holds_au AFTER UPDATE OF kind, qty, status ON holds BEGIN
+    UPDATE inventory SET held = held - (old.status = 'held') * old.qty,
+                         taken = taken - (old.status = 'taken') * old.qty
+    WHERE kind = old.kind;
+    UPDATE inventory SET held = held + (new.status = 'held') * new.qty,
+                         taken = taken + (new.status = 'taken') * new.qty
+    WHERE kind = new.kind;
+END;
+"""
+
+# Миграция 12 (events.py)
+EVENTS_SQL = """
+CREATE TABLE IF NOT EXISTS events (
+    slug TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    db_path TEXT NOT NULL,
+    fee INTEGER NOT NULL,
+    texts TEXT NOT NULL DEFAULT '{}',
+    starts_on TEXT,
+    ends_on TEXT,
+    active INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT
+) WITHOUT ROWID;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_events_active ON events(active) WHERE active = 1;
+"""
+
+# Миграция 13 (i18n.py)
+LANG_SQL = """
+CREATE TABLE IF NOT EXISTS user_langs (
+    tg_id INTEGER PRIMARY KEY,
+    lang TEXT NOT NULL,
+    updated_at TEXT
+);
+"""
+
+# Миграция 15 (reminders.py)
+REMINDERS_SQL = """
+CREATE TABLE IF NOT EXISTS payment_reminders (
+    reg_id INTEGER PRIMARY KEY,
+    sent INTEGER NOT NULL DEFAULT 0,
+    last_at REAL,
+    error TEXT
+);
+"""
+
+# Миграция 15 (scheduler.py)
+SCHEDULER_SQL = """
+CREATE TABLE IF NOT EXISTS scheduler_jobs (
+    id TEXT PRIMARY KEY,
+    next_run_time REAL,
+    job_state BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_scheduler_jobs_next ON scheduler_jobs(next_run_time);
+CREATE TABLE IF NOT EXISTS job_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    scheduled_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    result TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_job_runs_job ON job_runs(job_id, id);
+"""
+
+# Миграция 16 (tickets.py)
+CHECKINS_SQL = """
+CREATE TABLE IF NOT EXISTS checkins (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    reg_id INTEGER NOT NULL UNIQUE,
+    checked_at REAL NOT NULL,
+    admin_id INTEGER
+);
+"""
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import re
+
+from db import Database
+
+# Имя ищется по началу любого слова — FTS5 unicode61 с префиксным индексом.
+# Подстрочный поиск по номеру и машине — FTS5 с trigram-токенайзером.
+# Обе таблицы поверх registrations (external content), синхронизация триггерами.
+# Поиск по хвосту телефона/номера — обычные индексы по перевёрнутой
+# нормализованной строке: суффикс превращается в префикс, префикс — в range scan.
+# Схема создаётся миграциями 3 и 18 (repository.py).
+
+FIELDS = "r.id, r.name, r.car, r.plate, r.phone, r.race_type, r.payment, r.people"
+LIMIT = 20
+# Больше любого символа UTF-8: верхняя граница range scan по префиксу
+TOP = "\U0010ffff"
+
+_plate_re = re.compile(r"[^0-9A-ZА-ЯЁ]")
+_digits_re = re.compile(r"\D")
+_phone_query_re = re.compile(r"^[\d\s+()\-]+$")
+_word_re = re.compile(r"\w+")
+
+
+def plate_key(plate: str) -> str:
+    return _plate_re.sub("", (plate or "").upper())[::-1]
+
+
+def phone_key(phone: str) -> str:
+    return _digits_re.sub("", phone or "")[::-1]
+
+
+def _fts_phrase(q: str) -> str:
+    return '"' + q.replace('"', '""') + '"'
+
+
+def _fts_prefixes(q: str) -> str:
+    # «akbar kul» -> "akbar"* "kul"*: каждое слово — начало слова в имени
+    return " ".join(f'"{w}"*' for w in _word_re.findall(q))
+
+
+def find_query(query: str, limit: int = LIMIT):
+    # (sql, params) для поиска или None, если искать нечего
+    q = (query or "").strip()
+    if not q:
+        return None
+    parts, params = [], []
+    digits = phone_key(q)
+    plate = plate_key(q)
+    if len(digits) >= 3 and _phone_query_re.match(q):
+        parts.append("SELECT id FROM registrations WHERE phone_rev >= ? AND phone_rev < ?")
+        params += [digits, digits + TOP]
+    if len(plate) >= 2:
+        parts.append("SELECT id FROM registrations WHERE plate_rev >= ? AND plate_rev < ?")
+        params += [plate, plate + TOP]
+    names = _fts_prefixes(q)
+    if len(q) >= 2 and names:
+        parts.append("SELECT rowid FROM registrations_names WHERE registrations_names MATCH ?")
+        params.append(names)
+    if len(q) >= 3:
+        parts.append("SELECT rowid FROM registrations_fts WHERE registrations_fts MATCH ?")
+        params.append(_fts_phrase(q))
+    if not parts:
+        return None
+    sql = (f"SELECT {FIELDS} FROM registrations r WHERE r.id IN ({' UNION '.join(parts)}) "
+           f"ORDER BY r.id DESC LIMIT ?")
+    return sql, (*params, limit)
+
+
+async def find_registrations(db: Database, query: str, limit: int = LIMIT):
+    built = find_query(query, limit)
+    if built is None:
+        return []
+    return await db.fetchall(*built)
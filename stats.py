@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from db import Database
+from schema import STATS_RECOMPUTE_SQL
+
+# Счётчики обновляются триггерами в той же транзакции, что и сама запись,
+# поэтому они не расходятся с таблицей ни при пакетной записи, ни при
+# нескольких воркерах. Чтение /stats — выборка десятка строк, без сканов.
+# Таблица и триггеры создаются миграцией 4 (repository.py).
+
+
+async def recompute_stats(db: Database):
+    # Полный пересчёт — только по запросу (/stats recompute)
+    async with db.transaction() as conn:
+        await conn.execute("DELETE FROM reg_counters")
+        await conn.execute(STATS_RECOMPUTE_SQL)
+
+
+async def get_stats(db: Database) -> dict:
+    rows = await db.fetchall("SELECT key, value FROM reg_counters")
+    return dict(rows)
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+# Новое мероприятие начинается с пустой базы: анкеты старого bot.db переносятся
+# только в основную DB_PATH, но не в файлы мероприятий.
+#
+#   python -m pytest -q test_events.py
+import asyncio
+import sqlite3
+
+import repository
+from db import close_all, get_db
+from events import EventRegistry
+from fake_api import fake_bot
+
+LEGACY_SQL = """
+CREATE TABLE registrations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER, dt_created TEXT, lang TEXT, name TEXT, car TEXT, plate TEXT,
+    people TEXT, phone TEXT, lodging_plan TEXT, photo_file_id TEXT,
+    pay_status TEXT, pay_dt TEXT, receipt_file_id TEXT
+);
+INSERT INTO registrations (user_id, dt_created, lang, name, car, plate, people, phone, pay_status)
+VALUES (1351064, '2025-05-01T10:00:00', 'ru', 'Old Driver', 'UAZ', '01K105DS', '2', '+998901234567', 'paid_confirmed');
+"""
+
+
+def _count(path: str) -> int:
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM registrations").fetchone()[0]
+
+
+def test_new_event_skips_legacy_backfill(tmp_path, monkeypatch):
+    legacy = tmp_path / "bot.db"
+    with sqlite3.connect(legacy) as conn:
+        conn.executescript(LEGACY_SQL)
+    monkeypatch.setattr(repository, "LEGACY_DB_PATH", str(legacy))
+
+    async def run():
+        db = get_db(str(tmp_path / "main.db"))
+        await db.open()
+        await repository.migrate(db)
+        bot = fake_bot()
+        registry = EventRegistry(db, bot, events_dir=str(tmp_path / "events"))
+        try:
+            await registry.load()
+            event = await registry.create("new-season", "New season")
+            await registry.context(event.slug)
+            return event.db_path
+        finally:
+            await registry.close()
+            await bot.session.close()
+            await close_all()
+
+    event_path = asyncio.run(run())
+    # Основная база получила анкету из bot.db, новое мероприятие — нет
+    assert _count(tmp_path / "main.db") == 1
+    assert _count(event_path) == 0
+    with sqlite3.connect(event_path) as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == repository.SCHEMA_VERSION
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+log = logging.getLogger("webhook")
+
+WORKERS = 8
+QUEUE_SIZE = 1000
+# Сколько ждать дообработки принятых апдейтов при остановке (сек.)
+DRAIN_TIMEOUT = 10
+
+
+def update_user_id(update: dict):
+    # from.id из любого типа апдейта (message, callback_query, ...), иначе chat.id
+    for key, value in update.items():
+        if key == "update_id" or not isinstance(value, dict):
+            continue
+        user = value.get("from") or value.get("user")
+        if user:
+            return user.get("id")
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+        if chat:
+            return chat.get("id")
+    return None
+
+
+def partition(update: dict, n: int) -> int:
+    uid = update_user_id(update)
+    return (uid if uid is not None else update.get("update_id", 0)) % n
+
+
+class Lanes:
+    # N последовательных очередей. Апдейты одного пользователя всегда попадают
+    # в одну и ту же очередь, поэтому шаги RegForm обрабатываются строго по порядку,
+    # а разные пользователи — параллельно.
+
+    def __init__(self, handle, lanes: int = WORKERS, queue_size: int = QUEUE_SIZE):
+        self.handle = handle
+        self.lanes = max(1, lanes)
+        self.queues = [asyncio.Queue(maxsize=max(1, queue_size // self.lanes)) for _ in range(self.lanes)]
+        self._tasks = []
+        self.processed = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks) and all(not t.done() for t in self._tasks)
+
+    @property
+    def full(self) -> bool:
+        return any(q.full() for q in self.queues)
+
+    def submit(self, update: dict) -> bool:
+        try:
+            self.queues[partition(update, self.lanes)].put_nowait(update)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker(q)) for q in self.queues]
+
+    async def join(self):
+        for q in self.queues:
+            await q.join()
+
+    async def close(self):
+        if self.running:
+            try:
+                await asyncio.wait_for(self.join(), DRAIN_TIMEOUT)
+            except asyncio.TimeoutError:
+                log.warning("Dropping %d queued updates on shutdown", sum(q.qsize() for q in self.queues))
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            update = await queue.get()
+            try:
+                await self.handle(update)
+                self.processed += 1
+            except Exception:
+                self.failed += 1
+                log.exception("Update processing failed")
+            finally:
+                queue.task_done()
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.lanes,
+            "queue": sum(q.qsize() for q in self.queues),
+            "queue_max": sum(q.maxsize for q in self.queues),
+            "processed": self.processed,
+            "failed": self.failed,
+        }
+
+
+class QueuedRequestHandler(SimpleRequestHandler):
+    # Вместо задачи на каждый апдейт (как в SimpleRequestHandler) отдаём апдейт
+    # в ограниченный sink (Lanes в процессе или пул процессов из workers.py)
+    # и сразу отвечаем 200. Переполнение -> 503, Telegram повторит доставку позже.
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, secret_token: str = None,
+                 workers: int = WORKERS, queue_size: int = QUEUE_SIZE, sink=None, **data):
+        super().__init__(dispatcher=dispatcher, bot=bot, handle_in_background=True,
+                         secret_token=secret_token, **data)
+        self.sink = sink or Lanes(self._feed, workers, queue_size)
+        self.received = 0
+        self.rejected = 0
+
+    async def _feed(self, update: dict):
+        await self._background_feed_update(bot=self.bot, update=update)
+
+    def start(self):
+        self.sink.start()
+
+    async def close(self):
+        # Апдейты в очереди Telegram уже считает доставленными — дорабатываем их
+        await self.sink.close()
+        await super().close()
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        try:
+            update = await request.json(loads=bot.session.json_loads)
+        except ValueError:
+            return web.Response(status=400)
+        if not self.sink.submit(update):
+            self.rejected += 1
+            return web.Response(status=503)
+        self.received += 1
+        return web.Response(status=200)
+
+    # ---------- health ----------
+    async def health(self, request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok"})
+
+    async def ready(self, request: web.Request) -> web.Response:
+        ok = self.sink.running and not self.sink.full
+        return web.json_response(
+            {"ready": ok, "received": self.received, "rejected": self.rejected, **self.sink.stats()},
+            status=200 if ok else 503,
+        )
+
+
+def build_app(dp: Dispatcher, bot: Bot, path: str, secret: str = None,
+              workers: int = WORKERS, queue_size: int = QUEUE_SIZE, sink=None, **data):
+    app = web.Application()
+    handler = QueuedRequestHandler(dp, bot, secret_token=secret or None,
+                                   workers=workers, queue_size=queue_size, sink=sink, **data)
+    handler.register(app, path=path)
+    app.router.add_get("/healthz", handler.health)
+    app.router.add_get("/readyz", handler.ready)
+    setup_application(app, dp, bot=bot, **data)
+
+    async def on_startup(app):
+        handler.start()
+
+    app.on_startup.append(on_startup)
+    app["handler"] = handler
+    return app
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, url: str, path: str, secret: str,
+                      host: str, port: int, workers: int = WORKERS,
+                      queue_size: int = QUEUE_SIZE, sink=None, **data):
+    app = build_app(dp, bot, path, secret, workers, queue_size, sink, **data)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    try:
+        if url:
+            await bot.set_webhook(
+                url.rstrip("/") + path,
+                secret_token=secret or None,
+                allowed_updates=dp.resolve_used_update_types(),
+            )
+        log.info("Webhook listening on %s:%s%s", host, port, path)
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+# Многопроцессный режим: фронт (webhook или polling) принимает апдейты и раскладывает
+# их по воркер-процессам по from_user.id. Все шаги одного пользователя идут в один
+# процесс и там — в одну Lane, поэтому порядок RegForm сохраняется, а LRU-кэш
+# SQLiteStorage в каждом процессе остаётся согласованным (чужих ключей он не видит).
+# Общее состояние — тот же SQLite-файл в WAL: FSM, регистрации и дедуп update_id.
+import asyncio
+import logging
+import multiprocessing as mp
+import queue
+
+from aiogram import Bot, Dispatcher
+from aiogram.utils.backoff import Backoff, BackoffConfig
+
+from webhook import Lanes, partition, run_webhook
+
+log = logging.getLogger("workers")
+
+QUEUE_SIZE = 2000
+LANES = 8
+POLL_TIMEOUT = 30
+# Как DEFAULT_BACKOFF_CONFIG в aiogram: 1 с, ×1.3, не больше 5 с
+POLL_BACKOFF = BackoffConfig(min_delay=1.0, max_delay=5.0, factor=1.3, jitter=0.1)
+
+
+# ================== Worker process ==================
+def worker_entry(idx, q, processed, failed, bot_factory=None):
+    asyncio.run(_worker_main(idx, q, processed, failed, bot_factory))
+
+
+async def _worker_main(idx, q, processed, failed, bot_factory):
+    import main
+    import metrics
+
+    dp, bot = await main.setup_bot(bot_factory() if bot_factory else None, fast=main.FAST_START)
+    main.freeze_startup()
+    exporter = None
+    if metrics.ENABLED:
+        # Реестр метрик у каждого процесса свой, поэтому и порт свой
+        exporter = await metrics.serve(metrics.METRICS_HOST, metrics.METRICS_PORT + 1 + idx)
+    warming = None
+    if idx == 0:
+        # Досылка рассылок и планировщик задач (warm_up) — только в одном воркере
+        warming = asyncio.create_task(main.warm_up(dp))
+
+    async def feed(update):
+        try:
+            await dp.feed_raw_update(bot, update)
+        except Exception:
+            with failed.get_lock():
+                failed.value += 1
+            raise
+        with processed.get_lock():
+            processed.value += 1
+
+    lanes = Lanes(feed, LANES, QUEUE_SIZE)
+    lanes.start()
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            update = await loop.run_in_executor(None, q.get)
+            if update is None:
+                break
+            while not lanes.submit(update):
+                await asyncio.sleep(0.005)
+    finally:
+        await lanes.close()
+        if warming:
+            warming.cancel()
+        if dp["jobs"]:
+            dp["jobs"].shutdown()
+        await dp["events"].close()
+        if exporter:
+            await exporter.cleanup()
+        await bot.session.close()
+        await main.close_all()
+
+
+# ================== Front ==================
+class WorkerPool:
+    # Тот же интерфейс, что у Lanes (submit/start/close/stats), но «дорожки» —
+    # отдельные процессы со своим event loop, пулом БД и Dispatcher
+
+    def __init__(self, workers: int, queue_size: int = QUEUE_SIZE, bot_factory=None):
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self._ctx = mp.get_context("spawn")
+        self.queues = [self._ctx.Queue(maxsize=queue_size) for _ in range(self.workers)]
+        self.processed = [self._ctx.Value("q", 0) for _ in range(self.workers)]
+        self.failed = [self._ctx.Value("q", 0) for _ in range(self.workers)]
+        self.bot_factory = bot_factory
+        self.procs = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self.procs) and all(p.is_alive() for p in self.procs)
+
+    @property
+    def full(self) -> bool:
+        return any(q.full() for q in self.queues)
+
+    def submit(self, update: dict) -> bool:
+        try:
+            self.queues[partition(update, self.workers)].put_nowait(update)
+        except queue.Full:
+            return False
+        return True
+
+    def start(self):
+        if self.procs:
+            return
+        for i in range(self.workers):
+            p = self._ctx.Process(
+                target=worker_entry,
+                args=(i, self.queues[i], self.processed[i], self.failed[i], self.bot_factory),
+                name=f"bot-worker-{i}",
+                daemon=True,
+            )
+            p.start()
+            self.procs.append(p)
+
+    async def close(self):
+        if not self.procs:
+            return
+        for q in self.queues:
+            q.put(None)
+        loop = asyncio.get_running_loop()
+        for p in self.procs:
+            await loop.run_in_executor(None, p.join)
+        self.procs = []
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queue": sum(q.qsize() for q in self.queues),
+            "queue_max": self.queue_size * self.workers,
+            "processed": sum(v.value for v in self.processed),
+            "failed": sum(v.value for v in self.failed),
+        }
+
+
+async def poll_front(bot: Bot, pool: WorkerPool, allowed_updates=None):
+    # getUpdates в одном процессе, обработка — в пуле
+    # Ошибка сети или Bot API не роняет фронт: ждём с backoff и повторяем с тем же offset
+    offset = None
+    backoff = Backoff(POLL_BACKOFF)
+    failed = False
+    while True:
+        try:
+            updates = await bot.get_updates(offset=offset, timeout=POLL_TIMEOUT, allowed_updates=allowed_updates)
+        except Exception as e:
+            failed = True
+            log.error("getUpdates failed - %s: %s; retry in %.1f s (tryings = %d)",
+                      type(e).__name__, e, backoff.next_delay, backoff.counter)
+            await backoff.asleep()
+            continue
+        if failed:
+            log.info("getUpdates restored (tryings = %d)", backoff.counter)
+            backoff.reset()
+            failed = False
+        for u in updates:
+            raw = u.model_dump(mode="json", exclude_none=True, by_alias=True)
+            while not pool.submit(raw):
+                await asyncio.sleep(0.05)
+            offset = u.update_id + 1
+
+
+async def run_workers(dp: Dispatcher, bot: Bot, workers: int, mode: str, **webhook):
+    pool = WorkerPool(workers)
+    pool.start()
+    try:
+        if mode == "webhook":
+            await run_webhook(dp, bot, sink=pool, **webhook)
+        else:
+            await bot.delete_webhook()
+            await poll_front(bot, pool, dp.resolve_used_update_types())
+    finally:
+        await pool.close()